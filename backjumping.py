@@ -0,0 +1,276 @@
+from collections import OrderedDict, defaultdict, deque
+
+from heuristics import lcv, mrv
+from inference import forward_checking, maintain_arc_consistency, maintain_arc_consistency_ne
+
+"""
+This module contains a conflict-directed backjumping (CBJ) search with nogood recording.
+Chronological backtracking always returns to the most recent variable when a variable runs out of values,
+even when that variable had nothing to do with the failure. CBJ keeps a conflict set for each variable: the
+earlier variables whose assignments explain why its values failed. When a variable runs out of values,
+the search jumps straight back to the deepest variable in its conflict set, and the assignments of the
+variables in the conflict set are recorded as a nogood, which makes the search fail immediately whenever
+the same combination of assignments comes up again.
+
+To build conflict sets, each value removed from a domain is recorded with its reason: the set of assigned
+variables that caused the removal. The search uses its own versions of the inference methods that record
+these reasons. They remove the same values as the inference functions they replace:
+    forward_checking                                        -> forward checking
+    maintain_arc_consistency, maintain_arc_consistency_ne   -> singleton propagation (see `maintain_arc_consistency_ne`)
+    None                                                    -> no inference, only consistency checks
+"""
+
+class ConflictDirectedBackjumping:
+    """
+    Class implementing conflict-directed backjumping with nogood recording. The search uses an explicit stack
+    like `backtracking.backtrack_iterative`. Each frame holds the variable, an iterator over its ordered values,
+    the domain trail mark for its current value, and its conflict set.
+
+    arguments:
+        :csp: - The `GraphColoringCSP` to solve
+        :select_unassigned_variable: - A function representing the variable ordering heuristic (e.g., mrv)
+        :order_domain_values: - A function representing the value ordering heuristic (e.g., lcv)
+        :inference: - The inference method to mirror (forward_checking, maintain_arc_consistency, maintain_arc_consistency_ne or None)
+        :max_nogoods: - The maximum number of nogoods to keep. The least recently used nogood is evicted when the
+            store is full. 0 disables nogood recording.
+        :max_nogood_size: - Nogoods with more assignments than this are not recorded (None means no limit)
+
+    After `search` returns, these attributes report what the search did:
+        :backjumps: - How many times the search jumped back over one or more variables
+        :nogoods_learned: - How many nogoods were recorded
+        :nogoods_evicted: - How many nogoods were evicted from the store
+        :nogood_failures: - How many assignments were rejected by a recorded nogood
+    """
+    def __init__(self, csp, select_unassigned_variable=mrv, order_domain_values=lcv, inference=maintain_arc_consistency,
+                 max_nogoods=10000, max_nogood_size=None) -> None:
+        if inference in (maintain_arc_consistency, maintain_arc_consistency_ne):
+            self.propagate = self.propagate_singletons
+        elif inference is forward_checking:
+            self.propagate = self.forward_check
+        elif inference is None:
+            self.propagate = self.check_consistency
+        else:
+            raise ValueError(f"Conflict-directed backjumping does not support inference method {inference.__name__}")
+        self.csp = csp
+        self.select_unassigned_variable = select_unassigned_variable
+        self.order_domain_values = order_domain_values
+        self.inference = inference
+        self.max_nogoods = max_nogoods
+        self.max_nogood_size = max_nogood_size
+        self.assignment = {}
+        self.level = {}        # Depth of each assigned variable in the search stack
+        self.reasons = {}      # (variable, value) -> set of assigned variables that removed value from the domain of variable
+        self.nogoods = OrderedDict() # Recorded nogoods (frozensets of (variable, value) pairs), least recently used first
+        self.watches = defaultdict(set) # (variable, value) -> nogoods containing that assignment
+        self.backjumps = 0
+        self.nogoods_learned = 0
+        self.nogoods_evicted = 0
+        self.nogood_failures = 0
+
+    def search(self, stop=None):
+        """
+        Method that runs the search and returns the solution, or None if the problem has no solution.
+        If decisions were made with `apply_decisions` first, only the subtree under them is searched, and None means
+        that subtree has no solution. If a stop function is given, it is called with csp after every assignment, and
+        if it returns True the search raises `backtracking.SearchInterrupted` like `backtracking.backtrack_iterative`.
+        """
+        csp = self.csp
+        assignment = self.assignment
+        if csp.is_complete(assignment):
+            return assignment
+        stack = [self.new_frame()]
+        while stack:
+            frame = stack[-1]
+            variable, values, mark, conflict_set = frame
+            if mark is not None:
+                # The subtree under the current value failed: undo it before trying the next value
+                csp.undo(mark)
+                self.unassign(variable)
+                frame[2] = None
+            for value in values:
+                mark = csp.mark()
+                self.level[variable] = len(stack) - 1
+                csp.assign(variable, value, assignment)
+                conflict = self.propagate(variable, value)
+                if conflict is None:
+                    frame[2] = mark
+                    break
+                conflict_set |= conflict
+                conflict_set.discard(variable)
+                csp.undo(mark)
+                self.unassign(variable)
+            else:
+                # Every value failed: jump back to the deepest variable in the conflict set
+                stack.pop()
+                if not conflict_set:
+                    # No earlier assignment is to blame, so there is no solution
+                    if stack:
+                        self.backjumps += 1
+                    return None
+                self.record_nogood(conflict_set)
+                target = max(conflict_set, key=self.level.__getitem__)
+                if self.level[target] < 0:
+                    # Only decisions made before the search are to blame, so the subtree under them has no solution
+                    if stack:
+                        self.backjumps += 1
+                    return None
+                if stack[-1][0] != target:
+                    self.backjumps += 1
+                    while stack[-1][0] != target:
+                        self.unassign(stack.pop()[0])
+                conflict_set.discard(target)
+                stack[-1][3] |= conflict_set
+                continue
+            if csp.is_complete(assignment):
+                return assignment
+            if stop is not None and stop(csp):
+                from backtracking import SearchInterrupted # backtracking imports this module
+                raise SearchInterrupted([(frame[0], assignment[frame[0]]) for frame in stack], [list(frame[1]) for frame in stack])
+            stack.append(self.new_frame())
+        return None
+
+    def apply_decisions(self, decisions):
+        """
+        Method that makes each (variable, value) decision in order, with the search's propagation after each one, so
+        `search` only searches the subtree under them. The decisions get negative levels, below every level of the
+        search stack. Returns False if a decision fails (its conflicts and nogoods are checked like any assignment).
+        """
+        csp = self.csp
+        for depth, (variable, value) in enumerate(decisions):
+            self.level[variable] = depth - len(decisions)
+            csp.assign(variable, value, self.assignment)
+            if self.propagate(variable, value) is not None:
+                return False
+        return True
+
+    def reset(self):
+        """
+        Method that forgets the assignment (which the caller has undone, see `backtracking.retract_assignment`), so the
+        search can be run again on another subtree with the nogoods it has learned.
+        """
+        self.assignment.clear()
+        self.level.clear()
+
+    def new_frame(self):
+        """
+        Method that selects the next variable and returns its stack frame. The conflict set starts with the
+        reasons for the values that were already removed from the variable's domain.
+        """
+        csp = self.csp
+        variable = self.select_unassigned_variable(csp, self.assignment)
+        conflict_set = set()
+        for value in range(csp.colors):
+            if not csp.domains.contains(variable, value):
+                conflict_set |= self.reasons.get((variable, value), ())
+        return [variable, iter(self.order_domain_values(csp, variable, self.assignment)), None, conflict_set]
+
+    def unassign(self, variable):
+        self.csp.unassign(variable, self.assignment)
+        del self.level[variable]
+
+    def wipeout(self, variable):
+        """
+        Method that returns the conflict set for an empty domain: the reasons for removing each of its values.
+        """
+        conflict = set()
+        for value in range(self.csp.colors):
+            conflict |= self.reasons.get((variable, value), ())
+        return conflict
+
+    def check_consistency(self, variable, value):
+        """
+        Method used when there is no inference. Returns the assigned neighbors with the same value, if any.
+        """
+        conflict = self.check_nogoods(variable, value)
+        if conflict is not None:
+            return conflict
+        if self.csp.count_conflicts(variable, value, self.assignment) == 0:
+            return None
+        return {neighbor for neighbor in self.csp.neighbors[variable] if self.assignment.get(neighbor) == value}
+
+    def forward_check(self, variable, value):
+        """
+        Forward checking that records why each value was removed. Returns None, or the conflict set if a domain becomes empty.
+        """
+        csp = self.csp
+        csp.add_assignment(variable, value)
+        conflict = self.check_nogoods(variable, value)
+        if conflict is not None:
+            return conflict
+        domains = csp.domains
+        reason = frozenset((variable,))
+        for neighbor in csp.neighbors[variable]:
+            if neighbor not in self.assignment and domains.contains(neighbor, value):
+                domains.remove(neighbor, value)
+                self.reasons[(neighbor, value)] = reason
+                if domains.size(neighbor) == 0:
+                    return self.wipeout(neighbor)
+        return None
+
+    def propagate_singletons(self, variable, value):
+        """
+        Arc consistency for the not-equal constraint (see `inference.maintain_arc_consistency_ne`) that records why
+        each value was removed. The reason for a variable being left with a single value is the union of the reasons
+        for removing its other values. Returns None, or the conflict set if a domain becomes empty.
+        """
+        csp = self.csp
+        csp.add_assignment(variable, value)
+        conflict = self.check_nogoods(variable, value)
+        if conflict is not None:
+            return conflict
+        domains = csp.domains
+        reasons = self.reasons
+        worklist = deque([(variable, value, frozenset((variable,)))])
+        while worklist:
+            xj, value, reason = worklist.popleft()
+            for xi in csp.neighbors[xj]:
+                if not domains.contains(xi, value):
+                    continue
+                domains.remove(xi, value)
+                reasons[(xi, value)] = reason
+                size = domains.size(xi)
+                if size == 0:
+                    return self.wipeout(xi)
+                if size == 1:
+                    remaining = domains.domain(xi)[0]
+                    singleton_reason = frozenset().union(*(reasons.get((xi, other), ()) for other in range(csp.colors) if other != remaining))
+                    worklist.append((xi, remaining, singleton_reason))
+        return None
+
+    def check_nogoods(self, variable, value):
+        """
+        Method that returns the variables of a recorded nogood that the assignment variable=value completes, if any.
+        """
+        assignment = self.assignment
+        for nogood in self.watches.get((variable, value), ()):
+            if all(assignment.get(other) == other_value for other, other_value in nogood):
+                self.nogoods.move_to_end(nogood)
+                self.nogood_failures += 1
+                return {other for other, _ in nogood}
+        return None
+
+    def record_nogood(self, conflict_set):
+        """
+        Method that records the current assignments of the variables in conflict_set as a nogood.
+        """
+        if not self.max_nogoods or (self.max_nogood_size is not None and len(conflict_set) > self.max_nogood_size):
+            return
+        if self.add_nogood(frozenset((variable, self.assignment[variable]) for variable in conflict_set)):
+            self.nogoods_learned += 1
+
+    def add_nogood(self, nogood):
+        """
+        Method that adds nogood (a frozenset of (variable, value) pairs) to the store, e.g., one saved by an earlier
+        search. Returns False if the store is disabled or already has it.
+        """
+        if not self.max_nogoods or nogood in self.nogoods:
+            return False
+        self.nogoods[nogood] = None
+        for pair in nogood:
+            self.watches[pair].add(nogood)
+        if len(self.nogoods) > self.max_nogoods:
+            evicted, _ = self.nogoods.popitem(last=False)
+            for pair in evicted:
+                self.watches[pair].discard(evicted)
+            self.nogoods_evicted += 1
+        return True
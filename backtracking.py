@@ -1,4 +1,7 @@
-from heuristics import mrv, lcv, static_ordering, unordered_domain_values
+from contextlib import nullcontext
+
+from backjumping import ConflictDirectedBackjumping
+from heuristics import break_color_symmetry, mrv, lcv, static_ordering, unordered_domain_values
 from inference import maintain_arc_consistency
 
 """
@@ -24,17 +27,76 @@ function BACKTRACK(csp, assignment) returns a solution or failure
             remove {var = value} from assignment
     return failure
 """
-def backtracking_search(csp, verbose=True, select_unassigned_variable=mrv, order_domain_values=lcv, inference=maintain_arc_consistency):
+def backtracking_search(csp, verbose=True, select_unassigned_variable=mrv, order_domain_values=lcv, inference=maintain_arc_consistency, verify=False, engine='recursive', max_nogoods=10000, symmetry_breaking=False, processes=None, seed=0, restart_schedule='luby', weighting=False, instrumentation=None):
     """
     Function that runs the backtracking search. All this function does is 
     wrap the backtrack method and passes it an initial empty assignment.
     It also prints the problem if needed (verbose=True).
+    The search only checks that the assignment is complete at each node. If verify=True,
+    the solution is also fully validated with `csp.valid_solution` once the search returns.
+    The engine argument selects the implementation: 'recursive' (backtrack/backtrack_no_inference)
+    or 'iterative' (backtrack_iterative, which is not limited by Python's recursion limit),
+    or 'backjumping' (conflict-directed backjumping, keeping at most max_nogoods learned nogoods),
+    or 'parallel' (the search tree is split into subtrees that are searched on processes worker processes,
+    see `parallel.parallel_tree_search`), or 'restarts' (randomized restarts seeded with seed, following
+    restart_schedule ('luby' or 'geometric'), with dom/wdeg variable weights if weighting=True, see `restarts.RestartSearch`).
+    If symmetry_breaking=True, a variable may only take a color that is already used or one new color
+    (see `heuristics.break_color_symmetry`).
+    If an `instrumentation.Instrumentation` object is given, the search collects statistics into its statistics
+    attribute and calls its callbacks. The worker processes of the parallel engine are not instrumented.
+    """
+    if engine == 'parallel':
+        from parallel import parallel_tree_search # parallel imports this module
+        return parallel_tree_search(csp, processes=processes, verbose=verbose, verify=verify, symmetry_breaking=symmetry_breaking,
+                                    select_unassigned_variable=select_unassigned_variable, order_domain_values=order_domain_values, inference=inference)
+    with nullcontext() if instrumentation is None else instrumentation.attached(csp):
+        if engine == 'restarts':
+            from restarts import RestartSearch # restarts imports this module
+            search = RestartSearch(csp, select_unassigned_variable, order_domain_values, inference, seed=seed, schedule=restart_schedule,
+                                   weighting=weighting, symmetry_breaking=symmetry_breaking)
+            if verbose:
+                print_problem(search.select_unassigned_variable, order_domain_values, inference)
+            if instrumentation is not None:
+                search.select_unassigned_variable, search.order_domain_values, search.inference = instrumentation.wrap(
+                    search.select_unassigned_variable, search.order_domain_values, search.inference)
+            solution = search.search()
+            if verbose:
+                print(f"Restarts: {search.restarts}, failures: {search.failures}, seed: {seed}\n")
+            if verify:
+                verify_solution(csp, solution)
+            return solution
+        if symmetry_breaking:
+            order_domain_values = break_color_symmetry(order_domain_values)
+        if verbose:
+            print_problem(select_unassigned_variable, order_domain_values, inference)
+        if engine == 'backjumping':
+            search = ConflictDirectedBackjumping(csp, select_unassigned_variable, order_domain_values, inference, max_nogoods=max_nogoods)
+            if instrumentation is not None:
+                # The search mirrors the inference method with its own propagate method, which is what gets timed
+                search.select_unassigned_variable, search.order_domain_values, _ = instrumentation.wrap(select_unassigned_variable, order_domain_values, None)
+                search.propagate = instrumentation.wrap_propagate(search.propagate, inference)
+            solution = search.search()
+            if verbose:
+                print(f"Backjumps: {search.backjumps}, nogoods learned: {search.nogoods_learned}, nogood failures: {search.nogood_failures}\n")
+        else:
+            if instrumentation is not None:
+                select_unassigned_variable, order_domain_values, inference = instrumentation.wrap(select_unassigned_variable, order_domain_values, inference)
+            if engine == 'iterative':
+                solution = backtrack_iterative(csp, {}, select_unassigned_variable, order_domain_values, inference)
+            elif inference is None:
+                solution = backtrack_no_inference(csp, {}, select_unassigned_variable, order_domain_values)
+            else:
+                solution = backtrack(csp, {}, select_unassigned_variable=select_unassigned_variable, order_domain_values=order_domain_values, inference=inference)
+        if verify:
+            verify_solution(csp, solution)
+        return solution
+
+def verify_solution(csp, solution):
+    """
+    Function that raises a RuntimeError if the search returned an assignment that is not a valid solution.
     """
-    if verbose:
-        print_problem(select_unassigned_variable, order_domain_values, inference)
-    if inference is None:
-        return backtrack_no_inference(csp, {}, select_unassigned_variable, order_domain_values)
-    return backtrack(csp, {}, select_unassigned_variable=select_unassigned_variable, order_domain_values=order_domain_values, inference=inference)
+    if solution is not None and not csp.valid_solution(solution):
+        raise RuntimeError("Backtracking search returned an invalid solution.")
 
 def backtrack(csp, assignment, select_unassigned_variable, order_domain_values, inference):
     """
@@ -47,14 +109,16 @@ def backtrack(csp, assignment, select_unassigned_variable, order_domain_values,
         :inference: - A function representing the inference method (e.g., forward checking, mac/ac3)
     """
     # if assignment is complete then return assignment
-    if csp.valid_solution(assignment): # Base case
+    if csp.is_complete(assignment): # Base case
         return assignment
     # var <- SELECT-UNASSIGNED-VARIABLE(csp, assignment)
     variable = select_unassigned_variable(csp, assignment)
     # for each value in ORDER-DOMAIN-VALUES(csp, var, assignment) do
     for value in order_domain_values(csp, variable, assignment):
         # if value is consistent with assignment then
-        if csp.is_consistent(variable, {variable: value, **assignment}):
+        if csp.count_conflicts(variable, value, assignment) == 0:
+            # Every domain change made at this level goes on the trail after this mark
+            mark = csp.mark()
             # add {var = value} to assignment
             csp.assign(variable, value, assignment)
             csp.add_assignment(variable, value)
@@ -68,10 +132,10 @@ def backtrack(csp, assignment, select_unassigned_variable, order_domain_values,
                 result = backtrack(csp, assignment, select_unassigned_variable, order_domain_values, inference)
                 # if result != failure then return result
                 if result: return result
-                # remove inferences from csp
-                csp.remove_inferences(inferences)
+            # remove inferences (and the domain reduction for {var = value}) from csp
+            csp.undo(mark)
             # remove {var = value} from assignment
-            del assignment[variable]
+            csp.unassign(variable, assignment)
     return None
 
 def backtrack_no_inference(csp, assignment, select_unassigned_variable, order_domain_values):
@@ -81,20 +145,123 @@ def backtrack_no_inference(csp, assignment, select_unassigned_variable, order_do
     is consistent rather than trying different inferences.
     """
     # if assignment is complete then return assignment
-    if csp.valid_solution(assignment): # Base case
+    if csp.is_complete(assignment): # Base case
         return assignment
     # var <- SELECT-UNASSIGNED-VARIABLE(csp, assignment)
     variable = select_unassigned_variable(csp, assignment)
     # for each value in ORDER-DOMAIN-VALUES(csp, var, assignment) do
     for value in order_domain_values(csp, variable, assignment):
-        local_assignment = assignment.copy()
-        local_assignment[variable] = value
         # If assignment is consistent, we recurse
-        if csp.is_consistent(variable, local_assignment):
-            result = backtrack_no_inference(csp, local_assignment, select_unassigned_variable, order_domain_values)
+        if csp.count_conflicts(variable, value, assignment) == 0:
+            csp.assign(variable, value, assignment)
+            result = backtrack_no_inference(csp, assignment, select_unassigned_variable, order_domain_values)
             # if result != failure then return result
             if result is not None:
                 return result
+            csp.unassign(variable, assignment)
+    return None
+
+class SearchInterrupted(Exception):
+    """
+    Exception raised by `backtrack_iterative` when its stop function returns True. It holds what is left of the search:
+        :path: - The (variable, value) decisions on the current branch, from the root down
+        :open_values: - For each decision in path, the values of its variable that have not been tried yet
+    """
+    def __init__(self, path, open_values) -> None:
+        super().__init__(f"Search interrupted at depth {len(path)}")
+        self.path = path
+        self.open_values = open_values
+
+    def subproblems(self):
+        """
+        Method that returns the unexplored part of the search tree as a list of decision prefixes: the subtree under
+        the current branch, and for each decision on the branch, one subtree for each of its untried values.
+        """
+        prefixes = [list(self.path)]
+        for depth, values in enumerate(self.open_values):
+            variable = self.path[depth][0]
+            prefixes.extend(self.path[:depth] + [(variable, value)] for value in values)
+        return prefixes
+
+def apply_decisions(csp, assignment, decisions, inference):
+    """
+    Function that makes each (variable, value) decision in order, with inference after each one, as the search would.
+    Returns False if a decision is inconsistent or its inference fails.
+    """
+    for variable, value in decisions:
+        if csp.count_conflicts(variable, value, assignment) != 0:
+            return False
+        csp.assign(variable, value, assignment)
+        if inference is not None:
+            csp.add_assignment(variable, value)
+            inferences = inference(csp, variable, assignment)
+            if inferences == 'failure':
+                return False
+            csp.add_inferences(inferences)
+    return True
+
+def retract_assignment(csp, assignment, mark):
+    """
+    Function that undoes every domain change made since mark and unassigns every variable in assignment,
+    so csp can be searched again from the state it was in when mark was taken.
+    """
+    csp.undo(mark)
+    for variable in list(assignment):
+        csp.unassign(variable, assignment)
+
+def backtrack_iterative(csp, assignment, select_unassigned_variable, order_domain_values, inference, stop=None, on_failure=None):
+    """
+    Function that runs the same search as `backtrack` (or `backtrack_no_inference` when inference is None),
+    with an explicit stack instead of recursion. Each frame on the stack holds the variable being assigned
+    at that depth, an iterator over its remaining ordered values, and the domain trail mark taken before its
+    current value was assigned. Heuristics and inference are called in the same order as in the recursive
+    functions, so the search returns the same solution after the same number of assignments.
+    If a stop function is given, it is called with csp after every assignment, and if it returns True the search
+    raises `SearchInterrupted` with the current branch and the values left to try.
+    If an on_failure function is given, it is called with (csp, variable, assignment) every time a value of variable
+    is rejected because it conflicts with the assignment or its inference fails.
+    """
+    if csp.is_complete(assignment):
+        return assignment
+    variable = select_unassigned_variable(csp, assignment)
+    stack = [[variable, iter(order_domain_values(csp, variable, assignment)), None]]
+    while stack:
+        frame = stack[-1]
+        variable, values, mark = frame
+        if mark is not None:
+            # The subtree under the current value failed: undo it before trying the next value
+            csp.undo(mark)
+            csp.unassign(variable, assignment)
+            frame[2] = None
+        for value in values:
+            if csp.count_conflicts(variable, value, assignment) != 0:
+                if on_failure is not None:
+                    on_failure(csp, variable, assignment)
+                continue
+            mark = csp.mark()
+            csp.assign(variable, value, assignment)
+            if inference is not None:
+                csp.add_assignment(variable, value)
+                inferences = inference(csp, variable, assignment)
+                if inferences == 'failure':
+                    csp.undo(mark)
+                    csp.unassign(variable, assignment)
+                    if on_failure is not None:
+                        on_failure(csp, variable, assignment)
+                    continue
+                csp.add_inferences(inferences)
+            frame[2] = mark
+            break
+        else:
+            # Every value failed, so backtrack to the previous frame
+            stack.pop()
+            continue
+        if csp.is_complete(assignment):
+            return assignment
+        if stop is not None and stop(csp):
+            raise SearchInterrupted([(frame[0], assignment[frame[0]]) for frame in stack], [list(frame[1]) for frame in stack])
+        variable = select_unassigned_variable(csp, assignment)
+        stack.append([variable, iter(order_domain_values(csp, variable, assignment)), None])
     return None
 
 def print_problem(variable_heuristic, value_heuristic, inference):
@@ -103,5 +270,6 @@ def print_problem(variable_heuristic, value_heuristic, inference):
     """
     print("CSP problem attributes: ")
     for type_, function in {"Variable ordering heuristic": variable_heuristic, "Value ordering heuristic": value_heuristic, "Inference type": inference}.items():
-        print(f"\t{type_} -> {function.__name__ if function else None}")
+        name = getattr(function, '__name__', type(function).__name__) if function else None
+        print(f"\t{type_} -> {name}")
     print()
\ No newline at end of file
@@ -0,0 +1,160 @@
+from collections import deque
+import glob
+import json
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import signal
+import sys
+from time import time
+
+from graphcoloring import GraphColoringCSP
+from instrumentation import Instrumentation
+
+"""
+This module contains a batch runner that solves many input files at once, one process per instance, with up to
+jobs processes running at a time. Each instance can have a wall-clock budget (timeout seconds) and a node budget
+(max_nodes assignments). The budgets are enforced from the outside: the runner kills the worker of an instance that
+goes over either one, so they apply to every search engine, including the ones that start their own processes
+(each worker runs in its own process group, and the whole group is killed). Workers report their assignments
+through a shared counter, in steps of `NODE_REPORT_INTERVAL`, so a worker can go over its node budget by up to
+that many assignments (plus the time until the runner next checks) before it is killed.
+
+The result of each instance is written as one JSON line as soon as it finishes, with the keys:
+    file                - The path of the input file
+    status              - 'solved', 'no solution', 'timeout', 'node limit' or 'error: ...'
+    solution            - The solution ({vertex: color}), or null
+    elapsed             - The wall-clock seconds from starting the worker to its result (or to it being killed)
+    assignment_counts   - The number of assignments made (for a killed worker, the last count it reported)
+    statistics          - With statistics=True, the statistics of the search (null for a killed worker)
+"""
+
+NODE_REPORT_INTERVAL = 256
+
+def find_instances(pattern):
+    """
+    Function that returns the sorted paths of the input files given by pattern: the files in a directory, a glob
+    pattern (e.g., `assets/input_files/gc_*.txt`) or the path of a single file.
+    """
+    if os.path.isdir(pattern):
+        return sorted(os.path.join(pattern, name) for name in os.listdir(pattern) if os.path.isfile(os.path.join(pattern, name)))
+    return sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+def count_assignments(nodes):
+    """
+    Function that makes every `GraphColoringCSP.assign` in this process (and in the processes it starts) add to the
+    shared counter nodes, NODE_REPORT_INTERVAL assignments at a time. Only used in batch worker processes.
+    """
+    assign = GraphColoringCSP.assign
+    count = 0
+    def counted_assign(self, variable, value, assignment):
+        nonlocal count
+        assign(self, variable, value, assignment)
+        count += 1
+        if count == NODE_REPORT_INTERVAL:
+            count = 0
+            with nodes.get_lock():
+                nodes.value += NODE_REPORT_INTERVAL
+    GraphColoringCSP.assign = counted_assign
+
+def run_instance(filepath, options, nodes, connection, statistics=False):
+    """
+    Worker process for `run_batch`: solves one input file with `main.solve_csp` and sends
+    (status, solution, assignment_counts, statistics) through connection, where statistics is the dictionary of the
+    `instrumentation.SearchStatistics` of the search if statistics=True, and None otherwise. Each worker has its own pipe, so killing a worker
+    cannot leave a partly written result where other workers' results are read from.
+    """
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp() # So the runner can kill this worker together with any processes it starts
+    # main imports this module, so it is imported here rather than at the top
+    from main import solve_csp
+    options = dict(options)
+    cache = options.pop('cache', None)
+    domain_backend = options.pop('domain_backend', 'list')
+    try:
+        count_assignments(nodes)
+        csp = GraphColoringCSP.from_file(filepath, domain_backend=domain_backend, cache=cache)
+        instrumentation = Instrumentation() if statistics else None
+        status, solution = solve_csp(csp, verbose=False, instrumentation=instrumentation, return_status=True, **options)
+        # A search given time_limit stops itself with the status 'timeout' (see `checkpoint.bounded_search`)
+        connection.send(('no solution' if status == 'unsat' else status, solution, csp.assignment_counts,
+                         instrumentation.statistics.as_dict() if statistics else None))
+    except Exception as error:
+        connection.send((f'error: {error!r}', None, nodes.value, None))
+
+def kill(worker):
+    """
+    Function that kills a worker process and every process in its process group.
+    """
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(worker.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    if worker.is_alive():
+        worker.kill()
+    worker.join()
+
+def run_batch(instances, options=None, jobs=None, timeout=None, max_nodes=None, output=sys.stdout, poll=0.05, statistics=False):
+    """
+    Function that solves the input files in instances (a list of paths, or a directory or glob pattern, see
+    `find_instances`) with up to jobs worker processes at a time (None means one per CPU), as described above.
+    options are the keyword arguments of `main.solve` (e.g., select_unassigned_variable, inference, engine, cache).
+    Each result is written to output as a JSON line as soon as it is known (output=None writes nothing), and the
+    list of results is returned in the order the instances finished. If statistics=True, the searches are
+    instrumented and each result also has the statistics of its search (see `instrumentation.SearchStatistics`).
+    """
+    if isinstance(instances, str):
+        instances = find_instances(instances)
+    jobs = jobs or os.cpu_count()
+    options = options or {}
+    pending = deque(enumerate(instances))
+    running = {} # index -> (worker, start time, shared node counter, receiving end of its pipe)
+    finished = []
+    def report(index, status, solution, assignment_counts, end, search_statistics=None):
+        _, start, _, connection = running.pop(index)
+        connection.close()
+        result = {'file': instances[index], 'status': status, 'solution': solution, 'elapsed': end - start, 'assignment_counts': assignment_counts}
+        if statistics:
+            result['statistics'] = search_statistics
+        finished.append(result)
+        if output is not None:
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+    try:
+        while pending or running:
+            while pending and len(running) < jobs:
+                index, filepath = pending.popleft()
+                nodes = multiprocessing.Value('q', 0)
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                # Not a daemon, so engines that start their own processes can run in the worker
+                worker = multiprocessing.Process(target=run_instance, args=(filepath, options, nodes, sender, statistics))
+                worker.start()
+                sender.close()
+                running[index] = (worker, time(), nodes, receiver)
+            ready = wait([receiver for _, _, _, receiver in running.values()], timeout=poll)
+            now = time()
+            for index, (worker, start, nodes, receiver) in list(running.items()):
+                if receiver in ready:
+                    try:
+                        status, solution, assignment_counts, search_statistics = receiver.recv()
+                    except EOFError:
+                        # The worker died without sending a result (e.g., it ran out of memory)
+                        worker.join()
+                        report(index, f'error: exit code {worker.exitcode}', None, nodes.value, now)
+                        continue
+                    worker.join()
+                    report(index, status, solution, assignment_counts, now, search_statistics)
+                    continue
+                if timeout is not None and now - start > timeout:
+                    status = 'timeout'
+                elif max_nodes is not None and nodes.value >= max_nodes:
+                    status = 'node limit'
+                else:
+                    continue
+                kill(worker)
+                report(index, status, None, nodes.value, now)
+    finally:
+        for worker, _, _, _ in running.values():
+            kill(worker)
+    return finished
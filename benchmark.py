@@ -0,0 +1,296 @@
+import csv
+import gc
+from itertools import product
+import json
+import os
+import random
+from statistics import median
+import sys
+from time import perf_counter
+import tracemalloc
+
+from backtracking import backtracking_search
+from batch import find_instances
+from fileparser import build_csr, parse_csr
+from graphcoloring import GraphColoringCSP
+from heuristics import IncrementalMRV, lcv, mrv, static_ordering, unordered_domain_values
+from inference import forward_checking, maintain_arc_consistency, maintain_arc_consistency_ne
+
+"""
+This module contains a benchmark of the search over every combination of variable ordering, value ordering and
+inference method, on the input files and on randomly generated graphs. Each combination is run several times
+(repetitions) on each instance, and the benchmark records:
+    time            - The median wall-clock seconds of the search (time_min and time_max are the fastest and slowest runs)
+    nodes           - The number of assignments made
+    backtracks      - The number of assignments undone because the subtree under them failed
+    propagations    - The number of times the inference method was called
+    peak_memory     - The peak memory allocated by the search in bytes, measured with tracemalloc in one extra run
+                      (tracemalloc slows the search down, so it is not used in the timed runs)
+The search is deterministic, so the counts are the same in every repetition. Each run has a node budget, and runs that
+go over it are recorded with the status 'node limit' instead of running for hours.
+
+Results are written as CSV or JSON (by the extension of the output file), and can be compared with a saved baseline:
+a combination regresses if its fastest time (time_min, which is less affected by other load on the machine than the
+median) grew by more than the threshold, for runs that take at least min_time seconds since shorter runs are mostly
+noise, or if its node count grew by more than the threshold.
+"""
+
+variable_orderings = {
+    'mrv': lambda: mrv,
+    'imrv': IncrementalMRV, # A new object for each run, since it keeps state for one search
+    'static': lambda: static_ordering
+}
+
+value_orderings = {
+    'lcv': lcv,
+    'unordered': unordered_domain_values
+}
+
+inference_methods = {
+    'fc': forward_checking,
+    'mac': maintain_arc_consistency,
+    'mac-ne': maintain_arc_consistency_ne,
+    'none': None
+}
+
+# Generated instances: (name, vertices, edge probability, colors, seed)
+default_generated = [
+    ('gnp-40-0.15-k3', 40, 0.15, 3, 0),
+    ('gnp-60-0.10-k4', 60, 0.10, 4, 1),
+    ('gnp-80-0.08-k4', 80, 0.08, 4, 2),
+    ('gnp-50-0.20-k5', 50, 0.20, 5, 3),
+]
+
+class NodeLimitExceeded(Exception):
+    pass
+
+def random_graph(vertices, probability, colors, seed=0):
+    """
+    Function that returns a `CSRGraph` with the given number of vertices, where each pair of vertices is joined by an
+    edge with the given probability (the G(n, p) model), drawn from a generator seeded with seed.
+    """
+    generator = random.Random(seed)
+    sources, targets = [], []
+    for vertex in range(vertices):
+        for neighbor in range(vertex + 1, vertices):
+            if generator.random() < probability:
+                sources.append(vertex)
+                targets.append(neighbor)
+    return build_csr(colors, sources, targets)
+
+def count_calls(csp, max_nodes=None):
+    """
+    Function that counts the calls the search makes to csp: assign (nodes), unassign (backtracks) and
+    add_assignment, which every inference method is called right after (propagations). The counters are
+    instance attributes wrapping the methods of csp, so nothing changes for other GraphColoringCSP objects.
+    Raises `NodeLimitExceeded` from assign once max_nodes assignments have been made.
+    Returns the dictionary of counters.
+    """
+    counts = {'nodes': 0, 'backtracks': 0, 'propagations': 0}
+    assign, unassign, add_assignment = csp.assign, csp.unassign, csp.add_assignment
+    def counted_assign(variable, value, assignment):
+        if max_nodes is not None and counts['nodes'] >= max_nodes:
+            raise NodeLimitExceeded()
+        counts['nodes'] += 1
+        assign(variable, value, assignment)
+    def counted_unassign(variable, assignment):
+        counts['backtracks'] += 1
+        unassign(variable, assignment)
+    def counted_add_assignment(variable, value):
+        counts['propagations'] += 1
+        add_assignment(variable, value)
+    csp.assign, csp.unassign, csp.add_assignment = counted_assign, counted_unassign, counted_add_assignment
+    return counts
+
+def run_once(graph, variable_ordering, value_ordering, inference, engine='iterative', domain_backend='list', max_nodes=None, measure_memory=False):
+    """
+    Function that solves graph (a `CSRGraph`) once with the named heuristics and inference method, and returns a
+    dictionary with the status, time, counts and (if measure_memory=True) peak memory of the run.
+    """
+    csp = GraphColoringCSP.from_csr(graph, domain_backend=domain_backend)
+    counts = count_calls(csp, max_nodes)
+    if measure_memory:
+        tracemalloc.start()
+    # As in timeit, garbage collection is turned off while the search is timed, since when it runs is mostly chance
+    collecting = gc.isenabled()
+    gc.disable()
+    start = perf_counter()
+    try:
+        solution = backtracking_search(csp, verbose=False, select_unassigned_variable=variable_orderings[variable_ordering](),
+                                       order_domain_values=value_orderings[value_ordering], inference=inference_methods[inference], engine=engine)
+        status = 'solved' if solution is not None else 'no solution'
+    except NodeLimitExceeded:
+        status = 'node limit'
+    finally:
+        elapsed = perf_counter() - start
+        if collecting:
+            gc.enable()
+    result = dict(status=status, time=elapsed, **counts)
+    if measure_memory:
+        result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+def load_instances(files=None, generated=None):
+    """
+    Function that returns a list of (name, CSRGraph) instances: the input files given by files (a directory or glob
+    pattern, see `batch.find_instances`, `assets/input_files` by default) and the generated graphs (default_generated
+    by default, each given as (name, vertices, probability, colors, seed)).
+    """
+    files = os.path.join("assets", "input_files") if files is None else files
+    generated = default_generated if generated is None else generated
+    instances = [(os.path.basename(path), parse_csr(path)) for path in find_instances(files)] if files else []
+    instances.extend((name, random_graph(vertices, probability, colors, seed)) for name, vertices, probability, colors, seed in generated)
+    return instances
+
+def run_benchmark(instances, variable_ordering_names=None, value_ordering_names=None, inference_names=None, repetitions=3,
+                  engine='iterative', domain_backend='list', max_nodes=10000, measure_memory=True, verbose=False):
+    """
+    Function that runs every combination of the named variable orderings, value orderings and inference methods
+    (all of them by default) repetitions times on each (name, CSRGraph) instance, and returns one result dictionary
+    per instance and combination, as described above.
+    """
+    combinations = list(product(variable_ordering_names or variable_orderings, value_ordering_names or value_orderings,
+                                inference_names or inference_methods))
+    results = []
+    for name, graph in instances:
+        for variable_ordering, value_ordering, inference in combinations:
+            runs = [run_once(graph, variable_ordering, value_ordering, inference, engine, domain_backend, max_nodes) for _ in range(repetitions)]
+            times = [run['time'] for run in runs]
+            result = {'instance': name, 'variable_ordering': variable_ordering, 'value_ordering': value_ordering, 'inference': inference,
+                      'engine': engine, 'status': runs[0]['status'], 'repetitions': repetitions, 'time': median(times),
+                      'time_min': min(times), 'time_max': max(times), 'nodes': runs[0]['nodes'], 'backtracks': runs[0]['backtracks'],
+                      'propagations': runs[0]['propagations'], 'peak_memory': None}
+            if measure_memory:
+                result['peak_memory'] = run_once(graph, variable_ordering, value_ordering, inference, engine, domain_backend, max_nodes, measure_memory=True)['peak_memory']
+            results.append(result)
+            if verbose:
+                print(f"{name} {variable_ordering}/{value_ordering}/{inference} -> {result['status']} in {result['time']:.4f}s, "
+                      f"{result['nodes']} nodes, {result['backtracks']} backtracks")
+    return results
+
+def key(result):
+    return (result['instance'], result['variable_ordering'], result['value_ordering'], result['inference'], result['engine'])
+
+fields = ['instance', 'variable_ordering', 'value_ordering', 'inference', 'engine', 'status', 'repetitions', 'time', 'time_min', 'time_max',
+          'nodes', 'backtracks', 'propagations', 'peak_memory']
+numeric_fields = {'repetitions': int, 'time': float, 'time_min': float, 'time_max': float, 'nodes': int, 'backtracks': int,
+                  'propagations': int, 'peak_memory': int}
+
+def write_results(results, path, fieldnames=None):
+    """
+    Function that writes results to path, as JSON if path ends with .json and as CSV otherwise (with the columns
+    fieldnames, the fields of the benchmark results by default).
+    """
+    with open(path, 'w', newline='') as file:
+        if path.endswith('.json'):
+            json.dump(results, file, indent=2)
+        else:
+            writer = csv.DictWriter(file, fieldnames=fieldnames or fields)
+            writer.writeheader()
+            writer.writerows(results)
+
+def read_results(path):
+    """
+    Function that reads results written by `write_results`.
+    """
+    with open(path, newline='') as file:
+        if path.endswith('.json'):
+            return json.load(file)
+        results = list(csv.DictReader(file))
+    for result in results:
+        for field, convert in numeric_fields.items():
+            result[field] = convert(result[field]) if result.get(field) not in (None, '') else None
+    return results
+
+def compare(results, baseline, threshold=0.1, min_time=0.01):
+    """
+    Function that compares results with baseline results and returns the regressions: a list of dictionaries with the
+    key fields of the combination, the metric ('time_min' or 'nodes'), its baseline and current values and their ratio.
+    Combinations that are only in one of the two are ignored.
+    """
+    baseline = {key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline.get(key(result))
+        if previous is None:
+            continue
+        for metric in ('time_min', 'nodes'):
+            old, new = previous[metric], result[metric]
+            if metric == 'time_min' and max(old, new) < min_time:
+                continue
+            if new > old * (1 + threshold):
+                regressions.append(dict(zip(fields[:5], key(result)), metric=metric, baseline=old, current=new,
+                                        ratio=new / old if old else float('inf')))
+    return regressions
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark of the graph coloring CSP search over combinations of heuristics and inference methods.")
+    parser.add_argument('--files',
+                    help="Directory or glob pattern of the input files to benchmark ('' for none)",
+                    default=os.path.join("assets", "input_files"))
+    parser.add_argument('--no-generated',
+                    action='store_true',
+                    help="Do not benchmark the generated graphs")
+    parser.add_argument('-var', '--variableorder',
+                    choices=list(variable_orderings),
+                    nargs='+',
+                    help="Variable ordering heuristics (all by default)")
+    parser.add_argument('-val', '--valueorder',
+                    choices=list(value_orderings),
+                    nargs='+',
+                    help="Value ordering heuristics (all by default)")
+    parser.add_argument('-inf', '--inference',
+                    choices=list(inference_methods),
+                    nargs='+',
+                    help="Inference methods (all by default)")
+    parser.add_argument('-eng', '--engine',
+                    choices=['recursive', 'iterative', 'backjumping'],
+                    help="Backtracking search implementation",
+                    default='iterative')
+    parser.add_argument('-dom', '--domains',
+                    choices=['list', 'bitset'],
+                    help="Domain representation",
+                    default='list')
+    parser.add_argument('--repetitions',
+                    type=int,
+                    help="Number of timed runs of each combination on each instance",
+                    default=3)
+    parser.add_argument('--max-nodes',
+                    type=int,
+                    help="Number of assignments after which a run is stopped",
+                    default=10000)
+    parser.add_argument('--no-memory',
+                    action='store_true',
+                    help="Skip the extra run that measures peak memory")
+    parser.add_argument('--output',
+                    help="File to write the results to (.json for JSON, CSV otherwise)",
+                    default=None)
+    parser.add_argument('--baseline',
+                    help="Results file of an earlier run to compare with",
+                    default=None)
+    parser.add_argument('--threshold',
+                    type=float,
+                    help="Relative increase in time or nodes over the baseline that counts as a regression",
+                    default=0.1)
+    parser.add_argument('--min-time',
+                    type=float,
+                    help="Time regressions are only reported for runs that take at least this many seconds",
+                    default=0.01)
+
+    args = parser.parse_args()
+
+    instances = load_instances(args.files, [] if args.no_generated else None)
+    results = run_benchmark(instances, args.variableorder, args.valueorder, args.inference, args.repetitions, args.engine, args.domains,
+                            args.max_nodes, not args.no_memory, verbose=True)
+    if args.output:
+        write_results(results, args.output)
+    if args.baseline:
+        regressions = compare(results, read_results(args.baseline), args.threshold, args.min_time)
+        for regression in regressions:
+            print(f"Regression: {regression['instance']} {regression['variable_ordering']}/{regression['value_ordering']}/{regression['inference']} "
+                  f"{regression['metric']} {regression['baseline']} -> {regression['current']} ({regression['ratio']:.2f}x)")
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
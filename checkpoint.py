@@ -0,0 +1,267 @@
+from collections import namedtuple
+import hashlib
+import json
+import os
+import tempfile
+from time import perf_counter
+
+from backjumping import ConflictDirectedBackjumping
+from backtracking import SearchInterrupted, apply_decisions, backtrack_iterative, print_problem, retract_assignment, verify_solution
+from heuristics import break_color_symmetry, lcv, mrv
+from inference import maintain_arc_consistency
+from instrumentation import Instrumentation
+
+"""
+This module contains a bounded search that can be stopped and resumed: it runs the same search as
+`backtracking.backtrack_iterative` (or, with engine='backjumping', as `backjumping.ConflictDirectedBackjumping`), but stops with the status 'timeout' once it runs out of time or nodes, or when it
+is cancelled, and it can save its state to a checkpoint file that a new process resumes from.
+
+The state of the search is its frontier: the parts of the search tree it has not explored yet, each given by the
+decisions ((variable, value) pairs) that lead to it, like the subtrees of `parallel.parallel_tree_search`. When the
+search is interrupted, the decisions on its current branch become one entry of the frontier, and each value left to
+try at each depth of the branch becomes another. Resuming a subtree makes its decisions again with inference (see
+`backtracking.apply_decisions`), which gives back exactly the pruned domains the search had there, so the domains
+themselves are not saved. The frontier is explored in depth-first order, so a resumed search continues where it
+stopped instead of starting over in a different part of the tree. The backjumping engine searches each subtree with
+the decisions leading to it fixed (see `ConflictDirectedBackjumping.apply_decisions`): a jump back to one of them
+ends the subtree, so it can explore more than one uninterrupted search would, but its nogoods hold everywhere, and
+are kept across subtrees and saved with the checkpoint.
+
+A checkpoint is a JSON file with:
+    fingerprint     - A hash of the graph and the number of colors, so a checkpoint is never resumed on another problem
+    status          - 'running', or the final status ('solved' or 'unsat') once the search has finished
+    frontier        - The subtrees left to explore, deepest last (the next one to explore)
+    solution        - The solution, once the search has found one
+    statistics      - The `instrumentation.SearchStatistics` so far, which keep adding up across resumed runs
+    nogoods         - The nogoods learned by the backjumping engine, as lists of (variable, value) pairs
+    weights         - The failure counts learned by dom/wdeg, if the variable ordering is `heuristics.RandomizedMRV` with
+                      weighted=True (only available through the API; the command line orderings learn nothing)
+It is written to a temporary file and renamed, so a process killed while writing leaves the previous checkpoint.
+"""
+
+SearchResult = namedtuple('SearchResult', ['status', 'solution', 'statistics'])
+
+def graph_fingerprint(csp):
+    """
+    Function that returns a hash of the graph and the number of colors of csp.
+    """
+    digest = hashlib.sha1(str(csp.colors).encode())
+    for values in (csp.graph.labels, csp.graph.offsets, csp.graph.indices):
+        digest.update(memoryview(values).cast('B'))
+    return digest.hexdigest()
+
+class BoundedSearch:
+    """
+    Class implementing the bounded search described above.
+
+    arguments:
+        :csp: - The `GraphColoringCSP` to solve
+        :select_unassigned_variable: - A function representing the variable ordering heuristic (e.g., mrv)
+        :order_domain_values: - A function representing the value ordering heuristic (e.g., lcv)
+        :inference: - A function representing the inference method (e.g., forward checking, mac/ac3)
+        :time_limit: - The number of seconds this run may search for (None means no limit)
+        :max_nodes: - The number of assignments this run may make, not counting the ones made again to resume subtrees (None means no limit)
+        :checkpoint: - The path of the checkpoint file (None means no checkpoints). If the file exists, the search resumes from it.
+        :checkpoint_interval: - The number of seconds between checkpoints
+        :cancel: - An object with an is_set method (e.g., a `threading.Event`) that is checked after every assignment:
+            once it is set, the search saves a checkpoint and stops with the status 'timeout'
+        :symmetry_breaking: - If True, the value ordering is wrapped with `heuristics.break_color_symmetry`
+        :engine: - 'iterative' (chronological backtracking) or 'backjumping' (conflict-directed backjumping)
+        :max_nogoods: - The maximum number of nogoods kept by the backjumping engine
+        :instrumentation: - The `instrumentation.Instrumentation` that collects the statistics (a new one by default)
+
+    After `search` returns, these attributes report what the search did:
+        :reason: - Why a search with the status 'timeout' stopped: 'time', 'nodes' or 'cancelled'
+        :checkpoints: - How many checkpoints were written
+        :resumed: - Whether the search was resumed from a checkpoint
+    """
+    def __init__(self, csp, select_unassigned_variable=mrv, order_domain_values=lcv, inference=maintain_arc_consistency, time_limit=None,
+                 max_nodes=None, checkpoint=None, checkpoint_interval=60, cancel=None, symmetry_breaking=False, engine='iterative', max_nogoods=10000,
+                 instrumentation=None) -> None:
+        if engine not in ('iterative', 'backjumping'):
+            raise ValueError(f"The bounded search does not support engine {engine}")
+        self.csp = csp
+        self.select_unassigned_variable = select_unassigned_variable
+        self.order_domain_values = break_color_symmetry(order_domain_values) if symmetry_breaking else order_domain_values
+        self.inference = inference
+        self.time_limit = time_limit
+        self.max_nodes = max_nodes
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.cancel = cancel
+        self.engine = engine
+        self.max_nogoods = max_nogoods
+        self.backjumping = None
+        self.instrumentation = Instrumentation() if instrumentation is None else instrumentation
+        self.reason = None
+        self.checkpoints = 0
+        self.resumed = False
+
+    def load(self):
+        """
+        Method that returns the saved state of the search from the checkpoint file, or None if there is no checkpoint.
+        Raises a ValueError if the checkpoint was saved for a different problem.
+        """
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return None
+        with open(self.checkpoint) as file:
+            state = json.load(file)
+        if state['fingerprint'] != graph_fingerprint(self.csp):
+            raise ValueError(f"Checkpoint {self.checkpoint} was saved for a different problem")
+        return state
+
+    def save(self, status, frontier, solution=None):
+        """
+        Method that writes the state of the search to the checkpoint file.
+        """
+        statistics = self.instrumentation.statistics
+        weights = getattr(self.select_unassigned_variable, 'failures', None)
+        state = {
+            'fingerprint': graph_fingerprint(self.csp),
+            'status': status,
+            'frontier': frontier,
+            'solution': None if solution is None else list(solution.items()),
+            'statistics': statistics.as_dict(),
+            'nogoods': None if self.backjumping is None else [sorted(nogood) for nogood in self.backjumping.nogoods],
+            'weights': None if weights is None else list(weights.items())
+        }
+        directory = os.path.dirname(os.path.abspath(self.checkpoint))
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(state, file)
+            os.replace(temporary, self.checkpoint)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        self.checkpoints += 1
+
+    def restore(self, state):
+        """
+        Method that restores the statistics and learned nogoods and weights from a saved state, and returns its frontier.
+        """
+        self.resumed = True
+        statistics = self.instrumentation.statistics
+        for field, value in state['statistics'].items():
+            if field == 'failures':
+                statistics.failures.update(value)
+            else:
+                setattr(statistics, field, getattr(statistics, field) + value if field != 'max_depth' else max(statistics.max_depth, value))
+        weights = getattr(self.select_unassigned_variable, 'failures', None)
+        if weights is not None and state['weights']:
+            weights.update((variable, count) for variable, count in state['weights'])
+        if self.backjumping is not None and state.get('nogoods'):
+            for nogood in state['nogoods']:
+                self.backjumping.add_nogood(frozenset(tuple(pair) for pair in nogood))
+        return [[tuple(decision) for decision in prefix] for prefix in state['frontier']]
+
+    def search(self):
+        """
+        Method that runs the search and returns a `SearchResult` (status, solution, statistics), where status is
+        'solved', 'unsat' or 'timeout'.
+        """
+        csp = self.csp
+        instrumentation = self.instrumentation
+        state = self.load()
+        if self.engine == 'backjumping':
+            self.backjumping = ConflictDirectedBackjumping(csp, self.select_unassigned_variable, self.order_domain_values, self.inference, self.max_nogoods)
+        if state is not None and state['status'] != 'running':
+            # The search had already finished
+            self.restore(state)
+            solution = None if state['solution'] is None else dict(state['solution'])
+            return SearchResult(state['status'], solution, instrumentation.statistics)
+        frontier = [[]] if state is None else self.restore(state)
+        select_unassigned_variable, order_domain_values, inference = instrumentation.wrap(self.select_unassigned_variable, self.order_domain_values, self.inference)
+        backjumping = self.backjumping
+        if backjumping is not None:
+            # As in `backtracking.backtracking_search`, the propagate method that mirrors the inference is what gets timed
+            backjumping.select_unassigned_variable, backjumping.order_domain_values = select_unassigned_variable, order_domain_values
+            backjumping.propagate = instrumentation.wrap_propagate(backjumping.propagate, self.inference)
+        record_failure = getattr(self.select_unassigned_variable, 'record_failure', None)
+        start = perf_counter()
+        deadline = None if self.time_limit is None else start + self.time_limit
+        node_limit = None if self.max_nodes is None else csp.assignment_counts + self.max_nodes
+        replayed = 0 # Assignments made to resume subtrees, which do not count against max_nodes
+        next_checkpoint = None if self.checkpoint is None else start + self.checkpoint_interval
+        checkpoint_due = False
+        solution = None
+        def stop(csp):
+            nonlocal checkpoint_due
+            if node_limit is not None and csp.assignment_counts - replayed >= node_limit:
+                self.reason = 'nodes'
+            elif self.cancel is not None and self.cancel.is_set():
+                self.reason = 'cancelled'
+            elif deadline is not None or next_checkpoint is not None:
+                now = perf_counter()
+                if deadline is not None and now >= deadline:
+                    self.reason = 'time'
+                elif next_checkpoint is not None and now >= next_checkpoint:
+                    checkpoint_due = True
+            return self.reason is not None or checkpoint_due
+        with instrumentation.attached(csp):
+            while frontier:
+                prefix = frontier.pop()
+                mark = csp.mark()
+                assignment = {} if backjumping is None else backjumping.assignment
+                try:
+                    before = csp.assignment_counts
+                    applied = apply_decisions(csp, assignment, prefix, inference) if backjumping is None else backjumping.apply_decisions(prefix)
+                    replayed += csp.assignment_counts - before
+                    if not applied:
+                        continue
+                    try:
+                        if backjumping is None:
+                            solution = backtrack_iterative(csp, assignment, select_unassigned_variable, order_domain_values, inference, stop, record_failure)
+                        else:
+                            solution = backjumping.search(stop)
+                    except SearchInterrupted as interrupted:
+                        # Push the unexplored part of the subtree so the current branch is explored next, then the
+                        # values left at its deepest decision, and so on up to the root of the subtree
+                        path, open_values = interrupted.path, interrupted.open_values
+                        for depth, values in enumerate(open_values):
+                            variable = path[depth][0]
+                            frontier.extend(prefix + path[:depth] + [(variable, value)] for value in reversed(values))
+                        frontier.append(prefix + path)
+                        if self.reason is not None:
+                            break
+                        checkpoint_due = False
+                        self.save('running', frontier)
+                        next_checkpoint = perf_counter() + self.checkpoint_interval
+                        continue
+                    if solution is not None:
+                        solution = dict(solution)
+                        break
+                finally:
+                    retract_assignment(csp, assignment, mark)
+                    if backjumping is not None:
+                        backjumping.reset()
+        if self.reason is not None:
+            status = 'timeout'
+        else:
+            status = 'solved' if solution is not None else 'unsat'
+            frontier = []
+        if self.checkpoint is not None:
+            self.save('running' if status == 'timeout' else status, frontier, solution if status == 'solved' else None)
+        return SearchResult(status, solution if status == 'solved' else None, instrumentation.statistics)
+
+def bounded_search(csp, verbose=True, select_unassigned_variable=mrv, order_domain_values=lcv, inference=maintain_arc_consistency, verify=False,
+                   time_limit=None, max_nodes=None, checkpoint=None, checkpoint_interval=60, cancel=None, symmetry_breaking=False, engine='iterative',
+                   max_nogoods=10000, instrumentation=None):
+    """
+    Function that runs the bounded search (see `BoundedSearch`) and returns a `SearchResult` (status, solution, statistics).
+    """
+    search = BoundedSearch(csp, select_unassigned_variable, order_domain_values, inference, time_limit, max_nodes, checkpoint,
+                           checkpoint_interval, cancel, symmetry_breaking, engine, max_nogoods, instrumentation)
+    if verbose:
+        print_problem(select_unassigned_variable, order_domain_values, inference)
+    result = search.search()
+    if verbose:
+        reason = f" ({search.reason})" if search.reason else ''
+        resumed = ', resumed from checkpoint' if search.resumed else ''
+        saved = f", {search.checkpoints} checkpoint(s) written to {checkpoint}" if search.checkpoints else ''
+        print(f"Status: {result.status}{reason}{resumed}{saved}\n")
+        if search.backjumping is not None:
+            print(f"Backjumps: {search.backjumping.backjumps}, nogoods learned: {search.backjumping.nogoods_learned}, nogoods kept: {len(search.backjumping.nogoods)}\n")
+    if verify:
+        verify_solution(csp, result.solution)
+    return result
@@ -0,0 +1,195 @@
+"""
+This module contains the domain stores used by `GraphColoringCSP`. A domain store maps each
+vertex to the colors still available to it, and supports the operations used by the heuristics,
+inference methods and backtracking search:
+    size(variable)              - number of values left in the domain
+    contains(variable, value)   - whether value is still in the domain
+    domain(variable)            - the values left in the domain, as a list
+    remove(variable, value)     - prune a value from the domain
+    reduce_to(variable, value)  - reduce the domain to a single value (an assignment)
+    mark() / undo(mark)         - every change is recorded on a single undo trail, so a search level
+                                  takes a mark before it changes anything and undoes back to it on failure
+Objects in a store's `watchers` list have their `on_domain_change(variable)` method called whenever the
+domain of a variable changes, including when a change is undone. This is how incremental heuristics
+(e.g., `heuristics.IncrementalMRV`) keep their state up to date.
+
+Three backends are available. `ListDomains` keeps each domain as a list of colors, and `BitsetDomains`
+keeps each domain as an integer bitmask where bit c is set if color c is still available. The 'numpy'
+backend (`vectorized.NumpyDomains`, which needs NumPy) keeps the bitmasks in a NumPy array, for the
+vectorized inference functions and heuristics of the `vectorized` module.
+"""
+from collections.abc import Mapping
+
+
+if hasattr(int, "bit_count"): # Python 3.10+
+    popcount = int.bit_count
+else:
+    def popcount(mask: int) -> int:
+        """
+        Function that returns the number of set bits in an integer bitmask.
+        """
+        return bin(mask).count("1")
+
+
+def iter_bits(mask: int):
+    """
+    Generator that yields the indices of the set bits of a bitmask in ascending order.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class ListDomains(dict):
+    """
+    Domain store that keeps each domain as a list of colors, i.e., {vertex: [color, ...]}.
+    Domains are never modified in place: a change replaces the list, and the previous list is
+    kept on the trail so undoing restores the values in their original order.
+
+    arguments:
+        :variables: - An iterable of the vertices in the problem
+        :colors: - An integer representing the number of colors for the problem
+    """
+    def __init__(self, variables, colors: int) -> None:
+        super().__init__((variable, list(range(colors))) for variable in variables)
+        self.colors = colors
+        self.trail = []
+        self.watchers = []
+
+    def size(self, variable) -> int:
+        return len(self[variable])
+
+    def contains(self, variable, value) -> bool:
+        return value in self[variable]
+
+    def domain(self, variable) -> list:
+        return self[variable]
+
+    def remove(self, variable, value) -> None:
+        old = self[variable]
+        self.trail.append((variable, old))
+        self[variable] = [x for x in old if x != value]
+        if self.watchers:
+            self.notify(variable)
+
+    def reduce_to(self, variable, value) -> None:
+        self.trail.append((variable, self[variable]))
+        self[variable] = [value]
+        if self.watchers:
+            self.notify(variable)
+
+    def restore(self, variable, value) -> None:
+        """
+        Method to add a value back into a domain without using the trail.
+        """
+        self[variable] = self[variable] + [value]
+        if self.watchers:
+            self.notify(variable)
+
+    def mark(self) -> int:
+        return len(self.trail)
+
+    def undo(self, mark: int) -> None:
+        trail = self.trail
+        while len(trail) > mark:
+            variable, old = trail.pop()
+            self[variable] = old
+            if self.watchers:
+                self.notify(variable)
+
+    def notify(self, variable) -> None:
+        for watcher in self.watchers:
+            watcher.on_domain_change(variable)
+
+
+class BitsetDomains(Mapping):
+    """
+    Domain store that keeps each domain as an integer bitmask, so membership is a single bit test,
+    the domain size is a popcount, and the trail only has to save one integer per change.
+    Indexing the store (e.g., `domains[vertex]`) returns the domain decoded as a sorted list of colors
+    so it compares equal to a `ListDomains` store holding the same values.
+
+    arguments:
+        :variables: - An iterable of the vertices in the problem
+        :colors: - An integer representing the number of colors for the problem
+    """
+    def __init__(self, variables, colors: int) -> None:
+        self.colors = colors
+        self.full_mask = (1 << colors) - 1
+        self.masks = {variable: self.full_mask for variable in variables}
+        self.trail = []
+        self.watchers = []
+
+    def __getitem__(self, variable) -> list:
+        return list(iter_bits(self.masks[variable]))
+
+    def __iter__(self):
+        return iter(self.masks)
+
+    def __len__(self) -> int:
+        return len(self.masks)
+
+    def __repr__(self) -> str:
+        return repr({variable: self[variable] for variable in self.masks})
+
+    def size(self, variable) -> int:
+        return popcount(self.masks[variable])
+
+    def contains(self, variable, value) -> bool:
+        return (self.masks[variable] >> value) & 1 == 1
+
+    def domain(self, variable) -> list:
+        return list(iter_bits(self.masks[variable]))
+
+    def remove(self, variable, value) -> None:
+        mask = self.masks[variable]
+        self.trail.append((variable, mask))
+        self.masks[variable] = mask & ~(1 << value)
+        if self.watchers:
+            self.notify(variable)
+
+    def reduce_to(self, variable, value) -> None:
+        self.trail.append((variable, self.masks[variable]))
+        self.masks[variable] = 1 << value
+        if self.watchers:
+            self.notify(variable)
+
+    def restore(self, variable, value) -> None:
+        """
+        Method to add a value back into a domain without using the trail.
+        """
+        self.masks[variable] |= 1 << value
+        if self.watchers:
+            self.notify(variable)
+
+    def mark(self) -> int:
+        return len(self.trail)
+
+    def undo(self, mark: int) -> None:
+        trail = self.trail
+        masks = self.masks
+        while len(trail) > mark:
+            variable, mask = trail.pop()
+            masks[variable] = mask
+            if self.watchers:
+                self.notify(variable)
+
+    def notify(self, variable) -> None:
+        for watcher in self.watchers:
+            watcher.on_domain_change(variable)
+
+
+def numpy_domains(variables, colors: int):
+    """
+    Function that returns a `vectorized.NumpyDomains` store (imported here, as NumPy is optional).
+    """
+    from vectorized import NumpyDomains # vectorized imports this module
+    return NumpyDomains(variables, colors)
+
+
+domain_backends = {
+    'list': ListDomains,
+    'bitset': BitsetDomains,
+    'numpy': numpy_domains
+}
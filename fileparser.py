@@ -1,4 +1,9 @@
-from collections import defaultdict
+from array import array
+from collections import Counter, defaultdict
+from itertools import accumulate, repeat
+from operator import add, floordiv, mod, mul, sub
+import mmap
+import re
 
 
 class FileParser:
@@ -40,4 +45,137 @@ class FileParser:
                     neighbors[edge[1]].add(edge[0])
         csp_payload["edges"] = edges
         csp_payload["neighbors"] = neighbors
-        return csp_payload
\ No newline at end of file
+        return csp_payload
+
+
+class CSRGraph:
+    """
+    A class representing a graph in compressed sparse row (CSR) form. The vertices are given contiguous ids
+    0, ..., n-1 in ascending order of their labels (the vertex numbers in the input file), and the neighbors of the
+    vertex with id i are the ids indices[offsets[i]:offsets[i + 1]], in ascending order. Every edge appears once in
+    the row of each of its endpoints. All three sequences are `array` objects of 64-bit integers.
+
+    arguments:
+        :colors: - An integer representing the number of colors for the problem
+        :labels: - The label of each vertex id
+        :offsets: - n + 1 offsets into indices
+        :indices: - The neighbor ids of every vertex, row after row
+    """
+    __slots__ = ('colors', 'labels', 'offsets', 'indices')
+
+    def __init__(self, colors, labels, offsets, indices) -> None:
+        self.colors = colors
+        self.labels = labels
+        self.offsets = offsets
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __repr__(self) -> str:
+        return f"<CSRGraph: {len(self.labels)} vertices, {self.edge_count()} edges, {self.colors} colors>"
+
+    def edge_count(self) -> int:
+        loops = sum(1 for vertex in range(len(self.labels)) if vertex in self.row(vertex))
+        return (len(self.indices) + loops) // 2
+
+    def row(self, vertex):
+        """
+        Method that returns the neighbor ids of the vertex with id vertex.
+        """
+        return self.indices[self.offsets[vertex]:self.offsets[vertex + 1]]
+
+    def edges(self):
+        """
+        Generator that yields each edge once as a pair of labels (smaller label first).
+        """
+        labels, offsets, indices = self.labels, self.offsets, self.indices
+        for vertex in range(len(labels)):
+            for position in range(offsets[vertex], offsets[vertex + 1]):
+                neighbor = indices[position]
+                if neighbor >= vertex:
+                    yield labels[vertex], labels[neighbor]
+
+    def adjacency(self) -> dict:
+        """
+        Method that returns the adjacency as a dictionary of sets of labels, like `FileParser` does.
+        """
+        labels, offsets, indices = self.labels, self.offsets, self.indices
+        if labels[0] == 0 and labels[-1] == len(labels) - 1:
+            # Labels are already 0, ..., n-1, so ids are labels
+            return {vertex: set(indices[offsets[vertex]:offsets[vertex + 1]]) for vertex in range(len(labels))}
+        return {labels[vertex]: {labels[neighbor] for neighbor in indices[offsets[vertex]:offsets[vertex + 1]]} for vertex in range(len(labels))}
+
+
+IGNORED_LINES = re.compile(rb'^[ \t]*(?:#|colors).*$', re.MULTILINE | re.IGNORECASE)
+COLORS_PATTERN = re.compile(rb'^[ \t]*colors[ \t]*=[ \t]*(\d+)', re.MULTILINE | re.IGNORECASE)
+
+def parse_csr(filepath: str, use_mmap: bool = False, chunk_size: int = 1 << 24) -> CSRGraph:
+    """
+    Function to parse a graph coloring problem input file straight into a `CSRGraph`, for large files.
+    The file is read in binary chunks of chunk_size bytes (or mapped into memory with mmap if use_mmap=True).
+    In each chunk, the comment and colors lines are blanked out with one regular expression, and what is left is
+    split into integers in bulk, so the edge lines are never split and stripped one by one. The endpoints go into
+    integer arrays, and `build_csr` removes duplicate edges (e.g., `0,1` and `1,0`) and builds the rows.
+    """
+    colors = None
+    endpoints = array('q')
+    def scan(data):
+        nonlocal colors
+        match = COLORS_PATTERN.search(data)
+        if match is not None:
+            colors = int(match.group(1))
+        endpoints.extend(map(int, IGNORED_LINES.sub(b'', data).replace(b',', b' ').split()))
+    with open(filepath, "rb") as file:
+        if use_mmap:
+            try:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    scan(data)
+            except ValueError: # An empty file cannot be mapped
+                pass
+        else:
+            rest = b''
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    scan(rest)
+                    break
+                # Only scan complete lines, and keep the last partial line for the next chunk
+                chunk = rest + chunk
+                end = chunk.rfind(b'\n') + 1
+                scan(chunk[:end])
+                rest = chunk[end:]
+    if colors is None:
+        raise ValueError(f"No colors line in {filepath}")
+    if len(endpoints) % 2:
+        raise ValueError(f"An edge line in {filepath} does not have two vertices")
+    return build_csr(colors, endpoints[0::2], endpoints[1::2])
+
+def build_csr(colors: int, sources, targets) -> CSRGraph:
+    """
+    Function that builds a `CSRGraph` from two sequences of edge endpoint labels, removing duplicate edges.
+    Each edge is encoded as the integer (source - low) * span + (target - low) in both directions, where low is
+    the lowest label and span the number of possible labels, so duplicates are removed with a set of integers
+    and sorting the codes orders the edges by row and then by neighbor. The work is done with `map` over the
+    arrays rather than in a Python loop.
+    """
+    if not sources:
+        return CSRGraph(colors, array('q'), array('q', [0]), array('q'))
+    low = min(min(sources), min(targets))
+    span = max(max(sources), max(targets)) - low + 1
+    if low:
+        sources = array('q', map(sub, sources, repeat(low, len(sources))))
+        targets = array('q', map(sub, targets, repeat(low, len(targets))))
+    keys = set(map(add, map(mul, sources, repeat(span)), targets))
+    keys.update(map(add, map(mul, targets, repeat(span)), sources))
+    keys = sorted(keys)
+    rows = list(map(floordiv, keys, repeat(span)))
+    indices = array('q', map(mod, keys, repeat(span)))
+    degrees = Counter(rows)
+    labels = sorted(degrees)
+    if len(labels) != span:
+        # Some labels are not used, so renumber the vertices
+        ids = {label: vertex for vertex, label in enumerate(labels)}
+        indices = array('q', map(ids.__getitem__, indices))
+    offsets = array('q', accumulate(map(degrees.__getitem__, labels), initial=0))
+    return CSRGraph(colors, array('q', [label + low for label in labels]), offsets, indices)
@@ -0,0 +1,265 @@
+from array import array
+from math import floor, log, pi, sqrt
+import os
+import random
+
+from fileparser import CSRGraph, build_csr
+
+"""
+This module contains a generator of synthetic graph coloring problems, written in the format of the input files
+(a `colors = k` line followed by one `a,b` line per edge), so they can be solved and benchmarked like any other input
+file. Each model draws from a generator seeded with seed, so the same arguments always give the same graph:
+    gnp        - G(n, p): each pair of vertices is joined with probability p. The edges are drawn by skipping over the
+                 pairs that are not joined (Batagelj and Brandes), so it takes time in proportion to the number of
+                 edges rather than the number of pairs.
+    geometric  - Random geometric graph: vertices are random points in the unit square, and two vertices are joined
+                 if they are at most radius apart. Points are bucketed in a grid of radius-sized cells, so only the
+                 points in neighboring cells are compared.
+    planar     - Planar-like graph: a random Apollonian network (a triangle, into which each new vertex is put in a
+                 random triangular face and joined to its three corners), which is planar and needs 4 colors, with
+                 each edge kept with probability density. Its average degree approaches 6.
+    threshold  - Near-threshold k-colorable graph: every vertex gets a hidden color, and random edges between vertices
+                 with different hidden colors are added until the average degree is the one at which random graphs
+                 stop being k-colorable (see `threshold_degree`). The hidden colors are a solution, so the problem is
+                 satisfiable, and it is about as hard as random problems get.
+    clique     - G(n, p) with a planted clique on clique random vertices. With more clique vertices than colors the
+                 problem has no solution, which only the clique proves.
+Vertices are labelled 0 to n - 1. The input files only list edges, so vertices with no edges are not in the
+generated graph. `generate` gives every model the same parameters (the number of vertices, colors and the average
+degree), which is how `scaling.py` grows the graphs.
+"""
+
+# Average degree at which random graphs stop being k-colorable, from experiments on large random graphs
+THRESHOLD_DEGREES = {3: 4.69, 4: 8.90, 5: 13.69}
+
+DEFAULT_DEGREE = 6
+
+def threshold_degree(colors: int) -> float:
+    """
+    Function that returns the average degree at which random graphs stop being colorable with colors colors
+    (the measured value for 3 to 5 colors, and the asymptotic 2k ln k otherwise).
+    """
+    if colors in THRESHOLD_DEGREES:
+        return THRESHOLD_DEGREES[colors]
+    return 2 * colors * log(colors) if colors > 1 else 0.0
+
+def gnp_edges(vertices, probability, generator, sources, targets) -> None:
+    """
+    Function that appends the edges of a G(n, p) graph on vertices 0 to vertices - 1 to sources and targets.
+    """
+    if probability <= 0:
+        return
+    if probability >= 1:
+        for vertex in range(vertices):
+            for neighbor in range(vertex):
+                sources.append(neighbor)
+                targets.append(vertex)
+        return
+    # The gap to the next pair that is joined follows a geometric distribution
+    scale = log(1 - probability)
+    vertex, neighbor = 1, -1
+    while vertex < vertices:
+        neighbor += 1 + int(log(1 - generator.random()) / scale)
+        while neighbor >= vertex and vertex < vertices:
+            neighbor -= vertex
+            vertex += 1
+        if vertex < vertices:
+            sources.append(neighbor)
+            targets.append(vertex)
+
+def gnp_graph(vertices: int, probability: float, colors: int, seed: int = 0) -> CSRGraph:
+    """
+    Function that returns a G(n, p) graph with the given number of vertices and edge probability.
+    """
+    sources, targets = array('q'), array('q')
+    gnp_edges(vertices, probability, random.Random(seed), sources, targets)
+    return build_csr(colors, sources, targets)
+
+def geometric_graph(vertices: int, radius: float, colors: int, seed: int = 0) -> CSRGraph:
+    """
+    Function that returns a random geometric graph: random points in the unit square joined if they are at most
+    radius apart.
+    """
+    generator = random.Random(seed)
+    points = [(generator.random(), generator.random()) for _ in range(vertices)]
+    size = max(radius, 1e-9)
+    cells = {}
+    for vertex, (x, y) in enumerate(points):
+        cells.setdefault((floor(x / size), floor(y / size)), []).append(vertex)
+    limit = radius * radius
+    sources, targets = array('q'), array('q')
+    for (column, row), members in cells.items():
+        for other_column in (column - 1, column, column + 1):
+            for other_row in (row - 1, row, row + 1):
+                others = cells.get((other_column, other_row))
+                if others is None:
+                    continue
+                for vertex in members:
+                    x, y = points[vertex]
+                    for neighbor in others:
+                        # Each pair is found from both of its cells, so only the one with the smaller vertex first is kept
+                        if neighbor > vertex:
+                            other_x, other_y = points[neighbor]
+                            if (x - other_x) ** 2 + (y - other_y) ** 2 <= limit:
+                                sources.append(vertex)
+                                targets.append(neighbor)
+    return build_csr(colors, sources, targets)
+
+def planar_graph(vertices: int, colors: int, seed: int = 0, density: float = 1.0) -> CSRGraph:
+    """
+    Function that returns a random Apollonian network on the given number of vertices (at least 3), with each edge
+    kept with probability density.
+    """
+    generator = random.Random(seed)
+    edges = [(0, 1), (0, 2), (1, 2)]
+    faces = [(0, 1, 2)]
+    for vertex in range(3, vertices):
+        index = generator.randrange(len(faces))
+        a, b, c = faces[index]
+        edges.extend(((a, vertex), (b, vertex), (c, vertex)))
+        faces[index] = (a, b, vertex)
+        faces.append((b, c, vertex))
+        faces.append((a, c, vertex))
+    sources, targets = array('q'), array('q')
+    for source, target in edges:
+        if density >= 1 or generator.random() < density:
+            sources.append(source)
+            targets.append(target)
+    return build_csr(colors, sources, targets)
+
+def threshold_graph(vertices: int, colors: int, seed: int = 0, degree: float = None) -> CSRGraph:
+    """
+    Function that returns a random graph with a hidden coloring with colors colors, whose average degree is degree
+    (`threshold_degree(colors)` by default).
+    """
+    generator = random.Random(seed)
+    degree = threshold_degree(colors) if degree is None else degree
+    hidden = [generator.randrange(colors) for _ in range(vertices)]
+    sizes = [hidden.count(color) for color in range(colors)]
+    possible = (vertices * vertices - sum(size * size for size in sizes)) // 2
+    wanted = round(degree * vertices / 2)
+    if wanted > possible:
+        raise ValueError(f"A graph with {vertices} vertices and {colors} hidden colors cannot have average degree {degree}")
+    codes = set()
+    while len(codes) < wanted:
+        vertex, neighbor = generator.randrange(vertices), generator.randrange(vertices)
+        if hidden[vertex] != hidden[neighbor]:
+            codes.add(min(vertex, neighbor) * vertices + max(vertex, neighbor))
+    codes = sorted(codes)
+    return build_csr(colors, array('q', (code // vertices for code in codes)), array('q', (code % vertices for code in codes)))
+
+def planted_clique_graph(vertices: int, probability: float, clique: int, colors: int, seed: int = 0) -> CSRGraph:
+    """
+    Function that returns a G(n, p) graph in which clique random vertices are all joined to each other.
+    """
+    generator = random.Random(seed)
+    sources, targets = array('q'), array('q')
+    gnp_edges(vertices, probability, generator, sources, targets)
+    members = sorted(generator.sample(range(vertices), clique))
+    for position, vertex in enumerate(members):
+        for neighbor in members[position + 1:]:
+            sources.append(vertex)
+            targets.append(neighbor)
+    return build_csr(colors, sources, targets)
+
+models = ['gnp', 'geometric', 'planar', 'threshold', 'clique']
+
+def generate(model: str, vertices: int, colors: int, degree: float = None, seed: int = 0, clique: int = None) -> CSRGraph:
+    """
+    Function that returns a graph of the named model with about the given average degree (`DEFAULT_DEGREE` by
+    default, or the threshold for the threshold model). For the planar model the degree sets the density, and is at
+    most 6. The clique model plants a clique on clique vertices (colors by default).
+    """
+    if model not in models:
+        raise ValueError(f"Unknown model {model} (expected one of {', '.join(models)})")
+    if model == 'threshold':
+        return threshold_graph(vertices, colors, seed, degree)
+    degree = DEFAULT_DEGREE if degree is None else degree
+    probability = degree / (vertices - 1) if vertices > 1 else 0.0
+    if model == 'gnp':
+        return gnp_graph(vertices, probability, colors, seed)
+    if model == 'geometric':
+        # Points have an expected n * pi * radius^2 neighbors (a little fewer near the sides of the square)
+        return geometric_graph(vertices, sqrt(degree / (pi * vertices)), colors, seed)
+    if model == 'planar':
+        return planar_graph(vertices, colors, seed, min(1.0, degree / 6))
+    return planted_clique_graph(vertices, probability, colors if clique is None else clique, colors, seed)
+
+def write_instance(path: str, graph: CSRGraph, comment: str = None) -> None:
+    """
+    Function that writes graph to path as an input file: an optional comment line, the colors line, and one line
+    per edge.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as file:
+        if comment:
+            file.write(f"# {comment}\n")
+        file.write(f"# Colors\ncolors = {graph.colors}\n# Graph:\n")
+        lines = []
+        for source, target in graph.edges():
+            lines.append(f"{source},{target}\n")
+            if len(lines) >= 65536:
+                file.writelines(lines)
+                lines.clear()
+        file.writelines(lines)
+
+def instance_name(model: str, vertices: int, colors: int, degree: float = None, seed: int = 0, clique: int = None) -> str:
+    """
+    Function that returns the file name `generate` results are written to, from their parameters.
+    """
+    name = f"{model}-n{vertices}-k{colors}"
+    if degree is not None:
+        name += f"-d{degree:g}"
+    if clique is not None:
+        name += f"-c{clique}"
+    return f"{name}-s{seed}.txt"
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generator of synthetic graph coloring CSP input files.")
+    parser.add_argument('model',
+                    choices=models,
+                    help="Random graph model")
+    parser.add_argument('vertices',
+                    type=int,
+                    help="Number of vertices")
+    parser.add_argument('-k', '--colors',
+                    type=int,
+                    help="Number of colors",
+                    default=3)
+    parser.add_argument('-d', '--degree',
+                    type=float,
+                    help=f"Average degree ({DEFAULT_DEGREE} by default, or the k-colorability threshold for the threshold model)",
+                    default=None)
+    parser.add_argument('--clique',
+                    type=int,
+                    help="Number of vertices of the planted clique of the clique model (the number of colors by default)",
+                    default=None)
+    parser.add_argument('--seed',
+                    type=int,
+                    help="Seed of the random generator",
+                    default=0)
+    parser.add_argument('--count',
+                    type=int,
+                    help="Number of files to write, with seeds seed, seed + 1, ...",
+                    default=1)
+    parser.add_argument('-o', '--output',
+                    help="File to write (or directory, where files are named after their parameters)",
+                    default=os.path.join("assets", "generated"))
+
+    args = parser.parse_args()
+    if args.vertices < (3 if args.model == 'planar' else 2):
+        parser.error("The graph needs more vertices")
+    if args.count > 1 and args.output.endswith('.txt'):
+        parser.error("--count needs an output directory")
+    if args.clique is not None and args.clique > args.vertices:
+        parser.error("The clique cannot have more vertices than the graph")
+
+    for seed in range(args.seed, args.seed + args.count):
+        graph = generate(args.model, args.vertices, args.colors, args.degree, seed, args.clique)
+        path = args.output if args.output.endswith('.txt') else os.path.join(args.output, instance_name(args.model, args.vertices, args.colors, args.degree, seed, args.clique))
+        write_instance(path, graph, f"{args.model} graph with {args.vertices} vertices, seed {seed}, generated by generator.py")
+        print(f"{path}: {len(graph)} vertices, {graph.edge_count()} edges")
@@ -0,0 +1,209 @@
+from array import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from fileparser import CSRGraph, parse_csr
+
+"""
+This module contains an on-disk cache of parsed input files, so a graph that is solved repeatedly (e.g., under
+different settings) is only parsed once. The cache stores the `fileparser.CSRGraph` of a file in a binary file:
+a header followed by the raw bytes of the labels, offsets and indices arrays. Loading a cached graph reads each
+array with a single `array.fromfile` call, or with use_mmap=True maps the cache file into memory and views the
+arrays as memoryviews of it, so nothing is copied and the pages are only read when they are used.
+
+Entries are named after a hash of the absolute path of the input file and a hash of its version, which is either:
+    stat        - the size and modification time of the file (the default, which costs nothing to compute)
+    content     - a hash of the contents of the file (reads the file, but survives a touch or a copy)
+When a file changes, its version changes, so the old entry is never loaded again: it is deleted when the new
+entry is stored. The total size of the cache is bounded by max_bytes: after an entry is stored, the least recently
+used entries are evicted until the cache fits (loading an entry marks it as used by updating its modification time).
+"""
+
+MAGIC = b'GCCSR1' + (b'<' if sys.byteorder == 'little' else b'>') + b'\n' # 8 bytes, so the arrays stay aligned
+HEADER = struct.Struct('=8sqqqq') # magic, colors, number of labels, number of offsets, number of indices
+DEFAULT_CACHE_DIR = os.environ.get('GC_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'graphcoloring'))
+EXTENSION = '.csr'
+
+class GraphCache:
+    """
+    A class representing the cache described above.
+
+    arguments:
+        :directory: - The directory of the cache files (created if it does not exist)
+        :max_bytes: - The maximum total size of the cache files (None means no limit)
+        :key: - How the version of an input file is found, 'stat' or 'content'
+    """
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = 1 << 30, key: str = 'stat') -> None:
+        if key not in ('stat', 'content'):
+            raise ValueError(f"Unknown cache key {key}")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+
+    def entry(self, filepath: str):
+        """
+        Method that returns the prefix shared by every entry of filepath, and the path of the entry for its current version.
+        """
+        path = os.path.abspath(filepath)
+        prefix = hashlib.sha1(path.encode()).hexdigest()[:16]
+        if self.key == 'content':
+            digest = hashlib.sha1()
+            with open(path, 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 20), b''):
+                    digest.update(chunk)
+        else:
+            stat = os.stat(path)
+            digest = hashlib.sha1(f'{stat.st_size}:{stat.st_mtime_ns}'.encode())
+        return prefix, os.path.join(self.directory, f'{prefix}-{digest.hexdigest()[:16]}{EXTENSION}')
+
+    def load(self, filepath: str, use_mmap: bool = False):
+        """
+        Method that returns the cached `CSRGraph` of filepath, or None if it is not in the cache (or the entry is
+        unreadable, e.g., written on a machine with a different byte order).
+        """
+        _, path = self.entry(filepath)
+        try:
+            graph = read_graph(path, use_mmap)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path) # Mark the entry as recently used
+        except OSError:
+            pass
+        return graph
+
+    def store(self, filepath: str, graph: CSRGraph) -> None:
+        """
+        Method that stores graph as the entry of filepath, removes the entries of older versions of filepath, and
+        evicts the least recently used entries if the cache is over max_bytes.
+        """
+        prefix, path = self.entry(filepath)
+        os.makedirs(self.directory, exist_ok=True)
+        write_graph(path, graph)
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and os.path.join(self.directory, name) != path:
+                remove(os.path.join(self.directory, name))
+        self.evict(keep=path)
+
+    def get(self, filepath: str, use_mmap: bool = False) -> CSRGraph:
+        """
+        Method that returns the `CSRGraph` of filepath from the cache, or parses it with `fileparser.parse_csr`
+        and stores it if it is not in the cache.
+        """
+        graph = self.load(filepath, use_mmap)
+        if graph is not None:
+            self.hits += 1
+            return graph
+        self.misses += 1
+        graph = parse_csr(filepath, use_mmap=use_mmap)
+        try:
+            self.store(filepath, graph)
+        except OSError:
+            pass # A cache that cannot be written to (e.g., a read-only directory) only costs the next run a parse
+        return graph
+
+    def entries(self) -> list:
+        """
+        Method that returns (last used time, size, path) for each cache file, least recently used first.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if name.endswith(EXTENSION):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError: # Removed by another process
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return sorted(entries)
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep: str = None) -> int:
+        """
+        Method that removes the least recently used entries (other than keep) until the cache is at most max_bytes.
+        Returns the number of entries removed.
+        """
+        if self.max_bytes is None:
+            return 0
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        for _, _, path in self.entries():
+            remove(path)
+
+def remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def write_graph(path: str, graph: CSRGraph) -> None:
+    """
+    Function that writes graph to path in the cache format. The file is written under a temporary name and then
+    renamed, so another process never reads a partly written entry.
+    """
+    arrays = [array('q', sequence) if not isinstance(sequence, array) else sequence for sequence in (graph.labels, graph.offsets, graph.indices)]
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, graph.colors, *map(len, arrays)))
+            for sequence in arrays:
+                sequence.tofile(file)
+        os.replace(temporary, path)
+    except BaseException:
+        remove(temporary)
+        raise
+
+def read_graph(path: str, use_mmap: bool = False) -> CSRGraph:
+    """
+    Function that reads a `CSRGraph` written by `write_graph`. With use_mmap=True, the arrays of the graph are
+    read-only memoryviews of the mapped file instead of `array` objects. Raises a ValueError if the file is not a
+    valid cache entry.
+    """
+    with open(path, 'rb') as file:
+        header = file.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise ValueError(f"{path} is not a graph cache entry")
+        magic, colors, *lengths = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a graph cache entry")
+        if os.fstat(file.fileno()).st_size != HEADER.size + 8 * sum(lengths):
+            raise ValueError(f"{path} is truncated")
+        if use_mmap:
+            # The memoryviews keep the mapping open after the file is closed (and after the entry is removed)
+            data = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+            arrays = []
+            start = HEADER.size
+            for length in lengths:
+                arrays.append(data[start:start + 8 * length].cast('q'))
+                start += 8 * length
+        else:
+            arrays = []
+            for length in lengths:
+                sequence = array('q')
+                sequence.fromfile(file, length)
+                arrays.append(sequence)
+    return CSRGraph(colors, *arrays)
@@ -1,7 +1,11 @@
-from collections import defaultdict
+from array import array
+from collections.abc import Mapping
+from operator import sub
 from typing import List, Set, Tuple, Union
 
-from fileparser import FileParser
+from domains import domain_backends
+from fileparser import CSRGraph, build_csr, parse_csr
+from graphcache import GraphCache
 
 class GraphColoringConstraint:
     """
@@ -14,6 +18,8 @@ class GraphColoringConstraint:
         :vertex1: - One side of an edge
         :vertex2: - The other side of an edge
     """
+    __slots__ = ('variables', 'vertex1', 'vertex2')
+
     def __init__(self, vertex1, vertex2) -> None:
         self.variables = [vertex1, vertex2]
         self.vertex1 = vertex1
@@ -36,6 +42,93 @@ class GraphColoringConstraint:
         return assignment[self.vertex1] != assignment[self.vertex2]
 
 
+class NeighborsView(Mapping):
+    """
+    Read-only view of the adjacency of a `fileparser.CSRGraph` as a mapping {vertex: neighbors}, where vertices are
+    labels (the vertex numbers of the problem). When the labels are contiguous, the id of a vertex is its label minus
+    the lowest label, and the neighbors of a vertex are returned as a slice of its CSR row (shifted back to labels
+    if the lowest label is not 0). Otherwise ids are looked up in a dictionary and the neighbors are returned as a list.
+
+    arguments:
+        :graph: - The `CSRGraph` to view
+    """
+    __slots__ = ('graph', 'offsets', 'indices', 'low', 'size', 'ids', 'degrees')
+
+    def __init__(self, graph: CSRGraph) -> None:
+        self.graph = graph
+        self.offsets = graph.offsets
+        self.indices = graph.indices
+        labels = graph.labels
+        self.low = labels[0] if labels else 0
+        self.size = len(labels)
+        contiguous = not labels or labels[-1] - labels[0] == len(labels) - 1
+        self.ids = None if contiguous else {label: vertex for vertex, label in enumerate(labels)}
+        # Degrees are looked up for every variable by the variable ordering heuristics, so they are kept in a table
+        # indexed by label: an array when the labels are 0, ..., n-1, and a dictionary otherwise
+        offsets = graph.offsets
+        degrees = array('q', map(sub, offsets[1:], offsets[:-1]))
+        self.degrees = degrees if contiguous and self.low == 0 else dict(zip(labels, degrees))
+
+    def index(self, vertex) -> int:
+        """
+        Method that returns the id of vertex in the graph, or raises a KeyError if it is not in the graph.
+        """
+        if self.ids is not None:
+            return self.ids[vertex]
+        index = vertex - self.low
+        if not 0 <= index < self.size:
+            raise KeyError(vertex)
+        return index
+
+    def __getitem__(self, vertex):
+        # Same as self.index(vertex), inlined since this is called for every vertex the search visits
+        ids = self.ids
+        if ids is None:
+            index = vertex - self.low
+            if not 0 <= index < self.size:
+                raise KeyError(vertex)
+        else:
+            index = ids[vertex]
+        offsets = self.offsets
+        row = self.indices[offsets[index]:offsets[index + 1]]
+        if ids is not None:
+            labels = self.graph.labels
+            return [labels[neighbor] for neighbor in row]
+        if self.low:
+            low = self.low
+            return [neighbor + low for neighbor in row]
+        return row
+
+    def __iter__(self):
+        return iter(self.graph.labels)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def degree(self, vertex) -> int:
+        return self.degrees[vertex]
+
+
+class ConstraintsView(Mapping):
+    """
+    Read-only view of the constraints of a graph as a mapping {vertex: [GraphColoringConstraint, ...]}.
+    The constraint objects are created when they are asked for, from the neighbors of the vertex.
+    """
+    __slots__ = ('neighbors',)
+
+    def __init__(self, neighbors: NeighborsView) -> None:
+        self.neighbors = neighbors
+
+    def __getitem__(self, vertex) -> list:
+        return [GraphColoringConstraint(vertex, neighbor) for neighbor in self.neighbors[vertex]]
+
+    def __iter__(self):
+        return iter(self.neighbors)
+
+    def __len__(self) -> int:
+        return len(self.neighbors)
+
+
 class GraphColoringCSP:
     """
     Class representing the graph coloring problem. For this problem, we have
@@ -43,41 +136,56 @@ class GraphColoringCSP:
     D (domains) {D1, ..., Dn} are the possible colors for each variable, initially all colors.
     C (constraints) <(Xi, Xj), ci != cj>, where ci and cj are the colors assigned to adjacent vertices Xi and Xj.
 
+    The graph is stored in compressed sparse row form (a `fileparser.CSRGraph`: arrays of neighbor offsets and
+    neighbor ids), and the `neighbors` and `constraints` attributes are read-only views over it (see `NeighborsView`
+    and `ConstraintsView`), so no per-edge objects are kept.
+
     arguments:
         :edges: - A list or set of tuples where each tuple represents an edge between two vertices (e.g., (0, 1) represents an edge between vertices 0 and 1)
         :colors: - An integer representing the number of colors for the CSP problem. This gets converted to a list of values and added to the domains
-        :neighbors: - A dictionary representing an adjacency list. The keys are a vertex, and the values are all of that vertex's neighbors.
+        :neighbors: - Not used: the adjacency is built from edges. Kept so existing callers still work.
+        :domain_backend: - The domain store to use, either 'list' (the default) or 'bitset'. See the `domains` module.
+        :graph: - An already built `CSRGraph` to use instead of edges (e.g., from `fileparser.parse_csr`)
     """
-    def __init__(self, edges: Union[List[Tuple[int, int]], Set[Tuple[int, int]]], colors: int, neighbors:dict=None) -> None:
-        self.neighbors = neighbors
-        self.edges = edges
-        self.neighbors = neighbors
-        self.constraints: dict = defaultdict(list) # Equivalent to lazily instantiating each value as []
+    def __init__(self, edges: Union[List[Tuple[int, int]], Set[Tuple[int, int]], None], colors: int, neighbors:dict=None, domain_backend: str='list',
+                 graph: CSRGraph=None) -> None:
+        if graph is None:
+            sources, targets = array('q'), array('q')
+            for vertex1, vertex2 in edges:
+                sources.append(vertex1)
+                targets.append(vertex2)
+            graph = build_csr(colors, sources, targets)
+        self.graph = graph
+        self.neighbors = NeighborsView(graph)
+        self.constraints = ConstraintsView(self.neighbors)
+        self.degree = self.neighbors.degrees.__getitem__ # degree(variable) is the number of constraints (neighbors) of variable
         self.colors = colors
-        self.variables = set(vertex for edge in edges for vertex in edge)
-        self.domains = {vertex: list(range(colors)) for vertex in self.variables}
+        self.variables = set(graph.labels)
+        self.domain_backend = domain_backend
+        self.domains = domain_backends[domain_backend](self.variables, colors)
         self.assignment_counts = 0
-        # Now add constraints
-        for vertex1, vertex2 in self.edges:
-            self.add_constraint(GraphColoringConstraint(vertex1, vertex2))
-    
+        self.statistics = None # The `instrumentation.SearchStatistics` of the search running on this csp, if it is instrumented
+        self.watchers = []
+        # Neighbor color-count tables: color_counts[vertex][color] is how many of vertex's neighbors are assigned
+        # color in self.assignment, the assignment dictionary the search is building with `assign` and `unassign`
+        self.assignment = None
+        self.assigned_count = 0
+        self.color_counts = None
+        self.color_usage = None # color_usage[color] is how many variables are assigned color in self.assignment
+
+    @property
+    def edges(self) -> list:
+        """
+        The edges of the graph, each once, as a list of tuples (smaller vertex first).
+        """
+        return list(self.graph.edges())
+
     def constraint_function(self, X, x, Y, y):
         """
         Our constraint for this problem: neighbors X and Y cannot have the same value.
         """
         return x != y
     
-    def add_constraint(self, constraint) -> None:
-        """
-        Method to add constraints, represented by the GraphColoringConstraint class, to our problem
-        arguments:
-            :constraint: - A constraint represented as a `GraphColoringConstraint` object
-        """
-        for variable in constraint.variables:
-            if variable not in self.variables:
-                raise ValueError(f"Variable: {variable} not in constraint satisfaction problem.")
-            self.constraints[variable].append(constraint)
-    
     def is_consistent(self, variable, assignment: dict) -> bool:
         """
         Method to determine of an assignment is consistent with all of the constraints.
@@ -87,18 +195,22 @@ class GraphColoringCSP:
                 and 1 is the color for a graph coloring problem. So if we assign {0:1}, we want to check if
                 there are any constraints on `variable` that are not satisfied.
         """
-        for constraint in self.constraints[variable]:
-            if not constraint.is_satisfied(assignment):
-                return False
-        return True
+        if self.tracks(assignment):
+            # Only a neighbor with the same color can break a constraint on variable
+            return variable not in assignment or self.color_counts[variable][assignment[variable]] == 0
+        if variable not in assignment:
+            return True
+        value = assignment[variable]
+        # Every constraint on variable is with a neighbor, and is only broken if the neighbor has the same color
+        return all(assignment.get(neighbor) != value for neighbor in self.neighbors[variable])
 
     def add_assignment(self, variable, value):
         """
         Method to update the domains attribute to account for var=value.
-        Used in unit tests.
+        The change is recorded on the domain trail, so it is undone by `undo`.
         """
-        removals = [(variable, a) for a in self.domains[variable] if a != value]
-        self.domains[variable] = [value]
+        removals = [(variable, a) for a in self.domains.domain(variable) if a != value]
+        self.domains.reduce_to(variable, value)
         return removals
     
     def add_assignments(self, assignments):
@@ -115,30 +227,109 @@ class GraphColoringCSP:
         """
         Method that adds variable=value to assignment and updates the assignment count.
         """
+        if not self.tracks(assignment):
+            self.track(assignment)
         assignment[variable] = value
+        self.assigned_count += 1
         self.assignment_counts += 1
+        self.color_usage[value] += 1
+        color_counts = self.color_counts
+        for neighbor in self.neighbors[variable]:
+            color_counts[neighbor][value] += 1
+        for watcher in self.watchers:
+            watcher.on_assign(variable)
+
+    def unassign(self, variable, assignment):
+        """
+        Method that removes variable from assignment, undoing `assign`.
+        """
+        if self.tracks(assignment):
+            value = assignment.pop(variable)
+            self.assigned_count -= 1
+            self.color_usage[value] -= 1
+            color_counts = self.color_counts
+            for neighbor in self.neighbors[variable]:
+                color_counts[neighbor][value] -= 1
+        else:
+            del assignment[variable]
+        for watcher in self.watchers:
+            watcher.on_unassign(variable)
+
+    def track(self, assignment):
+        """
+        Method that rebuilds the neighbor color-count tables for assignment, which then becomes
+        the assignment that `assign` and `unassign` keep the tables up to date for.
+        """
+        self.assignment = assignment
+        self.assigned_count = len(assignment)
+        self.color_counts = {vertex: [0] * self.colors for vertex in self.variables}
+        self.color_usage = [0] * self.colors
+        for variable, value in assignment.items():
+            self.color_usage[value] += 1
+            for neighbor in self.neighbors[variable]:
+                self.color_counts[neighbor][value] += 1
+
+    def tracks(self, assignment):
+        """
+        Method that returns whether the neighbor color-count tables are up to date for assignment.
+        The size check catches assignments that were changed without going through `assign` and `unassign`.
+        """
+        return assignment is self.assignment and len(assignment) == self.assigned_count
+
+    def add_watcher(self, watcher):
+        """
+        Method to register an object that is told about assignments and domain changes. The watcher
+        must implement `on_assign(variable)`, `on_unassign(variable)` and `on_domain_change(variable)`.
+        """
+        self.watchers.append(watcher)
+        self.domains.watchers.append(watcher)
+
+    def remove_watcher(self, watcher):
+        """
+        Method to unregister a watcher added with `add_watcher`.
+        """
+        self.watchers.remove(watcher)
+        self.domains.watchers.remove(watcher)
     
     def add_inferences(self, inferences):
         """
-        Method to add inferences to the CSP during backtracking. This updates the domains attribute.
+        Method to add inferences to the CSP during backtracking. This updates the domains attribute
+        and records the changes on the domain trail.
         """
         for variable, values in inferences.items():
             for value in values:
-                self.domains[variable].remove(value)
+                self.domains.remove(variable, value)
 
     def remove_inferences(self, inferences):
         """
         Method to restore removed values from the domain back into the domains attribute.
+        The search uses `mark` and `undo` instead, which also restores the original order.
         """
         for variable, values in inferences.items():
             for value in values:
-                self.domains[variable].append(value)
+                self.domains.restore(variable, value)
+
+    def mark(self):
+        """
+        Method that returns a marker for the current position of the domain trail.
+        """
+        return self.domains.mark()
+
+    def undo(self, mark):
+        """
+        Method that undoes every domain change made since `mark` was taken, including assignments
+        made with `add_assignment` and inferences added with `add_inferences`.
+        """
+        self.domains.undo(mark)
 
     def count_conflicts(self, var, val, assignment):
         """
         Method that returns the number of conflicts var=val has with other variables already assigned (in assignment)
         """
         # We are checking if assigning var = val will cause csp.is_consistent to return False
+        if self.tracks(assignment):
+            # With a consistent assignment, the only conflicts are with neighbors that are assigned val
+            return self.color_counts[var][val]
         count = 0
         temp_assignment = assignment.copy()
         temp_assignment[var] = val
@@ -147,6 +338,28 @@ class GraphColoringCSP:
                 count += 1
         return count
     
+    def used_colors(self, assignment):
+        """
+        Method that returns a list where entry c is True if some variable is assigned color c in assignment.
+        """
+        if self.tracks(assignment):
+            return [count > 0 for count in self.color_usage]
+        used = [False] * self.colors
+        for value in assignment.values():
+            used[value] = True
+        return used
+
+    def is_complete(self, assignment):
+        """
+        Method to check if an assignment assigns every variable. This is the goal test used during the search:
+        values are only assigned when they are consistent with the assignment, so a complete assignment built
+        by the search is a valid solution. When assignment is the one tracked by `assign` and `unassign`, this
+        only compares the assigned count with the number of variables.
+        """
+        if self.tracks(assignment):
+            return self.assigned_count == len(self.variables)
+        return len(assignment) == len(self.variables)
+
     def valid_solution(self, assignment):
         """
         Method to check if an assignment is a complete and valid solution. 
@@ -158,10 +371,38 @@ class GraphColoringCSP:
                 and all(self.count_conflicts(variables, assignment[variables], assignment) == 0
                         for variables in self.variables))
 
+    def induced_subproblem(self, vertices):
+        """
+        Method that returns a new GraphColoringCSP with the same colors and domain backend, restricted to
+        the given vertices and the edges between them.
+        """
+        vertices = set(vertices)
+        edges = [(vertex, neighbor) for vertex in vertices for neighbor in self.neighbors[vertex] if neighbor in vertices and vertex <= neighbor]
+        return type(self)(edges, self.colors, domain_backend=self.domain_backend)
+
+    @classmethod
+    def from_csr(cls, graph: CSRGraph, **kwargs):
+        """
+        Method to create a GraphColoringCSP object from a `fileparser.CSRGraph`.
+        Any keyword arguments (e.g., domain_backend) are passed to the constructor.
+        """
+        return cls(None, graph.colors, graph=graph, **kwargs)
+
     @classmethod
-    def from_file(cls, filepath):
+    def from_file(cls, filepath, use_mmap=False, cache=None, **kwargs):
         """
-        Method to conveniently create a GraphColoringCSP object from an input file.
+        Method to conveniently create a GraphColoringCSP object from an input file, which is parsed with
+        `fileparser.parse_csr` (through mmap if use_mmap=True). filepath may also be an already parsed `CSRGraph`.
+        If cache is a `graphcache.GraphCache` (or a cache directory, or True for the default directory), the parsed
+        graph is loaded from the cache when the file has not changed since it was stored, and stored otherwise.
+        Any keyword arguments (e.g., domain_backend) are passed to the constructor.
         """
-        fileparse = FileParser(filepath=filepath)
-        return cls(**fileparse.parsed_payload)
+        if isinstance(filepath, CSRGraph):
+            graph = filepath
+        elif cache:
+            if not isinstance(cache, GraphCache):
+                cache = GraphCache() if cache is True else GraphCache(cache)
+            graph = cache.get(filepath, use_mmap=use_mmap)
+        else:
+            graph = parse_csr(filepath, use_mmap=use_mmap)
+        return cls.from_csr(graph, **kwargs)
@@ -1,3 +1,6 @@
+import heapq
+import random
+
 """
 This module contains the variable and value ordering heuristics. The variable ordering heuristics have the signature
     function(csp, assignment)
@@ -27,11 +30,128 @@ def mrv(csp, assignment):
     for variable in csp.variables:
         if variable not in assignment:
             # Collecting the variable, number of remaining legal values (values left in domain), and how many constraints so we can sort
-            unassigned_variables.append((variable,  len(csp.domains[variable]), -len(csp.constraints[variable])))
+            unassigned_variables.append((variable,  csp.domains.size(variable), -csp.degree(variable)))
     # Sort by remaining legal values, then by how many constraints they have (tie breaker)
     unassigned_variables.sort(key=lambda x: (x[1], x[2]))
     return unassigned_variables[0][0]
 
+class IncrementalMRV:
+    """
+    Stateful implementation of the Minimum-Remaining-Values heuristic that gives the same ordering as `mrv`
+    without scanning and sorting every variable on every call.
+    Unassigned variables are kept in buckets keyed by their domain size. Each bucket is a heap ordered by
+    the `mrv` tie breaker (more constraints first), and then by the position of the variable in `csp.variables`,
+    which is the order the stable sort in `mrv` leaves ties in. The buckets are only updated when a domain changes
+    or a variable is assigned or unassigned: the object registers itself as a watcher of the csp (see
+    `GraphColoringCSP.add_watcher`) the first time it is called with it.
+    Entries are removed from the heaps lazily, when they reach the top of a heap and turn out to be stale.
+    """
+    def __init__(self) -> None:
+        self.csp = None
+
+    def __getstate__(self):
+        # The buckets belong to one search, so a copy (e.g., one sent to a worker process) starts out detached
+        return {'csp': None}
+
+    def attach(self, csp, assignment):
+        """
+        Method to (re)build the buckets from the current state of csp and assignment.
+        """
+        if self.csp is not None:
+            self.csp.remove_watcher(self)
+        self.csp = csp
+        self.order = {variable: index for index, variable in enumerate(csp.variables)}
+        self.keys = {variable: (-csp.degree(variable), index, variable) for variable, index in self.order.items()}
+        self.assigned = set(assignment)
+        self.buckets = [[] for _ in range(csp.colors + 1)]
+        self.present = [set() for _ in range(csp.colors + 1)]
+        for variable in csp.variables:
+            if variable not in self.assigned:
+                self.push(variable)
+        for bucket in self.buckets:
+            heapq.heapify(bucket)
+        csp.add_watcher(self)
+
+    def push(self, variable):
+        size = self.csp.domains.size(variable)
+        if variable not in self.present[size]:
+            self.present[size].add(variable)
+            heapq.heappush(self.buckets[size], self.keys[variable])
+
+    def on_assign(self, variable):
+        self.assigned.add(variable)
+
+    def on_unassign(self, variable):
+        self.assigned.discard(variable)
+        self.push(variable)
+
+    def on_domain_change(self, variable):
+        if variable not in self.assigned:
+            self.push(variable)
+
+    def __call__(self, csp, assignment):
+        if csp is not self.csp or len(assignment) != len(self.assigned):
+            # First call for this csp, or the assignment was changed without csp.assign/csp.unassign
+            self.attach(csp, assignment)
+        size_of = csp.domains.size
+        assigned = self.assigned
+        for size, bucket in enumerate(self.buckets):
+            present = self.present[size]
+            while bucket:
+                variable = bucket[0][2]
+                if variable not in assigned and size_of(variable) == size:
+                    return variable
+                # Stale entry: the variable was assigned or its domain changed size
+                heapq.heappop(bucket)
+                present.discard(variable)
+        return None
+
+class RandomizedMRV:
+    """
+    Implementation of the Minimum-Remaining-Values heuristic that breaks the ties left by the `mrv` tie breaker
+    (same number of remaining values and of constraints) at random, using its own random number generator
+    seeded with seed, so a search restarted with a different seed explores a different tree.
+    If weighted=True, variables are ordered by dom/wdeg instead: the number of remaining values divided by the
+    weighted degree of the variable. The weighted degree starts as the number of constraints, and `record_failure`
+    adds 1 to it for the variable and each of its assigned neighbors when a value of the variable fails, so the
+    variables involved in the most failures are picked first. The weights are kept when the object is reseeded,
+    so they carry across restarts.
+    """
+    def __init__(self, seed=None, weighted=False) -> None:
+        self.random = random.Random(seed)
+        self.weighted = weighted
+        self.failures = {} # variable -> weight added to its degree by failures
+
+    def reseed(self, seed):
+        self.random.seed(seed)
+
+    def record_failure(self, csp, variable, assignment):
+        failures = self.failures
+        failures[variable] = failures.get(variable, 0) + 1
+        for neighbor in csp.neighbors[variable]:
+            if neighbor in assignment:
+                failures[neighbor] = failures.get(neighbor, 0) + 1
+
+    def __call__(self, csp, assignment):
+        size_of = csp.domains.size
+        degree = csp.degree
+        failures = self.failures
+        best_key = None
+        ties = []
+        for variable in csp.variables:
+            if variable in assignment:
+                continue
+            if self.weighted:
+                key = size_of(variable) / ((degree(variable) + failures.get(variable, 0)) or 1)
+            else:
+                key = (size_of(variable), -degree(variable))
+            if best_key is None or key < best_key:
+                best_key = key
+                ties = [variable]
+            elif key == best_key:
+                ties.append(variable)
+        return self.random.choice(ties)
+
 
 # Heuristics for value ordering
 
@@ -40,11 +160,57 @@ def unordered_domain_values(csp, variable, assignment):
     Function to return values without ordering them.
     Simplest method is to just return the values in whatever order they are in.
     """
-    return csp.domains[variable]
+    return csp.domains.domain(variable)
 
 def lcv(csp, variable, assignment):
     """
     Implementation of the Least Constraining Value heuristic to order values.
     We just sort by how many conflicts the assignment creates in ascending order.
     """
-    return sorted(csp.domains[variable], key=lambda value: csp.count_conflicts(variable, value, assignment))
+    return sorted(csp.domains.domain(variable), key=lambda value: csp.count_conflicts(variable, value, assignment))
+
+class RandomizedLCV:
+    """
+    Implementation of the Least Constraining Value heuristic that breaks ties between values with the same
+    number of conflicts at random, using its own random number generator seeded with seed (see `RandomizedMRV`).
+    """
+    def __init__(self, seed=None) -> None:
+        self.random = random.Random(seed)
+
+    def reseed(self, seed):
+        self.random.seed(seed)
+
+    def __call__(self, csp, variable, assignment):
+        keys = {value: (csp.count_conflicts(variable, value, assignment), self.random.random()) for value in csp.domains.domain(variable)}
+        return sorted(keys, key=keys.__getitem__)
+
+def break_color_symmetry(order_domain_values):
+    """
+    Function that wraps a value ordering heuristic so it only returns colors that are already used in the
+    assignment, plus the lowest unused color. Colors are interchangeable, so if a variable fails with one
+    unused color it fails with all of them, and trying the others would only repeat the same subtree
+    with the colors renamed. The values keep the order given by order_domain_values.
+    """
+    def symmetry_breaking_order(csp, variable, assignment):
+        used = csp.used_colors(assignment)
+        new_color = used.index(False) if False in used else None
+        return [value for value in order_domain_values(csp, variable, assignment) if used[value] or value == new_color]
+    name = getattr(order_domain_values, '__name__', type(order_domain_values).__name__)
+    symmetry_breaking_order.__name__ = f"{name}_symmetry_breaking"
+    return symmetry_breaking_order
+
+
+def prefer_colors(order_domain_values, coloring):
+    """
+    Function that wraps a value ordering heuristic so the color of each variable in coloring (e.g., a coloring found
+    before the problem changed) is tried first. The other values keep the order given by order_domain_values.
+    """
+    def preferred_order(csp, variable, assignment):
+        values = order_domain_values(csp, variable, assignment)
+        preferred = coloring.get(variable)
+        if preferred in values:
+            values = [preferred] + [value for value in values if value != preferred]
+        return values
+    name = getattr(order_domain_values, '__name__', type(order_domain_values).__name__)
+    preferred_order.__name__ = f"{name}_prefer_colors"
+    return preferred_order
@@ -0,0 +1,292 @@
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from time import perf_counter
+
+from backtracking import backtracking_search
+from fileparser import CSRGraph, build_csr
+from heuristics import lcv, mrv, prefer_colors
+from inference import maintain_arc_consistency
+
+"""
+This module contains an incremental re-solve API for graphs that change a little at a time. An
+`IncrementalColoring` is made from a solved `GraphColoringCSP` and its solution, and takes updates (adding or removing
+edges and vertices, and changing the number of colors). After each update, it repairs the coloring locally instead of
+solving the problem again:
+    1. The vertices the update leaves without a valid color are uncolored: one end of an edge added between two
+       vertices with the same color, a new vertex, or the vertices with a color that no longer exists.
+    2. The uncolored vertices are the region that is searched. Every vertex outside the region keeps its color, so
+       each vertex in the region starts with the colors its neighbors outside the region do not use, and the region
+       is colored with `backtracking.backtracking_search`, trying the color each vertex had before first.
+    3. If the region cannot be colored, it is widened by the neighbors of its vertices, and searched again. A region
+       that cannot be widened any more holds whole connected components of the graph, so if it cannot be colored
+       the graph has no coloring: the update is reported as 'unsat', and the vertices are colored once a later
+       update (e.g., removing an edge or adding a color) makes that possible.
+Removing an edge or a vertex, or adding a color, never breaks a coloring, so it costs nothing.
+
+The CSR arrays of the `GraphColoringCSP` are never changed: the updates are kept as an overlay of added and removed
+edges, and the neighbors of a vertex are its CSR row, minus the removed edges, plus the added ones. `to_csr` builds
+the CSR arrays of the current graph, e.g., to solve it from scratch or to start over with a smaller overlay.
+"""
+
+RepairResult = namedtuple('RepairResult', ['status', 'changed', 'region', 'elapsed'])
+
+class IncrementalColoring:
+    """
+    Class implementing the incremental re-solve API described above. Each update method returns a `RepairResult`:
+        status  - 'solved' if every vertex is colored, 'unsat' if the graph has no coloring with the number of colors
+        changed - The number of vertices that had a color before the update and have a different color (or none) after it
+        region  - The number of vertices in the last region searched (0 if nothing had to be repaired)
+        elapsed - The seconds the update and repair took
+
+    arguments:
+        :csp: - The `GraphColoringCSP` that was solved
+        :solution: - Its solution (None means csp is solved with `backtracking_search` first)
+        :select_unassigned_variable: - The variable ordering heuristic of the repair search (e.g., mrv)
+        :order_domain_values: - The value ordering heuristic of the repair search, after the previous color (e.g., lcv)
+        :inference: - The inference method of the repair search (e.g., forward checking, mac/ac3)
+
+    These attributes hold the current state:
+        :colors: - The number of colors
+        :coloring: - The color of every colored vertex ({vertex: color})
+        :uncolored: - The vertices without a color (only when the last update was 'unsat')
+        :vertices: - The vertices of the graph
+    """
+    def __init__(self, csp, solution=None, select_unassigned_variable=mrv, order_domain_values=lcv, inference=maintain_arc_consistency) -> None:
+        if solution is None:
+            solution = backtracking_search(csp, verbose=False, select_unassigned_variable=select_unassigned_variable,
+                                           order_domain_values=order_domain_values, inference=inference, engine='iterative')
+        if solution is None or not csp.valid_solution(solution):
+            raise ValueError("IncrementalColoring needs a solved csp and a valid solution")
+        self.base = csp.neighbors
+        self.base_vertices = csp.variables
+        self.select_unassigned_variable = select_unassigned_variable
+        self.order_domain_values = order_domain_values
+        self.inference = inference
+        self.domain_backend = csp.domain_backend
+        self.colors = csp.colors
+        self.coloring = dict(solution)
+        self.uncolored = set()
+        self.vertices = set(csp.variables)
+        self.added = {}   # vertex -> set of neighbors joined by added edges
+        self.removed = {} # vertex -> set of neighbors in its CSR row whose edge was removed
+        self.previous = {} # vertex -> color it had before it was uncolored, until the coloring is repaired
+
+    def neighbors(self, vertex):
+        """
+        Method that returns the current neighbors of vertex as a list.
+        """
+        removed = self.removed.get(vertex)
+        if vertex not in self.base_vertices:
+            result = []
+        elif removed:
+            result = [neighbor for neighbor in self.base[vertex] if neighbor not in removed]
+        else:
+            result = list(self.base[vertex])
+        result.extend(self.added.get(vertex, ()))
+        return result
+
+    def has_edge(self, vertex1, vertex2) -> bool:
+        if vertex2 in self.added.get(vertex1, ()):
+            return True
+        if vertex1 not in self.base_vertices or vertex2 not in self.base_vertices or vertex2 in self.removed.get(vertex1, ()):
+            return False
+        row = self.base[vertex1] # Sorted, so it is searched with bisection
+        index = bisect_left(row, vertex2)
+        return index < len(row) and row[index] == vertex2
+
+    def connect(self, vertex1, vertex2) -> None:
+        """
+        Method that adds an edge (and its vertices, if they are new) and uncolors one end if both have the same color.
+        """
+        if vertex1 == vertex2:
+            raise ValueError(f"Cannot add an edge from vertex {vertex1} to itself")
+        for vertex in (vertex1, vertex2):
+            if vertex not in self.vertices:
+                self.vertices.add(vertex)
+                self.uncolored.add(vertex)
+        if self.has_edge(vertex1, vertex2):
+            return
+        for vertex, neighbor in ((vertex1, vertex2), (vertex2, vertex1)):
+            removed = self.removed.get(vertex)
+            if removed and neighbor in removed:
+                removed.discard(neighbor)
+            else:
+                self.added.setdefault(vertex, set()).add(neighbor)
+        color = self.coloring.get(vertex1)
+        if color is not None and color == self.coloring.get(vertex2):
+            # Recolor the end with fewer neighbors, which has fewer colors to avoid
+            self.uncolor(min((vertex1, vertex2), key=lambda vertex: len(self.neighbors(vertex))))
+
+    def disconnect(self, vertex1, vertex2) -> None:
+        """
+        Method that removes an edge.
+        """
+        if not self.has_edge(vertex1, vertex2):
+            raise KeyError((vertex1, vertex2))
+        for vertex, neighbor in ((vertex1, vertex2), (vertex2, vertex1)):
+            added = self.added.get(vertex)
+            if added and neighbor in added:
+                added.discard(neighbor)
+            else:
+                self.removed.setdefault(vertex, set()).add(neighbor)
+
+    def uncolor(self, vertex) -> None:
+        """
+        Method that removes the color of vertex, remembering it until the coloring is repaired.
+        """
+        self.previous.setdefault(vertex, self.coloring.pop(vertex))
+        self.uncolored.add(vertex)
+
+    def add_edge(self, vertex1, vertex2) -> RepairResult:
+        """
+        Method that adds an edge (and its vertices, if they are new) and repairs the coloring.
+        """
+        start = perf_counter()
+        self.connect(vertex1, vertex2)
+        return self.repair(start)
+
+    def remove_edge(self, vertex1, vertex2) -> RepairResult:
+        """
+        Method that removes an edge. The coloring stays valid, but vertices left uncolored by an earlier update are
+        colored if the removal makes that possible.
+        """
+        start = perf_counter()
+        self.disconnect(vertex1, vertex2)
+        return self.repair(start)
+
+    def add_vertex(self, vertex, neighbors=()) -> RepairResult:
+        """
+        Method that adds a vertex joined to the given (existing or new) neighbors, and colors it.
+        """
+        start = perf_counter()
+        if vertex in self.vertices:
+            raise ValueError(f"Vertex {vertex} is already in the graph")
+        self.vertices.add(vertex)
+        self.uncolored.add(vertex)
+        for neighbor in neighbors:
+            self.connect(vertex, neighbor)
+        return self.repair(start)
+
+    def remove_vertex(self, vertex) -> RepairResult:
+        """
+        Method that removes a vertex and its edges.
+        """
+        start = perf_counter()
+        if vertex not in self.vertices:
+            raise KeyError(vertex)
+        for neighbor in self.neighbors(vertex):
+            self.disconnect(vertex, neighbor)
+        self.vertices.discard(vertex)
+        self.uncolored.discard(vertex)
+        self.coloring.pop(vertex, None)
+        self.previous.pop(vertex, None)
+        return self.repair(start)
+
+    def set_colors(self, colors) -> RepairResult:
+        """
+        Method that changes the number of colors. With fewer colors, the vertices with a color that no longer exists
+        are recolored.
+        """
+        start = perf_counter()
+        if colors < 1:
+            raise ValueError("The number of colors must be at least 1")
+        self.colors = colors
+        for vertex, color in list(self.coloring.items()):
+            if color >= colors:
+                self.uncolor(vertex)
+        return self.repair(start)
+
+    def repair(self, start) -> RepairResult:
+        """
+        Method that colors the uncolored vertices, widening the region searched until it can be colored (see above).
+        """
+        if not self.uncolored:
+            return RepairResult('solved', 0, 0, perf_counter() - start)
+        previous = dict(self.coloring)
+        previous.update(self.previous)
+        region = set(self.uncolored)
+        while True:
+            for vertex in region:
+                self.coloring.pop(vertex, None)
+            solution = self.color_region(region, previous)
+            if solution is not None:
+                self.coloring.update(solution)
+                self.uncolored.clear()
+                self.previous.clear()
+                status = 'solved'
+                break
+            frontier = {neighbor for vertex in region for neighbor in self.neighbors(vertex) if neighbor not in region}
+            if not frontier:
+                # The region is made of whole components, and they cannot be colored: keep the previous colors
+                for vertex in region - self.uncolored:
+                    self.coloring[vertex] = previous[vertex]
+                status = 'unsat'
+                break
+            region |= frontier
+        changed = sum(1 for vertex, color in previous.items() if vertex in self.vertices and self.coloring.get(vertex) != color)
+        return RepairResult(status, changed, len(region), perf_counter() - start)
+
+    def color_region(self, region, previous):
+        """
+        Method that colors the vertices of region, with every other vertex keeping its color, and returns the colors of
+        the region, or None if it cannot be colored. The colors in previous are tried first.
+        """
+        coloring = self.coloring
+        allowed = {}
+        sources, targets = array('q'), array('q')
+        for vertex in region:
+            used = set()
+            for neighbor in self.neighbors(vertex):
+                if neighbor in region:
+                    if vertex < neighbor:
+                        sources.append(vertex)
+                        targets.append(neighbor)
+                elif neighbor in coloring:
+                    used.add(coloring[neighbor])
+            allowed[vertex] = [color for color in range(self.colors) if color not in used]
+            if not allowed[vertex]:
+                return None
+        # Vertices with no neighbor in the region take their previous color if it is allowed, or the lowest allowed one
+        solution = {}
+        if sources:
+            graph = build_csr(self.colors, sources, targets)
+            from graphcoloring import GraphColoringCSP # graphcoloring imports modules that import this one
+            subproblem = GraphColoringCSP.from_csr(graph, domain_backend=self.domain_backend)
+            for vertex in subproblem.variables:
+                for color in range(self.colors):
+                    if color not in allowed[vertex]:
+                        subproblem.domains.remove(vertex, color)
+            subsolution = backtracking_search(subproblem, verbose=False, select_unassigned_variable=self.select_unassigned_variable,
+                                              order_domain_values=prefer_colors(self.order_domain_values, previous), inference=self.inference,
+                                              engine='iterative')
+            if subsolution is None:
+                return None
+            solution.update(subsolution)
+        for vertex in region:
+            if vertex not in solution:
+                color = previous.get(vertex)
+                solution[vertex] = color if color in allowed[vertex] else allowed[vertex][0]
+        return solution
+
+    def to_csr(self) -> CSRGraph:
+        """
+        Method that returns the `CSRGraph` of the current graph, with the current number of colors. Vertices with no
+        edges are not in it, as in the input files.
+        """
+        sources, targets = array('q'), array('q')
+        for vertex in self.vertices:
+            for neighbor in self.neighbors(vertex):
+                if vertex < neighbor:
+                    sources.append(vertex)
+                    targets.append(neighbor)
+        return build_csr(self.colors, sources, targets)
+
+    def is_valid(self) -> bool:
+        """
+        Method that returns whether every vertex is colored with one of the colors and differs from its neighbors.
+        """
+        coloring = self.coloring
+        return (len(coloring) == len(self.vertices)
+                and all(0 <= coloring[vertex] < self.colors and all(coloring[neighbor] != coloring[vertex] for neighbor in self.neighbors(vertex))
+                        for vertex in self.vertices))
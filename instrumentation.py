@@ -0,0 +1,199 @@
+from collections import Counter
+from contextlib import contextmanager
+import cProfile
+import pstats
+from time import perf_counter
+
+"""
+This module contains optional instrumentation for the backtracking search: a `SearchStatistics` object that counts
+what the search does, and an `Instrumentation` object that collects those statistics, calls user callbacks and
+can profile the search with cProfile. Instrumentation is switched on by passing an `Instrumentation` object to
+`backtracking.backtracking_search`. It works by wrapping, for the duration of the search only:
+    - the assign, unassign and add_inferences methods of the csp object (not of the class), to count nodes,
+      backtracks, the maximum depth and the values pruned by inference, and to call the callbacks
+    - the variable and value ordering heuristics and the inference method, to time them and count failures
+When no `Instrumentation` object is given, nothing is wrapped, so the search runs exactly the same code as before.
+The only other cost is in `inference.ac3`, which counts the arcs it revises when csp.statistics is set.
+"""
+
+class SearchStatistics:
+    """
+    A class holding the statistics of one search (or of several, e.g., the components solved by
+    `preprocessing.preprocessed_search`, which add to the same object).
+
+    attributes:
+        :nodes: - The number of assignments made
+        :backtracks: - The number of assignments undone
+        :failures: - The number of values rejected by each inference method (a Counter keyed by its name)
+        :values_pruned: - The number of values removed from domains by inference (the backjumping engine removes values
+            itself, so they are not counted)
+        :arcs_revised: - The number of arcs revised by `inference.ac3`
+        :max_depth: - The largest number of variables assigned at once
+        :heuristic_time: - The seconds spent choosing variables and ordering values
+        :inference_time: - The seconds spent in inference
+        :elapsed: - The seconds the search ran for
+    """
+    fields = ('nodes', 'backtracks', 'failures', 'values_pruned', 'arcs_revised', 'max_depth', 'heuristic_time', 'inference_time', 'elapsed')
+
+    def __init__(self) -> None:
+        self.nodes = 0
+        self.backtracks = 0
+        self.failures = Counter()
+        self.values_pruned = 0
+        self.arcs_revised = 0
+        self.max_depth = 0
+        self.heuristic_time = 0.0
+        self.inference_time = 0.0
+        self.elapsed = 0.0
+
+    def as_dict(self) -> dict:
+        return {field: dict(self.failures) if field == 'failures' else getattr(self, field) for field in self.fields}
+
+    def __repr__(self) -> str:
+        return f"<SearchStatistics: {self.nodes} nodes, {self.backtracks} backtracks, max depth {self.max_depth}>"
+
+    def report(self) -> str:
+        """
+        Method that returns the statistics as lines of text, as printed by `main.py` with --stats.
+        """
+        failures = ', '.join(f"{name}: {count}" for name, count in sorted(self.failures.items())) or 'none'
+        other = self.elapsed - self.heuristic_time - self.inference_time
+        return (f"Search statistics:\n"
+                f"\tNodes -> {self.nodes}\n"
+                f"\tBacktracks -> {self.backtracks}\n"
+                f"\tInference failures -> {failures}\n"
+                f"\tValues pruned -> {self.values_pruned}\n"
+                f"\tArcs revised -> {self.arcs_revised}\n"
+                f"\tMax depth -> {self.max_depth}\n"
+                f"\tTime -> {self.elapsed:.3f}s ({self.heuristic_time:.3f}s heuristics, {self.inference_time:.3f}s inference, {other:.3f}s other)\n")
+
+class Timed:
+    """
+    Callable that wraps a heuristic or inference function and adds the time spent in it to an attribute of a
+    `SearchStatistics` object. Other attributes (e.g., the reseed method of `heuristics.RandomizedMRV`) are looked up
+    on the wrapped function, so engines that use them work the same with the wrapper.
+    If failures is set, a call that returns 'failure' (or, for the propagate methods of
+    `backjumping.ConflictDirectedBackjumping`, anything but None) is counted as a failure with that name.
+    """
+    def __init__(self, function, statistics, field, failures=None, failure_value='failure') -> None:
+        self.function = function
+        self.statistics = statistics
+        self.field = field
+        self.failures = failures
+        self.failure_value = failure_value
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__['function'], name)
+
+    def __call__(self, *args):
+        start = perf_counter()
+        result = self.function(*args)
+        statistics = self.statistics
+        setattr(statistics, self.field, getattr(statistics, self.field) + perf_counter() - start)
+        if self.failures is not None and (result == 'failure' if self.failure_value == 'failure' else result is not None):
+            statistics.failures[self.failures] += 1
+        return result
+
+def name(function):
+    return getattr(function, '__name__', type(function).__name__) if function else 'none'
+
+class Instrumentation:
+    """
+    A class that collects `SearchStatistics` for searches run with it, as described above.
+
+    arguments:
+        :statistics: - The `SearchStatistics` to add to (a new one by default)
+        :on_assign: - Function called with (csp, variable, value, assignment) after each assignment
+        :on_backtrack: - Function called with (csp, variable, assignment) after each assignment is undone
+        :on_prune: - Function called with (csp, inferences) when inferences ({variable: removed values}) are added
+        :progress: - Function called with the statistics every progress_interval seconds (checked every 1024 nodes)
+        :progress_interval: - The number of seconds between calls to progress
+        :profile: - If True, the search is run under cProfile, and the profiler is kept in the profiler attribute
+    """
+    def __init__(self, statistics=None, on_assign=None, on_backtrack=None, on_prune=None, progress=None, progress_interval=1.0, profile=False) -> None:
+        self.statistics = SearchStatistics() if statistics is None else statistics
+        self.on_assign = on_assign
+        self.on_backtrack = on_backtrack
+        self.on_prune = on_prune
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.profiler = cProfile.Profile() if profile else None
+
+    def wrap(self, select_unassigned_variable, order_domain_values, inference):
+        """
+        Method that returns the heuristics and inference method wrapped to be timed (see `Timed`).
+        """
+        statistics = self.statistics
+        return (Timed(select_unassigned_variable, statistics, 'heuristic_time'),
+                Timed(order_domain_values, statistics, 'heuristic_time'),
+                None if inference is None else Timed(inference, statistics, 'inference_time', name(inference)))
+
+    def wrap_propagate(self, propagate, inference):
+        """
+        Method that wraps the propagate method of a `backjumping.ConflictDirectedBackjumping` object, which returns
+        None or the conflict set of a failure.
+        """
+        return Timed(propagate, self.statistics, 'inference_time', name(inference), failure_value=None)
+
+    @contextmanager
+    def attached(self, csp):
+        """
+        Context manager that instruments csp (see above) and times (and optionally profiles) the search run inside it.
+        """
+        statistics = self.statistics
+        on_assign, on_backtrack, on_prune, progress = self.on_assign, self.on_backtrack, self.on_prune, self.progress
+        assign, unassign, add_inferences = csp.assign, csp.unassign, csp.add_inferences
+        # Methods already wrapped on the object (e.g., by `benchmark.count_calls`) are put back afterwards
+        wrapped = {method: csp.__dict__[method] for method in ('assign', 'unassign', 'add_inferences') if method in csp.__dict__}
+        start = perf_counter()
+        next_progress = start + self.progress_interval
+        def instrumented_assign(variable, value, assignment):
+            nonlocal next_progress
+            assign(variable, value, assignment)
+            statistics.nodes += 1
+            if len(assignment) > statistics.max_depth:
+                statistics.max_depth = len(assignment)
+            if on_assign is not None:
+                on_assign(csp, variable, value, assignment)
+            if progress is not None and not statistics.nodes & 1023:
+                now = perf_counter()
+                if now >= next_progress:
+                    statistics.elapsed += now - start
+                    progress(statistics)
+                    statistics.elapsed -= now - start
+                    next_progress = now + self.progress_interval
+        def instrumented_unassign(variable, assignment):
+            unassign(variable, assignment)
+            statistics.backtracks += 1
+            if on_backtrack is not None:
+                on_backtrack(csp, variable, assignment)
+        def instrumented_add_inferences(inferences):
+            add_inferences(inferences)
+            statistics.values_pruned += sum(map(len, inferences.values()))
+            if on_prune is not None:
+                on_prune(csp, inferences)
+        csp.assign, csp.unassign, csp.add_inferences = instrumented_assign, instrumented_unassign, instrumented_add_inferences
+        csp.statistics = statistics
+        if self.profiler is not None:
+            self.profiler.enable()
+        try:
+            yield statistics
+        finally:
+            if self.profiler is not None:
+                self.profiler.disable()
+            statistics.elapsed += perf_counter() - start
+            del csp.assign, csp.unassign, csp.add_inferences
+            csp.__dict__.update(wrapped)
+            csp.statistics = None
+
+    def print_profile(self, limit=20, sort='cumulative', path=None):
+        """
+        Method that prints the limit most expensive functions of the profiled search, sorted by sort (see `pstats`),
+        or saves the whole profile to path (which can be loaded with `pstats.Stats` or a viewer such as snakeviz).
+        """
+        if self.profiler is None:
+            raise ValueError("The search was not profiled (use profile=True)")
+        if path is not None:
+            self.profiler.dump_stats(path)
+        else:
+            pstats.Stats(self.profiler).sort_stats(sort).print_stats(limit)
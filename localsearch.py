@@ -0,0 +1,201 @@
+import heapq
+import random
+from time import time
+
+from backtracking import verify_solution
+
+"""
+This module contains a local search engine for finding a coloring quickly when one exists. It does not search
+systematically, so it cannot prove that there is no solution: it returns None when it runs out of iterations or time.
+    1. DSATUR builds an initial coloring: the vertex with the most distinct colors among its neighbors (its saturation)
+       is colored next with the lowest color its neighbors do not use. When every color is used by a neighbor, the
+       color used by the fewest neighbors is chosen, so the initial coloring may have conflicts.
+    2. The conflicts are repaired by moving one vertex to a different color at a time, with either:
+        tabu            - Tabucol: the move that removes the most conflicts over all conflicting vertices, where
+                          moving a vertex back to a color it just left is forbidden for a number of iterations
+                          (unless it gives the fewest conflicts seen so far)
+        min-conflicts   - A random conflicting vertex is given the color with the fewest conflicts (see `Artificial
+                          Intelligence: A Modern Approach (Prentice Hall 2020)`)
+The number of neighbors of each vertex with each color is kept up to date by `GraphColoringCSP.assign` and
+`GraphColoringCSP.unassign` (csp.color_counts), so the change in conflicts of a move is found without scanning neighbors.
+"""
+
+def dsatur(vertices, neighbors, colors=None):
+    """
+    Function that colors the graph induced by vertices with DSATUR, as described above, and returns the coloring
+    as a dictionary. If colors is None, a new color is used whenever a vertex has no color left, so the coloring has
+    no conflicts and the number of colors it uses is an upper bound on the chromatic number.
+    """
+    vertices = set(vertices)
+    degrees = {vertex: len(vertices.intersection(neighbors[vertex])) for vertex in vertices}
+    neighbor_colors = {vertex: {} for vertex in vertices} # vertex -> {color: number of neighbors with that color}
+    heap = [(0, -degree, vertex) for vertex, degree in degrees.items()]
+    heapq.heapify(heap)
+    coloring = {}
+    while heap:
+        _, _, vertex = heapq.heappop(heap)
+        if vertex in coloring:
+            continue
+        used = neighbor_colors[vertex]
+        color = 0
+        while color in used:
+            color += 1
+        if colors is not None and color >= colors:
+            color = min(range(colors), key=used.__getitem__)
+        coloring[vertex] = color
+        for neighbor in neighbors[vertex]:
+            if neighbor in vertices and neighbor not in coloring:
+                counts = neighbor_colors[neighbor]
+                if color not in counts:
+                    counts[color] = 0
+                    # The saturation of neighbor went up, so push it again (the old entry is skipped once it is colored)
+                    heapq.heappush(heap, (-len(counts), -degrees[neighbor], neighbor))
+                counts[color] += 1
+    return coloring
+
+class LocalSearch:
+    """
+    Class implementing the local search engine described above.
+
+    arguments:
+        :csp: - The `GraphColoringCSP` to solve
+        :method: - The repair method, 'tabu' or 'min-conflicts'
+        :max_iterations: - The maximum number of moves (None means no limit)
+        :time_limit: - The maximum number of seconds to search for (None means no limit)
+        :seed: - The seed for the random choices
+        :tenure: - The minimum number of iterations a move back stays forbidden in tabu search. A random number below
+            tenure is added, plus 0.6 times the number of conflicting vertices.
+        :initial: - A coloring ({vertex: color}) to start from instead of the DSATUR coloring (e.g., a coloring with
+            more colors). Vertices it leaves out or gives a color of csp.colors or more are given the color with the
+            fewest conflicts.
+
+    After `search` returns, these attributes report what the search did:
+        :initial_conflicts: - How many edges had both ends with the same color after DSATUR
+        :iterations: - How many moves were made
+        :best_conflicts: - The fewest conflicting edges seen
+    """
+    def __init__(self, csp, method='tabu', max_iterations=100000, time_limit=None, seed=0, tenure=10, initial=None) -> None:
+        if method not in ('tabu', 'min-conflicts'):
+            raise ValueError(f"Unknown local search method {method}")
+        self.csp = csp
+        self.method = method
+        self.max_iterations = max_iterations
+        self.time_limit = time_limit
+        self.random = random.Random(seed)
+        self.tenure = tenure
+        self.initial = initial
+        self.initial_conflicts = None
+        self.iterations = 0
+        self.best_conflicts = None
+
+    def search(self):
+        """
+        Method that runs the search and returns the solution, or None if no solution was found within the limits.
+        """
+        csp = self.csp
+        assignment = {}
+        csp.track(assignment)
+        initial = dsatur(csp.variables, csp.neighbors, csp.colors) if self.initial is None else self.initial
+        for variable, value in initial.items():
+            if value < csp.colors:
+                csp.assign(variable, value, assignment)
+        color_counts = csp.color_counts
+        for variable in csp.variables:
+            if variable not in assignment:
+                csp.assign(variable, min(range(csp.colors), key=color_counts[variable].__getitem__), assignment)
+        self.conflicting = {variable for variable, value in assignment.items() if color_counts[variable][value]}
+        self.conflicts = sum(color_counts[variable][assignment[variable]] for variable in self.conflicting) // 2
+        self.initial_conflicts = self.best_conflicts = self.conflicts
+        step = self.tabu_step if self.method == 'tabu' else self.min_conflicts_step
+        self.tabu = {} # (variable, value) -> iteration until which moving variable back to value is forbidden
+        deadline = None if self.time_limit is None else time() + self.time_limit
+        while self.conflicts:
+            if self.max_iterations is not None and self.iterations >= self.max_iterations:
+                return None
+            if deadline is not None and time() > deadline:
+                return None
+            self.iterations += 1
+            step(assignment)
+        return assignment
+
+    def move(self, assignment, variable, value):
+        """
+        Method that changes the color of variable and updates the conflict counts and the set of conflicting vertices.
+        """
+        csp = self.csp
+        color_counts = csp.color_counts
+        conflicting = self.conflicting
+        old = assignment[variable]
+        self.conflicts += color_counts[variable][value] - color_counts[variable][old]
+        self.best_conflicts = min(self.best_conflicts, self.conflicts)
+        csp.unassign(variable, assignment)
+        csp.assign(variable, value, assignment)
+        for neighbor in csp.neighbors[variable]:
+            neighbor_value = assignment[neighbor]
+            if neighbor_value == value:
+                conflicting.add(neighbor)
+            elif neighbor_value == old and color_counts[neighbor][old] == 0:
+                conflicting.discard(neighbor)
+        if color_counts[variable][value]:
+            conflicting.add(variable)
+        else:
+            conflicting.discard(variable)
+        return old
+
+    def tabu_step(self, assignment):
+        """
+        Method that makes the best move that is not forbidden, breaking ties at random.
+        """
+        color_counts = self.csp.color_counts
+        tabu = self.tabu
+        iteration = self.iterations
+        best_delta = None
+        ties = 0
+        best_move = None
+        for variable in self.conflicting:
+            counts = color_counts[variable]
+            current = assignment[variable]
+            for value in range(self.csp.colors):
+                if value == current:
+                    continue
+                delta = counts[value] - counts[current]
+                # A forbidden move is still allowed if it gives the fewest conflicts seen so far
+                if tabu.get((variable, value), 0) > iteration and self.conflicts + delta >= self.best_conflicts:
+                    continue
+                if best_delta is None or delta < best_delta:
+                    best_delta, best_move, ties = delta, (variable, value), 1
+                elif delta == best_delta:
+                    ties += 1
+                    if self.random.randrange(ties) == 0:
+                        best_move = (variable, value)
+        if best_move is None:
+            # Every move is forbidden: wait for the oldest to expire
+            return
+        variable, value = best_move
+        old = self.move(assignment, variable, value)
+        tabu[(variable, old)] = iteration + self.tenure + self.random.randrange(self.tenure) + int(0.6 * len(self.conflicting))
+
+    def min_conflicts_step(self, assignment):
+        """
+        Method that gives a random conflicting vertex the color with the fewest conflicts, breaking ties at random.
+        """
+        variable = self.random.choice(tuple(self.conflicting))
+        counts = self.csp.color_counts[variable]
+        fewest = min(counts)
+        value = self.random.choice([value for value in range(self.csp.colors) if counts[value] == fewest])
+        if value != assignment[variable]:
+            self.move(assignment, variable, value)
+
+def local_search(csp, verbose=True, method='tabu', max_iterations=100000, time_limit=None, seed=0, verify=False):
+    """
+    Function that runs the local search engine (see `LocalSearch`) and returns a solution, or None if no solution was
+    found within max_iterations moves and time_limit seconds. This does not mean the problem has no solution.
+    """
+    search = LocalSearch(csp, method, max_iterations, time_limit, seed)
+    solution = search.search()
+    if verbose:
+        print(f"Local search ({method}): {search.initial_conflicts} conflicts after DSATUR, {search.iterations} iterations, "
+              f"fewest conflicts {search.best_conflicts}\n")
+    if verify:
+        verify_solution(csp, solution)
+    return solution
@@ -1,90 +1,297 @@
 from datetime import timedelta
+from functools import partial
 import os
+import sys
 from time import time
 
 from backtracking import backtracking_search
+from batch import run_batch
+from checkpoint import bounded_search
+from graphcache import DEFAULT_CACHE_DIR, GraphCache
 from graphcoloring import GraphColoringCSP
-from heuristics import lcv, mrv, static_ordering, unordered_domain_values
-from inference import forward_checking, maintain_arc_consistency
+from instrumentation import Instrumentation
+from heuristics import IncrementalMRV, lcv, mrv, static_ordering, unordered_domain_values
+from inference import forward_checking, maintain_arc_consistency, maintain_arc_consistency_ne
+from parallel import parallel_component_search, portfolio_search
+from localsearch import local_search
+from optimize import chromatic_number
+from preprocessing import preprocessed_search
+from vectorized import forward_checking_numpy, lcv_numpy, maintain_arc_consistency_numpy, mrv_numpy, numpy
 
-def solve(input_file, **kwargs):
-    csp = GraphColoringCSP.from_file(input_file)
+def solve(input_file, domain_backend='list', cache=None, **kwargs):
+    csp = GraphColoringCSP.from_file(input_file, domain_backend=domain_backend, cache=cache)
+    return solve_csp(csp, **kwargs)
+
+# The engines that can be bounded by time and nodes and checkpointed (the recursive engine runs as the iterative one)
+BOUNDED_ENGINES = ('recursive', 'iterative', 'backjumping')
+BOUNDED_SEARCH_ERROR = "Time and node limits and checkpoints are only supported by the recursive, iterative and backjumping engines, without --preprocess, --portfolio or -j"
+
+def solve_csp(csp, preprocess=False, processes=None, portfolio=False, local=None, max_iterations=100000, time_limit=None, verbose=True, instrumentation=None,
+              max_nodes=None, checkpoint=None, checkpoint_interval=60, cancel=None, return_status=False, **kwargs):
+    bounded = local is None and (time_limit is not None or max_nodes is not None or checkpoint is not None)
+    if bounded:
+        # The command line rejects these combinations (see `BOUNDED_ENGINES`)
+        if portfolio or preprocess or processes is not None or kwargs.get('engine', 'recursive') not in BOUNDED_ENGINES:
+            raise ValueError(BOUNDED_SEARCH_ERROR)
+        options = {option: kwargs[option] for option in ('select_unassigned_variable', 'order_domain_values', 'inference', 'verify', 'symmetry_breaking', 'max_nogoods') if option in kwargs}
+        options['engine'] = 'backjumping' if kwargs.get('engine') == 'backjumping' else 'iterative'
+        search = lambda csp, verbose=True, **_: bounded_search(csp, verbose=verbose, time_limit=time_limit, max_nodes=max_nodes, checkpoint=checkpoint,
+                                                               checkpoint_interval=checkpoint_interval, cancel=cancel, instrumentation=instrumentation, **options)
+    elif local is not None:
+        # Local search only uses the seed and verify options
+        search = lambda csp, seed=0, verify=False, verbose=True, **_: local_search(csp, verbose=verbose, method=local, max_iterations=max_iterations, time_limit=time_limit, seed=seed, verify=verify)
+    elif portfolio:
+        # The portfolio runs its own configurations, so only verify applies
+        search = lambda csp, verify=False, verbose=True, **_: portfolio_search(csp, verbose=verbose, verify=verify)[0]
+    elif processes is not None and kwargs.get('engine') != 'parallel':
+        search = partial(parallel_component_search, processes=processes or None, preprocess_graph=preprocess)
+    elif preprocess:
+        search = partial(preprocessed_search, processes=processes or None)
+    else:
+        search = partial(backtracking_search, processes=processes or None)
+    if instrumentation is not None and isinstance(search, partial) and search.func in (backtracking_search, preprocessed_search):
+        # The other searches run in worker processes or do not backtrack, so they are not instrumented
+        search = partial(search, instrumentation=instrumentation)
     start = time()
-    solution = backtracking_search(csp, 
-        select_unassigned_variable=kwargs['select_unassigned_variable'],
-        order_domain_values=kwargs['order_domain_values'],
-        inference=kwargs['inference']
-    )
+    solution = search(csp, verbose=verbose, **kwargs)
     end = time()
-    print(f'\nElapsed time: {timedelta(seconds=end-start)}\n')
-    return solution
+    if verbose:
+        print(f'\nElapsed time: {timedelta(seconds=end-start)}\n')
+    if bounded:
+        status, solution = solution.status, solution.solution
+    else:
+        status = 'solved' if solution is not None else 'unsat'
+    return (status, solution) if return_status else solution
 
 if __name__ == "__main__":
     import argparse
-    import glob
     import json
+    import signal
+    import threading
 
     parser = argparse.ArgumentParser(description="Graph Coloring CSP search solver.")
     parser.add_argument('file',
-                    help='Graph coloring CSP input files as described in the project assignment',
+                    help='Graph coloring CSP input file as described in the project assignment, or a directory or glob pattern of input files to solve in batch mode (* means assets/input_files)',
                     default='*')
     parser.add_argument('-var', '--variableorder',
-                    choices=['mrv', 'static', 'none'],
+                    choices=['mrv', 'imrv', 'mrv-numpy', 'static', 'none'],
                     help="Variable ordering heuristic",
                     default="mrv")
     parser.add_argument('-val', '--valueeorder',
-                    choices=['lcv', 'unordered', 'none'],
+                    choices=['lcv', 'lcv-numpy', 'unordered', 'none'],
                     help="Value ordering heuristic",
                     default="lcv")
     parser.add_argument('-inf', '--inference',
-                    choices=['mac', 'fc', 'none'],
+                    choices=['mac', 'mac-ne', 'fc', 'mac-numpy', 'fc-numpy', 'none'],
                     help="Inference method",
                     default="mac")
+    parser.add_argument('-dom', '--domains',
+                    choices=['list', 'bitset', 'numpy'],
+                    help="Domain representation (numpy needs NumPy, and is needed by the *-numpy heuristics and inference methods)",
+                    default="list")
+    parser.add_argument('-eng', '--engine',
+                    choices=['recursive', 'iterative', 'backjumping', 'parallel', 'restarts'],
+                    help="Backtracking search implementation",
+                    default="recursive")
+    parser.add_argument('--nogoods',
+                    type=int,
+                    help="Maximum number of nogoods kept by the backjumping engine (0 disables nogood recording)",
+                    default=10000)
+    parser.add_argument('--seed',
+                    type=int,
+                    help="Seed for the random choices of the restarts engine and local search",
+                    default=0)
+    parser.add_argument('--schedule',
+                    choices=['luby', 'geometric'],
+                    help="Restart schedule of the restarts engine",
+                    default="luby")
+    parser.add_argument('--weighting',
+                    action='store_true',
+                    help="Order variables by dom/wdeg in the restarts engine, keeping the weights learned from failures across restarts")
+    parser.add_argument('--symmetry',
+                    action='store_true',
+                    help="Break color symmetry: only try colors already used plus one new color")
+    parser.add_argument('--preprocess',
+                    action='store_true',
+                    help="Remove low-degree vertices, check for large cliques and solve connected components separately before searching")
+    parser.add_argument('-j', '--processes',
+                    type=int,
+                    help="Solve the connected components of the graph (or with -eng parallel, subtrees of the search) concurrently on this many processes (0 means one per CPU)",
+                    default=None)
+    parser.add_argument('--portfolio',
+                    action='store_true',
+                    help="Run several search configurations in parallel processes and keep the first answer")
+    parser.add_argument('--local',
+                    choices=['tabu', 'min-conflicts'],
+                    help="Color the graph with DSATUR and repair conflicts with local search instead of backtracking (cannot prove there is no solution)",
+                    default=None)
+    parser.add_argument('--iterations',
+                    type=int,
+                    help="Maximum number of local search moves",
+                    default=100000)
+    parser.add_argument('--time-limit',
+                    type=float,
+                    help="Maximum number of seconds of local search, or of the backtracking search (which then stops with the status timeout)",
+                    default=None)
+    parser.add_argument('--jobs',
+                    type=int,
+                    help="Number of input files solved at once in batch mode (0 means one per CPU)",
+                    default=0)
+    parser.add_argument('--timeout',
+                    type=float,
+                    help="Wall-clock limit in seconds for each input file in batch mode, enforced by killing its worker (0 means no limit)",
+                    default=600)
+    parser.add_argument('--max-nodes',
+                    type=int,
+                    help="Limit on the number of assignments of the backtracking search (in batch mode, for each input file, enforced by killing its worker)",
+                    default=None)
+    parser.add_argument('--checkpoint',
+                    type=str,
+                    help="File the state of the backtracking search is saved to periodically and on SIGINT/SIGTERM, and resumed from if it exists",
+                    default=None)
+    parser.add_argument('--checkpoint-interval',
+                    type=float,
+                    help="Number of seconds between checkpoints",
+                    default=60)
+    parser.add_argument('--output',
+                    type=str,
+                    help="File the JSON lines results of batch mode are written to (standard output by default)",
+                    default=None)
+    parser.add_argument('--cache-dir',
+                    type=str,
+                    help="Directory of the cache of parsed input files",
+                    default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--no-cache',
+                    action='store_true',
+                    help="Parse the input files without reading or writing the cache")
+    parser.add_argument('--stats',
+                    action='store_true',
+                    help="Collect search statistics (nodes, backtracks, failures, pruning, time in heuristics and inference) and print them (or add them to the batch mode results)")
+    parser.add_argument('--progress',
+                    type=float,
+                    help="Print the search statistics every this many seconds while searching",
+                    default=None)
+    parser.add_argument('--profile',
+                    nargs='?',
+                    const='',
+                    help="Run the search under cProfile and print the most expensive functions (or save the profile to this file)",
+                    default=None)
+    parser.add_argument('--optimize',
+                    action='store_true',
+                    help="Find the chromatic number of the graph (the number of colors in the file is ignored), printing each better coloring as it is found; --time-limit or Ctrl+C stops with the best coloring so far")
+    parser.add_argument('--verify',
+                    action='store_true',
+                    help="Fully validate the solution once the search finishes")
     
     args = parser.parse_args()
 
     variable_ordering_functions = {
         'mrv': mrv,
+        'imrv': IncrementalMRV(),
+        'mrv-numpy': mrv_numpy,
         'static': static_ordering,
         'none': static_ordering
     }
 
     value_ordering_functions = {
         'lcv': lcv,
+        'lcv-numpy': lcv_numpy,
         'unordered': unordered_domain_values,
         'none': unordered_domain_values
     }
 
     inference_methods = {
         'fc': forward_checking,
-        'mac': maintain_arc_consistency
+        'mac': maintain_arc_consistency,
+        'mac-ne': maintain_arc_consistency_ne,
+        'fc-numpy': forward_checking_numpy,
+        'mac-numpy': maintain_arc_consistency_numpy
     }
 
     file = args.file
-    select_unassigned_variable = variable_ordering_functions.get(args.variableorder)
-    order_domain_values = value_ordering_functions.get(args.valueeorder)
-    inference = inference_methods.get(args.inference)
+    batch_mode = file == '*' or os.path.isdir(file) or any(character in file for character in '*?[')
+    if batch_mode and args.checkpoint is not None:
+        parser.error("--checkpoint cannot be used in batch mode")
+    # In batch mode, --max-nodes is enforced by the batch runner for every engine
+    bounded = args.local is None and not args.optimize and (args.time_limit is not None or args.checkpoint is not None or (args.max_nodes is not None and not batch_mode))
+    if args.optimize and (batch_mode or args.engine not in ('recursive', 'backjumping') or args.local or args.portfolio or args.preprocess or args.processes is not None
+                          or args.checkpoint is not None or args.max_nodes is not None or args.stats or args.progress or args.profile is not None):
+        parser.error("--optimize solves a single input file with the backjumping engine, and cannot be used with --local, --portfolio, --preprocess, -j, "
+                     "--checkpoint, --max-nodes, --stats, --progress or --profile")
+    vectorized_options = [option for option in (args.variableorder, args.valueeorder, args.inference) if option.endswith('-numpy')]
+    if (vectorized_options or args.domains == 'numpy') and numpy is None:
+        parser.error("-dom numpy and the *-numpy heuristics and inference methods need NumPy (pip install numpy)")
+    if vectorized_options and args.domains != 'numpy':
+        parser.error(f"{', '.join(vectorized_options)} can only be used with -dom numpy")
+    if args.inference.endswith('-numpy') and (args.engine == 'backjumping' or args.optimize):
+        parser.error("The backjumping engine and --optimize do not support the *-numpy inference methods (use fc, mac or mac-ne)")
+    if bounded and (args.engine not in BOUNDED_ENGINES or args.preprocess or args.portfolio or args.processes is not None):
+        parser.error(BOUNDED_SEARCH_ERROR)
+    solve_options = {
+        'select_unassigned_variable': variable_ordering_functions.get(args.variableorder),
+        'order_domain_values': value_ordering_functions.get(args.valueeorder),
+        'inference': inference_methods.get(args.inference),
+        'domain_backend': args.domains,
+        'verify': args.verify,
+        'engine': args.engine,
+        'max_nogoods': args.nogoods,
+        'seed': args.seed,
+        'restart_schedule': args.schedule,
+        'weighting': args.weighting,
+        'symmetry_breaking': args.symmetry,
+        'preprocess': args.preprocess,
+        'processes': args.processes,
+        'portfolio': args.portfolio,
+        'local': args.local,
+        'max_iterations': args.iterations,
+        'time_limit': args.time_limit,
+        'cache': None if args.no_cache else GraphCache(args.cache_dir)
+    }
 
-    if file == '*':
-        folder = os.path.join("assets", "input_files")
-        for file in os.listdir(folder):
-            # Skip large file
-            if 'gc_1377121623225900.txt' in file:
-                continue
-            solution = solve(os.path.join(folder, file), 
-                select_unassigned_variable=select_unassigned_variable,
-                order_domain_values=order_domain_values,
-                inference=inference)
-            if solution:
-                print(f"\nSolution for file {os.path.basename(file)} -> {json.dumps(solution)}\n")
-            else:
-                print(f"\nSolution for file {os.path.basename(file)} -> No solution found.\n")
+    if batch_mode:
+        if file == '*':
+            file = os.path.join("assets", "input_files")
+        output = sys.stdout if args.output is None else open(args.output, 'w')
+        try:
+            run_batch(file, solve_options, jobs=args.jobs or None, timeout=args.timeout or None, max_nodes=args.max_nodes, output=output, statistics=args.stats)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+    elif args.optimize:
+        csp = GraphColoringCSP.from_file(file, domain_backend=args.domains, cache=solve_options['cache'])
+        cancel = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: cancel.set())
+        on_improve = lambda colors, coloring: print(f"Found a coloring with {colors} colors -> {json.dumps(coloring)}", flush=True)
+        result = chromatic_number(csp, select_unassigned_variable=solve_options['select_unassigned_variable'], order_domain_values=solve_options['order_domain_values'],
+                                  inference=solve_options['inference'], max_iterations=args.iterations, time_limit=args.time_limit, cancel=cancel,
+                                  max_nogoods=args.nogoods, seed=args.seed, on_improve=on_improve, verify=args.verify)
+        if result.optimal:
+            print(f"\nChromatic number for file {os.path.basename(file)} -> {result.colors}: {json.dumps(result.coloring)}\n")
+        else:
+            print(f"\nBest coloring for file {os.path.basename(file)} -> {result.colors} colors (at least {result.lower_bound} needed): {json.dumps(result.coloring)}\n")
     else:
-        solution = solve(file, 
-            select_unassigned_variable=select_unassigned_variable,
-            order_domain_values=order_domain_values,
-            inference=inference)
-        if solution:
+        instrumentation = None
+        if args.stats or args.progress or args.profile is not None:
+            progress = None
+            if args.progress:
+                progress = lambda statistics: print(f"{statistics.elapsed:.1f}s: {statistics.nodes} nodes, {statistics.backtracks} backtracks, max depth {statistics.max_depth}", flush=True)
+            instrumentation = Instrumentation(progress=progress, progress_interval=args.progress or 1.0, profile=args.profile is not None)
+        cancel = None
+        if args.checkpoint is not None:
+            # Preemption (SIGTERM) or Ctrl+C makes the search save a checkpoint and stop instead of losing its work
+            cancel = threading.Event()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda signum, frame: cancel.set())
+        status, solution = solve(file, instrumentation=instrumentation, max_nodes=args.max_nodes, checkpoint=args.checkpoint,
+                                 checkpoint_interval=args.checkpoint_interval, cancel=cancel, return_status=True, **solve_options)
+        if status == 'timeout':
+            print(f"\nNo solution found for file {os.path.basename(file)} within the limits.\n")
+        elif solution:
             print(f"\nSolution for file {os.path.basename(file)} -> {json.dumps(solution)}\n")
         else:
             print(f"\nSolution for file {os.path.basename(file)} -> No solution found.\n")
+        if args.stats:
+            print(instrumentation.statistics.report())
+        if args.profile is not None:
+            instrumentation.print_profile(path=args.profile or None)
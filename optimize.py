@@ -0,0 +1,184 @@
+from collections import namedtuple
+from time import perf_counter
+
+from backjumping import ConflictDirectedBackjumping
+from backtracking import SearchInterrupted, retract_assignment
+from fileparser import CSRGraph
+from heuristics import lcv, mrv, prefer_colors
+from inference import maintain_arc_consistency
+from localsearch import LocalSearch, dsatur
+from preprocessing import greedy_clique
+
+"""
+This module contains an optimization mode that finds the chromatic number of a graph (the fewest colors it can be
+colored with) in one process, instead of solving the problem once for each number of colors:
+    1. A lower bound is the size of a clique found by `preprocessing.greedy_clique`, and an upper bound is the number
+       of colors DSATUR uses when it may add colors (`localsearch.dsatur` with colors=None).
+    2. k is tightened from the upper bound down, one color at a time. The coloring with k + 1 colors seeds the search
+       for k colors: its least used color (outside the clique) is dropped, and tabu search (`localsearch.LocalSearch`)
+       repairs the coloring from there. If tabu search runs out of moves, conflict-directed backjumping
+       (`backjumping.ConflictDirectedBackjumping`) either finds a coloring, trying each vertex's color in the seed
+       first, or proves that there is none, which proves that k + 1 is the chromatic number.
+    3. The backjumping search starts with the vertices of the clique given colors 0, 1, ... (every coloring can be
+       renamed so they have them). The nogoods it learns for k colors are sets of assignments that no coloring with
+       k colors extends, so no coloring with fewer colors extends them either: they are kept for the next k.
+The graph is parsed and built once: the problem for each k shares the arrays of the `fileparser.CSRGraph`. The best
+coloring found so far is kept in the best attribute and passed to the on_improve callback as soon as it is found, so a
+search stopped by its time limit (or cancelled) still reports it.
+"""
+
+OptimizationResult = namedtuple('OptimizationResult', ['colors', 'coloring', 'lower_bound', 'optimal'])
+
+def drop_color(coloring, clique, colors):
+    """
+    Function that renames the colors of coloring (which uses colors + 1 colors) so the vertices of clique get colors
+    0, 1, ... and the least used color outside the clique becomes color colors, the one the next search does without.
+    """
+    usage = {}
+    for color in coloring.values():
+        usage[color] = usage.get(color, 0) + 1
+    clique_colors = [coloring[vertex] for vertex in clique]
+    dropped = min((color for color in usage if color not in clique_colors), key=usage.__getitem__)
+    others = sorted(color for color in usage if color not in clique_colors and color != dropped)
+    names = {color: name for name, color in enumerate(clique_colors + others)}
+    names[dropped] = colors
+    return {vertex: names[color] for vertex, color in coloring.items()}
+
+class ChromaticNumberSearch:
+    """
+    Class implementing the optimization mode described above. The number of colors of csp is not used.
+
+    arguments:
+        :csp: - The `GraphColoringCSP` whose graph is colored
+        :select_unassigned_variable: - The variable ordering heuristic of the backjumping search (e.g., mrv)
+        :order_domain_values: - The value ordering heuristic of the backjumping search, after the seed color (e.g., lcv)
+        :inference: - The inference method mirrored by the backjumping search (forward_checking, maintain_arc_consistency,
+            maintain_arc_consistency_ne or None)
+        :max_iterations: - The maximum number of tabu search moves for each k
+        :time_limit: - The number of seconds to search for (None means no limit)
+        :cancel: - An object with an is_set method (e.g., a `threading.Event`): once it is set, the search stops
+        :max_nogoods: - The maximum number of nogoods kept by the backjumping search
+        :seed: - The seed of tabu search
+        :on_improve: - Function called with (colors, coloring) whenever a coloring with fewer colors is found
+
+    After `search` returns, these attributes report what the search did:
+        :lower_bound: - The size of the clique found
+        :upper_bound: - The number of colors used by DSATUR
+        :best: - The coloring with the fewest colors found
+        :history: - (colors, how the coloring was found or 'unsat', seconds since the start) for each k tried
+        :nogoods_kept: - How many nogoods were carried over from one k to the next
+        :reason: - Why the search stopped before proving the chromatic number: 'time' or 'cancelled' (else None)
+    """
+    def __init__(self, csp, select_unassigned_variable=mrv, order_domain_values=lcv, inference=maintain_arc_consistency, max_iterations=10000,
+                 time_limit=None, cancel=None, max_nogoods=10000, seed=0, on_improve=None) -> None:
+        self.csp = csp
+        self.select_unassigned_variable = select_unassigned_variable
+        self.order_domain_values = order_domain_values
+        self.inference = inference
+        self.max_iterations = max_iterations
+        self.time_limit = time_limit
+        self.cancel = cancel
+        self.max_nogoods = max_nogoods
+        self.seed = seed
+        self.on_improve = on_improve
+        self.lower_bound = None
+        self.upper_bound = None
+        self.best = None
+        self.history = []
+        self.nogoods_kept = 0
+        self.reason = None
+
+    def improve(self, coloring, method):
+        """
+        Method that records coloring as the best one, and returns the number of colors it uses (which can be fewer
+        than the number of colors it was found with).
+        """
+        colors = len(set(coloring.values()))
+        self.best = coloring
+        self.history.append((colors, method, perf_counter() - self.start))
+        if self.on_improve is not None:
+            self.on_improve(colors, coloring)
+        return colors
+
+    def subproblem(self, colors):
+        """
+        Method that returns a `GraphColoringCSP` for the graph of csp with colors colors, sharing its CSR arrays.
+        """
+        graph = self.csp.graph
+        return type(self.csp).from_csr(CSRGraph(colors, graph.labels, graph.offsets, graph.indices), domain_backend=self.csp.domain_backend)
+
+    def search(self):
+        """
+        Method that runs the search and returns an `OptimizationResult` (colors, coloring, lower_bound, optimal), where
+        colors is the number of colors of the best coloring found, and optimal is whether it is proved to be the fewest.
+        """
+        csp = self.csp
+        self.start = perf_counter()
+        deadline = None if self.time_limit is None else self.start + self.time_limit
+        clique = greedy_clique(csp.variables, csp.neighbors)
+        self.lower_bound = len(clique)
+        coloring = dsatur(csp.variables, csp.neighbors)
+        self.upper_bound = self.improve(coloring, 'dsatur')
+        def stop(csp):
+            if self.cancel is not None and self.cancel.is_set():
+                self.reason = 'cancelled'
+            elif deadline is not None and perf_counter() >= deadline:
+                self.reason = 'time'
+            return self.reason is not None
+        nogoods = []
+        colors = self.upper_bound
+        while colors > self.lower_bound:
+            if stop(csp):
+                break
+            k = colors - 1
+            seed = drop_color(self.best, clique, k)
+            subproblem = self.subproblem(k)
+            remaining = None if deadline is None else max(deadline - perf_counter(), 0)
+            local = LocalSearch(subproblem, max_iterations=self.max_iterations, time_limit=remaining, seed=self.seed, initial=seed)
+            coloring = local.search()
+            if coloring is not None:
+                colors = self.improve(dict(coloring), 'tabu')
+                continue
+            subproblem = self.subproblem(k)
+            backjumping = ConflictDirectedBackjumping(subproblem, self.select_unassigned_variable, prefer_colors(self.order_domain_values, seed),
+                                                      self.inference, self.max_nogoods)
+            # Nogoods with a color that k colors do not have can never apply again
+            for nogood in nogoods:
+                if all(value < k for _, value in nogood):
+                    backjumping.add_nogood(nogood)
+            self.nogoods_kept += len(backjumping.nogoods)
+            mark = subproblem.mark()
+            try:
+                if backjumping.apply_decisions([(vertex, color) for color, vertex in enumerate(clique)]):
+                    coloring = backjumping.search(stop)
+                    coloring = None if coloring is None else dict(coloring)
+            except SearchInterrupted:
+                break
+            finally:
+                retract_assignment(subproblem, backjumping.assignment, mark)
+                backjumping.reset()
+            nogoods = list(backjumping.nogoods)
+            if coloring is None:
+                self.history.append((k, 'unsat', perf_counter() - self.start))
+                break
+            colors = self.improve(coloring, 'backjumping')
+        return OptimizationResult(colors, self.best, self.lower_bound, self.reason is None)
+
+def chromatic_number(csp, verbose=True, select_unassigned_variable=mrv, order_domain_values=lcv, inference=maintain_arc_consistency, max_iterations=10000,
+                     time_limit=None, cancel=None, max_nogoods=10000, seed=0, on_improve=None, verify=False):
+    """
+    Function that runs the optimization mode (see `ChromaticNumberSearch`) and returns an `OptimizationResult`
+    (colors, coloring, lower_bound, optimal).
+    """
+    search = ChromaticNumberSearch(csp, select_unassigned_variable, order_domain_values, inference, max_iterations, time_limit, cancel,
+                                   max_nogoods, seed, on_improve)
+    result = search.search()
+    if verbose:
+        for colors, method, elapsed in search.history:
+            print(f"\t{colors} colors -> {'no coloring' if method == 'unsat' else f'colored by {method}'} ({elapsed:.3f}s)")
+        bound = 'optimal' if result.optimal else f"lower bound {result.lower_bound}, stopped ({search.reason})"
+        print(f"Clique lower bound: {search.lower_bound}, DSATUR upper bound: {search.upper_bound}, best: {result.colors} colors ({bound}), "
+              f"nogoods carried over: {search.nogoods_kept}\n")
+    if verify and not search.subproblem(result.colors).valid_solution(result.coloring):
+        raise RuntimeError("The optimization mode returned an invalid coloring.")
+    return result
@@ -0,0 +1,289 @@
+from collections import deque
+import multiprocessing
+import os
+import queue
+from time import time
+
+from backtracking import SearchInterrupted, apply_decisions, backtrack_iterative, backtracking_search, print_problem, retract_assignment, verify_solution
+from graphcoloring import GraphColoringCSP
+from heuristics import IncrementalMRV, break_color_symmetry, lcv, mrv, unordered_domain_values
+from inference import forward_checking, maintain_arc_consistency, maintain_arc_consistency_ne
+from preprocessing import complete_solution, connected_components, preprocess
+
+"""
+This module contains searches that use several processes. Work is sent to the worker processes in a compact
+form (edge lists, the number of colors and the search options), and each worker builds its own `GraphColoringCSP`.
+The search options must be picklable, so heuristics and inference methods are passed as module-level functions
+(or `heuristics.IncrementalMRV` objects), and symmetry breaking is passed as the symmetry_breaking flag.
+"""
+
+def serialize_subproblem(csp, vertices):
+    """
+    Function that returns the compact form of the subproblem induced by vertices: (edges, colors, domain_backend).
+    """
+    vertices = set(vertices)
+    edges = [(vertex, neighbor) for vertex in vertices for neighbor in csp.neighbors[vertex] if neighbor in vertices and vertex < neighbor]
+    return edges, csp.colors, csp.domain_backend
+
+def solve_subproblem(task):
+    """
+    Worker function that builds a GraphColoringCSP from its compact form and runs backtracking_search on it.
+    Returns the solution (or None) and the number of assignments the search made.
+    """
+    (edges, colors, domain_backend), kwargs = task
+    csp = GraphColoringCSP(edges, colors, domain_backend=domain_backend)
+    solution = backtracking_search(csp, verbose=False, **kwargs)
+    return solution, csp.assignment_counts
+
+def parallel_component_search(csp, processes=None, preprocess_graph=False, verbose=True, verify=False, **kwargs):
+    """
+    Function that splits the graph into its connected components and solves them concurrently on a pool of
+    processes (None means one per CPU). As soon as one component turns out to have no solution, the other workers
+    are terminated and None is returned. Otherwise the colorings of the components are merged into one solution.
+    If preprocess_graph=True, the components are those of the kernel (see `preprocessing.preprocess`).
+    The remaining keyword arguments are passed to `backtracking_search` in each worker.
+    """
+    if verbose:
+        print_problem(kwargs.get('select_unassigned_variable'), kwargs.get('order_domain_values'), kwargs.get('inference'))
+    removed = []
+    if preprocess_graph:
+        preprocessed = preprocess(csp, verbose)
+        if preprocessed is None:
+            return None
+        components, removed = preprocessed
+    else:
+        components = connected_components(csp.variables, csp.neighbors)
+    # Largest components first, so the longest searches start as early as possible
+    components.sort(key=len, reverse=True)
+    tasks = [(serialize_subproblem(csp, component), dict(kwargs, verify=verify)) for component in components]
+    solution = {}
+    if processes == 1 or len(tasks) <= 1:
+        results = map(solve_subproblem, tasks)
+        for component_solution, assignment_counts in results:
+            csp.assignment_counts += assignment_counts
+            if component_solution is None:
+                return None
+            solution.update(component_solution)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            for component_solution, assignment_counts in pool.imap_unordered(solve_subproblem, tasks):
+                csp.assignment_counts += assignment_counts
+                if component_solution is None:
+                    # One component has no solution, so neither does the graph: stop the other workers
+                    pool.terminate()
+                    return None
+                solution.update(component_solution)
+    if preprocess_graph:
+        return complete_solution(csp, removed, solution, verify)
+    if verify:
+        verify_solution(csp, solution)
+    return solution
+
+
+# Configurations run by `portfolio_search` by default. Each one is a set of keyword arguments for `backtracking_search`.
+default_portfolio = [
+    {'select_unassigned_variable': IncrementalMRV(), 'order_domain_values': lcv, 'inference': maintain_arc_consistency_ne, 'engine': 'iterative'},
+    {'select_unassigned_variable': IncrementalMRV(), 'order_domain_values': unordered_domain_values, 'inference': forward_checking, 'engine': 'iterative', 'symmetry_breaking': True},
+    {'select_unassigned_variable': mrv, 'order_domain_values': lcv, 'inference': maintain_arc_consistency_ne, 'engine': 'backjumping'},
+    {'select_unassigned_variable': mrv, 'order_domain_values': lcv, 'inference': forward_checking, 'engine': 'backjumping', 'symmetry_breaking': True},
+    {'select_unassigned_variable': mrv, 'order_domain_values': lcv, 'inference': maintain_arc_consistency_ne, 'engine': 'restarts', 'weighting': True, 'seed': 1},
+]
+
+def describe_configuration(configuration):
+    """
+    Function that returns a short name for a portfolio configuration, e.g., 'mrv/lcv/maintain_arc_consistency_ne/backjumping'.
+    """
+    def name(function):
+        return getattr(function, '__name__', type(function).__name__) if function else 'none'
+    parts = [name(configuration.get('select_unassigned_variable', mrv)), name(configuration.get('order_domain_values', lcv)),
+             name(configuration.get('inference', maintain_arc_consistency)), configuration.get('engine', 'recursive')]
+    if configuration.get('symmetry_breaking'):
+        parts.append('symmetry')
+    for key in sorted(set(configuration) - {'select_unassigned_variable', 'order_domain_values', 'inference', 'engine', 'symmetry_breaking'}):
+        parts.append(f"{key}={configuration[key]}")
+    return '/'.join(parts)
+
+def run_configuration(index, task, results):
+    """
+    Worker function for `portfolio_search`: solves the problem with one configuration and puts
+    (index, status, solution, assignment_counts) on the results queue.
+    """
+    try:
+        solution, assignment_counts = solve_subproblem(task)
+        results.put((index, 'solved' if solution is not None else 'no solution', solution, assignment_counts))
+    except Exception as error:
+        results.put((index, f'error: {error!r}', None, 0))
+
+def portfolio_search(csp, configurations=None, timeout=None, verbose=True, verify=False):
+    """
+    Function that runs several configurations of the search at once, each in its own process, and returns the answer
+    of the first one to finish (a solution, or None if it proved there is no solution). The other processes are then terminated.
+    If no configuration finishes within timeout seconds, every process is terminated and None is returned.
+    Returns the solution and a report: a list with one dictionary per configuration with its name, its status
+    ('solved', 'no solution', 'terminated', 'timeout' or an error) and how long it ran in seconds.
+    """
+    configurations = default_portfolio if configurations is None else configurations
+    problem = serialize_subproblem(csp, csp.variables)
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=run_configuration, args=(index, (problem, dict(configuration, verify=verify)), results), daemon=True)
+               for index, configuration in enumerate(configurations)]
+    report = [{'configuration': describe_configuration(configuration), 'status': 'terminated', 'elapsed': None} for configuration in configurations]
+    start = time()
+    for worker in workers:
+        worker.start()
+    solution = None
+    pending = len(workers)
+    while pending:
+        remaining = None if timeout is None else timeout - (time() - start)
+        try:
+            index, status, result, assignment_counts = results.get(timeout=remaining if remaining is None or remaining > 0 else 0)
+        except queue.Empty:
+            for entry in report:
+                if entry['elapsed'] is None:
+                    entry['status'] = 'timeout'
+            break
+        pending -= 1
+        report[index].update(status=status, elapsed=time() - start, assignment_counts=assignment_counts)
+        if not status.startswith('error'):
+            solution = result
+            break
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+        worker.join()
+    end = time()
+    for entry in report:
+        if entry['elapsed'] is None:
+            entry['elapsed'] = end - start
+    if verify:
+        verify_solution(csp, solution)
+    if verbose:
+        print("Portfolio results:")
+        for entry in report:
+            print(f"\t{entry['configuration']} -> {entry['status']} after {entry['elapsed']:.3f}s")
+        print()
+    return solution, report
+
+
+def explore_subtree(csp, prefix, budget, select_unassigned_variable=mrv, order_domain_values=lcv, inference=maintain_arc_consistency):
+    """
+    Function that searches the subtree of csp below the decisions in prefix (a list of (variable, value) pairs, see
+    `backtracking.apply_decisions`) with `backtrack_iterative`. Once the search has made budget assignments it stops,
+    and the part of the subtree it did not explore is returned as new prefixes (None means no budget).
+    Returns (status, result): ('solved', solution), ('no solution', None) or ('split', prefixes).
+    csp is restored to the state it was in before returning, so it can be reused for the next subtree.
+    """
+    mark = csp.mark()
+    assignment = {}
+    try:
+        if not apply_decisions(csp, assignment, prefix, inference):
+            return 'no solution', None
+        stop = None
+        if budget is not None:
+            limit = csp.assignment_counts + budget
+            stop = lambda csp: csp.assignment_counts >= limit
+        try:
+            solution = backtrack_iterative(csp, assignment, select_unassigned_variable, order_domain_values, inference, stop)
+        except SearchInterrupted as interrupted:
+            return 'split', [list(prefix) + subproblem for subproblem in interrupted.subproblems()]
+        if solution is None:
+            return 'no solution', None
+        return 'solved', dict(solution)
+    finally:
+        retract_assignment(csp, assignment, mark)
+
+def tree_worker(problem, kwargs, tasks, results):
+    """
+    Worker process for `parallel_tree_search`. Builds the CSP once from its compact form, then takes (prefix, budget)
+    tasks from the tasks queue until it gets None, and puts (status, result, assignments made) on the results queue
+    for each one (see `explore_subtree`). Symmetry breaking is applied here because the wrapped value ordering
+    cannot be sent to another process.
+    """
+    edges, colors, domain_backend = problem
+    kwargs = dict(kwargs)
+    if kwargs.pop('symmetry_breaking', False):
+        kwargs['order_domain_values'] = break_color_symmetry(kwargs.get('order_domain_values', lcv))
+    csp = GraphColoringCSP(edges, colors, domain_backend=domain_backend)
+    for prefix, budget in iter(tasks.get, None):
+        start = csp.assignment_counts
+        try:
+            status, result = explore_subtree(csp, prefix, budget, **kwargs)
+        except Exception as error:
+            status, result = f'error: {error!r}', None
+        results.put((status, result, csp.assignment_counts - start))
+
+def parallel_tree_search(csp, processes=None, split_target=None, budget=2000, verbose=True, verify=False, symmetry_breaking=False, **kwargs):
+    """
+    Function that splits the search tree of a single problem and explores the subtrees concurrently on a pool of
+    processes (None means one per CPU). The master process first fixes the first variables chosen by the variable
+    ordering, one level at a time, until there are at least split_target subtrees (twice the number of processes
+    by default). Each worker searches one subtree at a time, and once it has made budget assignments in a subtree,
+    it hands the part it has not explored back to the master as new subtrees, so large subtrees keep being split while
+    other workers are idle. The search ends with the first solution, or with None once every subtree has been shown to
+    have no solution. Workers build the CSP once from its compact form (see `serialize_subproblem`).
+    The remaining keyword arguments are passed to `explore_subtree` (the heuristics and inference method).
+    The assignments made by every process are added to csp.assignment_counts.
+    """
+    processes = processes or os.cpu_count()
+    split_target = split_target or 2 * processes
+    if verbose:
+        print_problem(kwargs.get('select_unassigned_variable'), kwargs.get('order_domain_values'), kwargs.get('inference'))
+    local_kwargs = dict(kwargs)
+    if symmetry_breaking:
+        local_kwargs['order_domain_values'] = break_color_symmetry(kwargs.get('order_domain_values', lcv))
+    # Split the top of the tree in this process, one decision at a time, shallowest subtree first
+    pending = deque([[]])
+    solution = None
+    subtrees = 0
+    while pending and len(pending) < split_target:
+        status, result = explore_subtree(csp, pending.popleft(), 0, **local_kwargs)
+        subtrees += 1
+        if status == 'solved':
+            solution = result
+            pending.clear()
+        elif status == 'split':
+            pending.extend(result)
+    if pending and processes == 1:
+        while pending:
+            status, result = explore_subtree(csp, pending.pop(), budget, **local_kwargs)
+            subtrees += 1
+            if status == 'solved':
+                solution = result
+                break
+            if status == 'split':
+                pending.extend(result)
+    elif pending:
+        problem = serialize_subproblem(csp, csp.variables)
+        options = dict(kwargs, symmetry_breaking=symmetry_breaking)
+        tasks, results = multiprocessing.Queue(), multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=tree_worker, args=(problem, options, tasks, results), daemon=True) for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        try:
+            running = 0
+            while pending or running:
+                # Keep every worker busy, deepest subtrees first since they are the most likely to be small
+                while pending and running < processes:
+                    tasks.put((pending.pop(), budget))
+                    running += 1
+                status, result, assignment_counts = results.get()
+                running -= 1
+                csp.assignment_counts += assignment_counts
+                subtrees += 1
+                if status == 'solved':
+                    solution = result
+                    break
+                if status == 'split':
+                    pending.extend(result)
+                elif status != 'no solution':
+                    raise RuntimeError(f"Parallel tree search worker failed with {status}")
+        finally:
+            # Workers still searching other subtrees are stopped instead of waited for
+            for worker in workers:
+                worker.terminate()
+                worker.join()
+    if verbose:
+        print(f"Subtrees searched: {subtrees}\n")
+    if verify:
+        verify_solution(csp, solution)
+    return solution
@@ -0,0 +1,144 @@
+from collections import deque
+
+from backtracking import backtracking_search, print_problem, verify_solution
+
+"""
+This module contains a preprocessing stage that runs before the backtracking search:
+    1. Kernelization: a vertex with fewer neighbors than there are colors can always be colored once its
+       neighbors are, so it is removed, and removing it may lower the degree of its neighbors enough to
+       remove them too. What is left is the kernel of the graph.
+    2. The kernel is split into connected components, which can be colored independently.
+    3. A large clique is found in each component with a greedy heuristic. A clique needs as many colors as
+       it has vertices, so a clique with more vertices than there are colors proves there is no solution.
+    4. Each component is solved with `backtracking_search`, and the removed vertices are then colored
+       greedily in the reverse of the order they were removed in.
+"""
+
+def kernelize(neighbors, colors):
+    """
+    Function that repeatedly removes vertices with fewer than colors neighbors.
+    Returns the set of vertices in the kernel, and the removed vertices in the order they were removed.
+    """
+    degrees = {vertex: len(adjacent) for vertex, adjacent in neighbors.items()}
+    queue = deque(vertex for vertex, degree in degrees.items() if degree < colors)
+    removed = []
+    removed_set = set(queue)
+    while queue:
+        vertex = queue.popleft()
+        removed.append(vertex)
+        for neighbor in neighbors[vertex]:
+            if neighbor not in removed_set:
+                degrees[neighbor] -= 1
+                if degrees[neighbor] < colors:
+                    removed_set.add(neighbor)
+                    queue.append(neighbor)
+    kernel = {vertex for vertex in degrees if vertex not in removed_set}
+    return kernel, removed
+
+def connected_components(vertices, neighbors):
+    """
+    Function that returns the connected components of the graph induced by vertices, as a list of sets.
+    """
+    vertices = set(vertices)
+    seen = set()
+    components = []
+    for start in vertices:
+        if start in seen:
+            continue
+        seen.add(start)
+        component = {start}
+        stack = [start]
+        while stack:
+            vertex = stack.pop()
+            for neighbor in neighbors[vertex]:
+                if neighbor in vertices and neighbor not in seen:
+                    seen.add(neighbor)
+                    component.add(neighbor)
+                    stack.append(neighbor)
+        components.append(component)
+    return components
+
+def greedy_clique(vertices, neighbors, starts=32, target=None):
+    """
+    Function that finds a large clique in the graph induced by vertices. Starting from each of the
+    `starts` vertices with the highest degree, the clique is grown by repeatedly adding the candidate
+    with the most neighbors among the remaining candidates. Stops early once a clique with more than
+    target vertices is found. Returns the largest clique found as a list.
+    """
+    vertices = set(vertices)
+    order = sorted(vertices, key=lambda vertex: len(neighbors[vertex]), reverse=True)
+    best = []
+    for start in order[:starts]:
+        clique = [start]
+        candidates = vertices.intersection(neighbors[start])
+        while candidates:
+            vertex = max(candidates, key=lambda candidate: len(candidates.intersection(neighbors[candidate])))
+            clique.append(vertex)
+            candidates = candidates.intersection(neighbors[vertex])
+        if len(clique) > len(best):
+            best = clique
+            if target is not None and len(best) > target:
+                break
+    return best
+
+def color_greedily(vertices, neighbors, colors, assignment):
+    """
+    Function that assigns each vertex, in order, the lowest color not used by its assigned neighbors.
+    Returns False if some vertex has no color left.
+    """
+    for vertex in vertices:
+        used = {assignment[neighbor] for neighbor in neighbors[vertex] if neighbor in assignment}
+        color = next((color for color in range(colors) if color not in used), None)
+        if color is None:
+            return False
+        assignment[vertex] = color
+    return True
+
+def preprocess(csp, verbose=False):
+    """
+    Function that runs kernelization, splits the kernel into connected components and checks each component for
+    a clique with more vertices than there are colors. Returns None if such a clique was found (so there is no solution),
+    otherwise the list of components and the removed vertices in the order they were removed.
+    """
+    kernel, removed = kernelize(csp.neighbors, csp.colors)
+    components = connected_components(kernel, csp.neighbors)
+    if verbose:
+        print(f"Kernel: {len(kernel)} of {len(csp.variables)} vertices in {len(components)} component(s)\n")
+    for component in components:
+        clique = greedy_clique(component, csp.neighbors, target=csp.colors)
+        if len(clique) > csp.colors:
+            if verbose:
+                print(f"Found a clique of {len(clique)} vertices, which cannot be colored with {csp.colors} colors\n")
+            return None
+    return components, removed
+
+def complete_solution(csp, removed, solution, verify=False):
+    """
+    Function that colors the vertices removed by kernelization once the kernel is colored, and returns the solution.
+    """
+    color_greedily(reversed(removed), csp.neighbors, csp.colors, solution)
+    if verify:
+        verify_solution(csp, solution)
+    return solution
+
+def preprocessed_search(csp, verbose=True, verify=False, **kwargs):
+    """
+    Function that runs the preprocessing stage described above and returns a solution for csp, or None
+    if there is no solution. The remaining keyword arguments are passed to `backtracking_search` for each
+    component of the kernel. The assignments made for the components are added to csp.assignment_counts.
+    """
+    if verbose:
+        print_problem(kwargs.get('select_unassigned_variable'), kwargs.get('order_domain_values'), kwargs.get('inference'))
+    preprocessed = preprocess(csp, verbose)
+    if preprocessed is None:
+        return None
+    components, removed = preprocessed
+    solution = {}
+    for component in components:
+        subproblem = csp.induced_subproblem(component)
+        component_solution = backtracking_search(subproblem, verbose=False, verify=verify, **kwargs)
+        csp.assignment_counts += subproblem.assignment_counts
+        if component_solution is None:
+            return None
+        solution.update(component_solution)
+    return complete_solution(csp, removed, solution, verify)
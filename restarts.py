@@ -0,0 +1,139 @@
+import random
+
+from backtracking import SearchInterrupted, backtrack_iterative, retract_assignment
+from heuristics import RandomizedLCV, RandomizedMRV, break_color_symmetry, lcv, mrv
+from inference import maintain_arc_consistency
+
+"""
+This module contains a backtracking search with randomized restarts. The run time of backtracking search is
+heavy-tailed: an unlucky choice near the top of the tree can trap the search in a large subtree with no solution,
+while a different choice would have found a solution quickly. The restart search breaks ties in the heuristics at
+random, cuts each run off once it has had a number of failures given by a restart schedule, and starts the next run
+with a new seed. The failure budget keeps growing, so the search is still complete: a run that explores its whole
+tree without reaching its budget proves there is no solution.
+
+Two schedules are available:
+    luby        - base * (1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ...), the Luby sequence
+    geometric   - base * (1, factor, factor ** 2, ...)
+"""
+
+def luby(i):
+    """
+    Function that returns the i-th number of the Luby sequence (starting from i=1).
+    """
+    while True:
+        k = i.bit_length() # 2 ** (k - 1) <= i < 2 ** k
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+
+def luby_schedule(base, factor=None):
+    """
+    Generator that yields the failure budgets base * luby(1), base * luby(2), ...
+    """
+    i = 1
+    while True:
+        yield base * luby(i)
+        i += 1
+
+def geometric_schedule(base, factor=1.5):
+    """
+    Generator that yields the failure budgets base, base * factor, base * factor ** 2, ... rounded down.
+    """
+    budget = base
+    while True:
+        yield int(budget)
+        budget *= factor
+
+restart_schedules = {
+    'luby': luby_schedule,
+    'geometric': geometric_schedule
+}
+
+# Heuristics that are replaced by their randomized versions
+randomized_heuristics = {
+    mrv: RandomizedMRV,
+    lcv: RandomizedLCV
+}
+
+class RestartSearch:
+    """
+    Class implementing backtracking search with randomized restarts. Each run uses `backtracking.backtrack_iterative`.
+    mrv and lcv are replaced with `heuristics.RandomizedMRV` and `heuristics.RandomizedLCV`, and every heuristic with a
+    `reseed` method is reseeded before each run with a seed drawn from a generator seeded with seed, so the same
+    seed always gives the same sequence of runs.
+
+    arguments:
+        :csp: - The `GraphColoringCSP` to solve
+        :select_unassigned_variable: - A function representing the variable ordering heuristic (e.g., mrv)
+        :order_domain_values: - A function representing the value ordering heuristic (e.g., lcv)
+        :inference: - A function representing the inference method (e.g., forward checking, mac/ac3)
+        :seed: - The seed for the sequence of runs
+        :schedule: - The restart schedule, 'luby' or 'geometric'
+        :base: - The failure budget of the first run
+        :factor: - The growth factor of the geometric schedule
+        :weighting: - If True, mrv is replaced with dom/wdeg, and the weights learned from failures carry across restarts
+        :symmetry_breaking: - If True, the value ordering is wrapped with `heuristics.break_color_symmetry`
+        :max_restarts: - After this many restarts, the last run has no failure budget (None means no limit)
+
+    After `search` returns, these attributes report what the search did:
+        :restarts: - How many runs were cut off and restarted
+        :failures: - How many values failed over all runs
+        :seeds: - The seed of each run
+    """
+    def __init__(self, csp, select_unassigned_variable=mrv, order_domain_values=lcv, inference=maintain_arc_consistency,
+                 seed=0, schedule='luby', base=100, factor=1.5, weighting=False, symmetry_breaking=False, max_restarts=None) -> None:
+        if select_unassigned_variable is mrv:
+            select_unassigned_variable = RandomizedMRV(weighted=weighting)
+        elif select_unassigned_variable in randomized_heuristics:
+            select_unassigned_variable = randomized_heuristics[select_unassigned_variable]()
+        if order_domain_values in randomized_heuristics:
+            order_domain_values = randomized_heuristics[order_domain_values]()
+        self.csp = csp
+        self.select_unassigned_variable = select_unassigned_variable
+        self.order_domain_values = order_domain_values
+        self.inference = inference
+        self.seed = seed
+        self.budgets = restart_schedules[schedule](base, factor)
+        self.symmetry_breaking = symmetry_breaking
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self.failures = 0
+        self.seeds = []
+
+    def search(self):
+        """
+        Method that runs the search and returns the solution, or None if the problem has no solution.
+        """
+        csp = self.csp
+        generator = random.Random(self.seed)
+        select_unassigned_variable = self.select_unassigned_variable
+        order_domain_values = self.order_domain_values
+        if self.symmetry_breaking:
+            order_domain_values = break_color_symmetry(order_domain_values)
+        record_failure = getattr(select_unassigned_variable, 'record_failure', None)
+        failures = 0
+        def on_failure(csp, variable, assignment):
+            nonlocal failures
+            failures += 1
+            if record_failure is not None:
+                record_failure(csp, variable, assignment)
+        for budget in self.budgets:
+            seed = generator.randrange(2 ** 32)
+            self.seeds.append(seed)
+            for heuristic in (self.select_unassigned_variable, self.order_domain_values):
+                if hasattr(heuristic, 'reseed'):
+                    heuristic.reseed(seed)
+            failures = 0
+            last_run = self.max_restarts is not None and self.restarts >= self.max_restarts
+            stop = None if last_run else lambda csp: failures >= budget
+            mark = csp.mark()
+            assignment = {}
+            try:
+                # A run that returns without being interrupted either found a solution or explored its whole tree
+                return backtrack_iterative(csp, assignment, select_unassigned_variable, order_domain_values, self.inference, stop, on_failure)
+            except SearchInterrupted:
+                retract_assignment(csp, assignment, mark)
+                self.restarts += 1
+            finally:
+                self.failures += failures
@@ -0,0 +1,287 @@
+import gc
+from math import log
+import os
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+import tracemalloc
+
+from benchmark import write_results
+from fileparser import parse_csr
+from generator import generate, instance_name, models, write_instance
+from graphcoloring import GraphColoringCSP
+from heuristics import IncrementalMRV, lcv, mrv
+from inference import forward_checking, maintain_arc_consistency, maintain_arc_consistency_ne
+from main import solve_csp
+from vectorized import forward_checking_numpy, lcv_numpy, maintain_arc_consistency_numpy, mrv_numpy, numpy
+
+"""
+This module contains a scaling harness: it generates graphs of growing size with `generator.generate` (keeping the
+average degree, so the number of edges grows with the number of vertices), and for each graph and solver
+configuration records:
+    generate_time   - The seconds taken to generate the graph and write its file (None if the file already existed)
+    file_size       - The size of the file in bytes
+    parse_time      - The seconds `fileparser.parse_csr` takes to read the file
+    build_time      - The seconds `GraphColoringCSP.from_csr` takes to build the problem (with the domain backend of the
+                      configuration)
+    peak_memory     - The peak memory allocated by parsing and building in bytes, measured with tracemalloc in one extra
+                      run (tracemalloc slows them down, so it is not used in the timed runs, and it is not used for the
+                      search, which it would slow down far more)
+    solve_time      - The seconds the configuration takes to solve the problem, stopped after time_limit seconds
+    status          - 'solved', 'unsat' or 'timeout' ('not found' for local search, which cannot prove there is no solution)
+    nodes           - The number of assignments made by the search
+Each part scales as long as its cost grows in proportion to the number of edges. `breakpoints` finds, for each part,
+the first size at which it grows faster than that (as edges^limit or more between two sizes), or, for the search, at
+which it runs out of time: this is where that part stops scaling. `report` prints the measurements as one table per
+model and lists the breakpoints, and `plot` draws the curves with matplotlib (which is optional) on log-log axes.
+"""
+
+configurations = {
+    'mrv/lcv/mac-ne': lambda: {'select_unassigned_variable': mrv, 'order_domain_values': lcv, 'inference': maintain_arc_consistency_ne, 'engine': 'iterative'},
+    'imrv/lcv/fc': lambda: {'select_unassigned_variable': IncrementalMRV(), 'order_domain_values': lcv, 'inference': forward_checking, 'engine': 'iterative'},
+    'backjumping': lambda: {'select_unassigned_variable': mrv, 'order_domain_values': lcv, 'inference': maintain_arc_consistency, 'engine': 'backjumping'},
+    'tabu': lambda: {'local': 'tabu'}
+}
+if numpy is not None:
+    configurations['numpy'] = lambda: {'domain_backend': 'numpy', 'select_unassigned_variable': mrv_numpy, 'order_domain_values': lcv_numpy,
+                                       'inference': maintain_arc_consistency_numpy, 'engine': 'iterative'}
+    configurations['numpy-fc'] = lambda: {'domain_backend': 'numpy', 'select_unassigned_variable': mrv_numpy, 'order_domain_values': lcv_numpy,
+                                          'inference': forward_checking_numpy, 'engine': 'iterative'}
+
+default_sizes = [1000, 10000, 100000]
+
+fields = ['model', 'vertices', 'edges', 'configuration', 'generate_time', 'file_size', 'parse_time', 'build_time', 'peak_memory',
+          'solve_time', 'status', 'nodes']
+
+metrics = ['parse_time', 'build_time', 'peak_memory', 'solve_time']
+
+def timed(function, *args, **kwargs):
+    """
+    Function that returns the result of function(*args, **kwargs) and the seconds it took, with garbage collection
+    turned off (as in timeit, since when it runs is mostly chance).
+    """
+    collecting = gc.isenabled()
+    gc.disable()
+    start = perf_counter()
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        elapsed = perf_counter() - start
+        if collecting:
+            gc.enable()
+    return result, elapsed
+
+def measure_memory(path, domain_backend):
+    """
+    Function that returns the peak memory in bytes allocated by parsing path and building its problem.
+    """
+    tracemalloc.start()
+    try:
+        GraphColoringCSP.from_csr(parse_csr(path), domain_backend=domain_backend)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_scaling(model_names=None, sizes=None, configuration_names=None, colors=3, degree=None, seed=0, directory=None, time_limit=10,
+                memory=True, verbose=False):
+    """
+    Function that generates a graph of each model (all of them by default) for each number of vertices in sizes, in
+    directory (files already there are reused; None means a temporary directory, removed afterwards), solves it with
+    each named configuration (all of them by default), and returns one result dictionary per graph and configuration,
+    as described above.
+    """
+    sizes = default_sizes if sizes is None else sizes
+    temporary = directory is None
+    directory = tempfile.mkdtemp(prefix='scaling-') if temporary else directory
+    results = []
+    try:
+        for model in model_names or models:
+            for vertices in sizes:
+                path = os.path.join(directory, instance_name(model, vertices, colors, degree, seed))
+                generate_time = None
+                if not os.path.exists(path):
+                    start = perf_counter()
+                    write_instance(path, generate(model, vertices, colors, degree, seed), f"{model} graph with {vertices} vertices, seed {seed}, generated by scaling.py")
+                    generate_time = perf_counter() - start
+                graph, parse_time = timed(parse_csr, path)
+                edges = graph.edge_count()
+                peaks = {}
+                for name in configuration_names or configurations:
+                    options = configurations[name]()
+                    domain_backend = options.pop('domain_backend', 'list')
+                    csp, build_time = timed(GraphColoringCSP.from_csr, graph, domain_backend=domain_backend)
+                    (status, solution), solve_time = timed(solve_csp, csp, verbose=False, return_status=True, time_limit=time_limit, **options)
+                    if solution is not None and not csp.valid_solution(solution):
+                        raise RuntimeError(f"Configuration {name} returned an invalid solution for {path}")
+                    if status == 'unsat' and 'local' in options:
+                        status = 'not found'
+                    if memory and domain_backend not in peaks:
+                        peaks[domain_backend] = measure_memory(path, domain_backend)
+                    result = {'model': model, 'vertices': len(graph), 'edges': edges, 'configuration': name, 'generate_time': generate_time,
+                              'file_size': os.path.getsize(path), 'parse_time': parse_time, 'build_time': build_time, 'peak_memory': peaks.get(domain_backend),
+                              'solve_time': solve_time, 'status': status, 'nodes': csp.assignment_counts}
+                    results.append(result)
+                    if verbose:
+                        print(f"{model} n={vertices} m={edges} {name}: parse {parse_time:.3f}s, build {build_time:.3f}s, "
+                              f"solve {solve_time:.3f}s ({status}, {result['nodes']} nodes)")
+    finally:
+        if temporary:
+            shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+def breakpoints(results, limit=1.5, min_time=0.01):
+    """
+    Function that returns, for each model, configuration and metric, the number of edges at which the metric first
+    grows as edges^limit or faster (ignoring times under min_time seconds, which are mostly noise), or at which the
+    search first runs out of time, as a list of dictionaries with the model, configuration, metric, edges (None if it
+    scales up to the largest graph) and growth (the exponent between the two sizes, or the status of the search).
+    """
+    series = {}
+    for result in results:
+        series.setdefault((result['model'], result['configuration']), []).append(result)
+    found = []
+    for (model, configuration), rows in series.items():
+        rows = sorted(rows, key=lambda row: row['edges'])
+        for metric in metrics:
+            point = {'model': model, 'configuration': configuration, 'metric': metric, 'edges': None, 'growth': None}
+            for previous, row in zip([None] + rows, rows):
+                if metric == 'solve_time' and row['status'] in ('timeout', 'not found'):
+                    point.update(edges=row['edges'], growth=row['status'])
+                    break
+                if previous is None or row[metric] is None or previous[metric] is None or row['edges'] <= previous['edges']:
+                    continue
+                if metric != 'peak_memory' and max(row[metric], previous[metric]) < min_time:
+                    continue
+                growth = log(max(row[metric], 1e-9) / max(previous[metric], 1e-9)) / log(row['edges'] / previous['edges'])
+                if growth >= limit:
+                    point.update(edges=row['edges'], growth=round(growth, 2))
+                    break
+            found.append(point)
+    return found
+
+def report(results, limit=1.5, min_time=0.01, output=sys.stdout):
+    """
+    Function that prints one table per model with the measurements of each graph (parse, build and memory for the
+    first configuration, and the solve time and status of every configuration), then the parts that stop scaling.
+    """
+    names = list(dict.fromkeys(result['configuration'] for result in results))
+    for model in dict.fromkeys(result['model'] for result in results):
+        rows = [result for result in results if result['model'] == model]
+        print(f"\n{model}", file=output)
+        print(f"{'vertices':>10} {'edges':>10} {'parse':>9} {'build':>9} {'memory MB':>10} " + ' '.join(f"{name:>20}" for name in names), file=output)
+        for edges in sorted(dict.fromkeys(row['edges'] for row in rows)):
+            size = [row for row in rows if row['edges'] == edges]
+            solves = {row['configuration']: f"{row['solve_time']:.3f}s {row['status']}" for row in size}
+            memory = '-' if size[0]['peak_memory'] is None else f"{size[0]['peak_memory'] / 2 ** 20:.1f}"
+            print(f"{size[0]['vertices']:>10} {edges:>10} {size[0]['parse_time']:>8.3f}s {size[0]['build_time']:>8.3f}s {memory:>10} "
+                  + ' '.join(f"{solves.get(name, '-'):>20}" for name in names), file=output)
+    print(file=output)
+    # Parsing does not depend on the configuration, so it is only reported for the first one
+    points = [point for point in breakpoints(results, limit, min_time) if point['metric'] != 'parse_time' or point['configuration'] == names[0]]
+    for point in points:
+        name = point['model'] if point['metric'] == 'parse_time' else f"{point['model']} {point['configuration']}"
+        if point['edges'] is None:
+            continue
+        if isinstance(point['growth'], str):
+            print(f"{name} {point['metric']}: stops scaling at {point['edges']} edges ({point['growth']})", file=output)
+        else:
+            print(f"{name} {point['metric']}: stops scaling at {point['edges']} edges (grows as edges^{point['growth']})", file=output)
+    scaling = sum(1 for point in points if point['edges'] is None)
+    print(f"{scaling} of {len(points)} parts (parse, build, memory and solve of each model and configuration) scale up to the largest graph", file=output)
+
+def plot(results, path):
+    """
+    Function that draws each metric against the number of edges on log-log axes, one line per model (and
+    configuration, for the metrics that depend on it), and saves the figure to path. Needs matplotlib.
+    """
+    import matplotlib # Optional: only plotting needs it
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as pyplot
+
+    figure, axes = pyplot.subplots(2, 2, figsize=(12, 9))
+    for axis, metric in zip(axes.flat, metrics):
+        series = {}
+        for result in results:
+            if result[metric] is None:
+                continue
+            # Parsing does not depend on the configuration, and building and memory only on its domain backend
+            label = result['model'] if metric == 'parse_time' else f"{result['model']} {result['configuration']}"
+            series.setdefault(label, {})[result['edges']] = result[metric]
+        for label, points in series.items():
+            edges = sorted(points)
+            axis.plot(edges, [points[count] for count in edges], marker='o', label=label)
+        axis.set_xscale('log')
+        axis.set_yscale('log')
+        axis.set_xlabel('edges')
+        axis.set_ylabel('bytes' if metric == 'peak_memory' else 'seconds')
+        axis.set_title(metric)
+        axis.legend(fontsize='x-small')
+    figure.tight_layout()
+    figure.savefig(path)
+    pyplot.close(figure)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scaling harness measuring parse, build, memory and solve time of generated graphs of growing size.")
+    parser.add_argument('--models',
+                    choices=models,
+                    nargs='+',
+                    help="Random graph models (all by default)")
+    parser.add_argument('--sizes',
+                    type=int,
+                    nargs='+',
+                    help=f"Numbers of vertices ({' '.join(map(str, default_sizes))} by default)",
+                    default=default_sizes)
+    parser.add_argument('--configurations',
+                    choices=list(configurations),
+                    nargs='+',
+                    help="Solver configurations (all by default)")
+    parser.add_argument('-k', '--colors',
+                    type=int,
+                    help="Number of colors",
+                    default=3)
+    parser.add_argument('-d', '--degree',
+                    type=float,
+                    help="Average degree of the graphs (see generator.py for the defaults)",
+                    default=None)
+    parser.add_argument('--seed',
+                    type=int,
+                    help="Seed of the random generator",
+                    default=0)
+    parser.add_argument('--directory',
+                    help="Directory the generated files are written to and kept in (a temporary directory that is removed afterwards by default)",
+                    default=None)
+    parser.add_argument('--time-limit',
+                    type=float,
+                    help="Number of seconds each configuration gets to solve each graph",
+                    default=10)
+    parser.add_argument('--no-memory',
+                    action='store_true',
+                    help="Skip the extra run that measures peak memory")
+    parser.add_argument('--limit',
+                    type=float,
+                    help="Growth exponent (over the number of edges) from which a part is reported as no longer scaling",
+                    default=1.5)
+    parser.add_argument('--output',
+                    help="File to write the results to (.json for JSON, CSV otherwise)",
+                    default=None)
+    parser.add_argument('--plot',
+                    help="Image file to draw the curves to (needs matplotlib)",
+                    default=None)
+
+    args = parser.parse_args()
+    if args.plot is not None:
+        try:
+            import matplotlib
+        except ImportError:
+            parser.error("--plot needs matplotlib (pip install matplotlib)")
+
+    results = run_scaling(args.models, args.sizes, args.configurations, args.colors, args.degree, args.seed, args.directory, args.time_limit,
+                          not args.no_memory, verbose=True)
+    report(results, args.limit)
+    if args.output:
+        write_results(results, args.output, fields)
+    if args.plot:
+        plot(results, args.plot)
@@ -1,11 +1,33 @@
+import io
+import json
 import os
+from random import Random
+import shutil
+import sys
+import tempfile
+import threading
 import unittest
 
+from backjumping import ConflictDirectedBackjumping
 from backtracking import backtracking_search
+from batch import find_instances, run_batch
+from benchmark import compare, load_instances, random_graph, read_results, run_benchmark, write_results
+from checkpoint import BoundedSearch, bounded_search
+from graphcache import GraphCache
 from graphcoloring import GraphColoringCSP
-from fileparser import FileParser
-from heuristics import lcv, mrv, static_ordering, unordered_domain_values
-from inference import ac3, forward_checking, maintain_arc_consistency, revise
+from fileparser import FileParser, parse_csr
+from generator import generate, geometric_graph, gnp_graph, models, planar_graph, planted_clique_graph, threshold_degree, threshold_graph, write_instance
+from heuristics import IncrementalMRV, RandomizedLCV, RandomizedMRV, break_color_symmetry, lcv, mrv, static_ordering, unordered_domain_values
+from incremental import IncrementalColoring
+from instrumentation import Instrumentation
+from inference import ac3, forward_checking, maintain_arc_consistency, maintain_arc_consistency_ne, revise
+from localsearch import LocalSearch, dsatur, local_search
+from optimize import chromatic_number
+from parallel import parallel_component_search, parallel_tree_search, portfolio_search
+from preprocessing import connected_components, greedy_clique, kernelize, preprocessed_search
+from restarts import RestartSearch, luby
+from scaling import breakpoints, report, run_scaling
+from vectorized import forward_checking_numpy, lcv_numpy, maintain_arc_consistency_numpy, mrv_numpy, numpy
 
 class TestFileParser(unittest.TestCase):
 
@@ -31,6 +53,64 @@ class TestFileParser(unittest.TestCase):
         for edge in edges:
             self.assertIn(edge, expected_edges, f"Unexpected edge: {edge}")
 
+    def test_parse_csr(self):
+        """
+        Unit test for the bulk parser. It should give the same colors and neighbors as `FileParser` for every file, whether
+        it reads the file in chunks (including chunks that end in the middle of a line) or through mmap, and duplicate edges
+        should only be kept once.
+        """
+        folder = os.path.join("assets", "input_files")
+        for file in os.listdir(folder):
+            filepath = os.path.join(folder, file)
+            parsed_payload = FileParser(filepath).parsed_payload
+            for kwargs in ({}, {'chunk_size': 16}, {'use_mmap': True}):
+                graph = parse_csr(filepath, **kwargs)
+                self.assertEqual(graph.colors, parsed_payload["colors"])
+                self.assertEqual(graph.adjacency(), dict(parsed_payload["neighbors"]), f"Unexpected neighbors for file {file}")
+                self.assertEqual(sorted(graph.edges()), sorted(set(parsed_payload["edges"])))
+                self.assertEqual(graph.offsets[-1], len(graph.indices))
+        graph = parse_csr(os.path.join(folder, "gc_78317097930401.txt"))
+        self.assertEqual(graph.edge_count(), 130) # The file has 131 edge lines, one of them repeated
+        csp = GraphColoringCSP.from_file(graph)
+        self.assertEqual(len(csp.variables), 60)
+
+    def test_graph_cache(self):
+        """
+        Unit test for the on-disk cache of parsed graphs. The second load of a file should come from the cache (copied or
+        mapped) and give the same graph, changing the file should replace its entry, and the cache should evict the least
+        recently used entries when it is over its size limit.
+        """
+        folder = os.path.join("assets", "input_files")
+        with tempfile.TemporaryDirectory() as directory:
+            cache = GraphCache(os.path.join(directory, "cache"))
+            filepath = os.path.join(folder, "gc_78317097930401.txt")
+            expected = parse_csr(filepath).adjacency()
+            self.assertEqual(cache.get(filepath).adjacency(), expected)
+            for use_mmap in (False, True):
+                graph = cache.get(filepath, use_mmap=use_mmap)
+                self.assertEqual(graph.adjacency(), expected)
+            self.assertEqual((cache.hits, cache.misses), (2, 1))
+            # The search runs on the memoryviews of a mapped entry
+            for _ in range(2):
+                csp = GraphColoringCSP.from_file(os.path.join(folder, "gc_78317097930400.txt"), use_mmap=True, cache=cache)
+                self.assertIsNotNone(backtracking_search(csp, verbose=False, verify=True))
+            # A changed file gets a new entry, which replaces the old one
+            copy = os.path.join(directory, "graph.txt")
+            shutil.copy(filepath, copy)
+            cache.get(copy)
+            with open(copy, "a") as file:
+                file.write("\n0,59\n")
+            os.utime(copy, ns=(0, 0))
+            self.assertIn(59, cache.get(copy).adjacency()[0])
+            self.assertEqual(cache.misses, 4)
+            self.assertEqual(len(cache.entries()), 3)
+            # Only the most recently stored entry fits
+            cache.max_bytes = cache.entries()[-1][1]
+            cache.get(os.path.join(folder, "australia.txt"))
+            self.assertEqual(len(cache.entries()), 1)
+            cache.clear()
+            self.assertEqual(cache.size(), 0)
+
 class TestGraphColoringCSP(unittest.TestCase):
     """
     Test cases for the GraphColoringCSP class.
@@ -46,6 +126,107 @@ class TestGraphColoringCSP(unittest.TestCase):
         conflicts = csp.count_conflicts(2, 0, assignment)
         self.assertEqual(conflicts, 1, f"Expected 1 conflict, got {conflicts}")
 
+    def test_graph_views(self):
+        """
+        Unit test for the views over the compact graph. neighbors, constraints and degree should agree with the adjacency
+        from `FileParser`, for contiguous labels starting at 0, contiguous labels starting at 1, and labels with gaps.
+        """
+        folder = os.path.join("assets", "input_files")
+        problems = [(GraphColoringCSP.from_file(os.path.join(folder, file)), FileParser(os.path.join(folder, file)).parsed_payload["neighbors"])
+                    for file in ("australia.txt", "gc_1378296846561000.txt")]
+        edges = [(10, 1000), (1000, 5), (5, 10), (7, 5)]
+        problems.append((GraphColoringCSP(edges, 3), {10: {5, 1000}, 1000: {5, 10}, 5: {7, 10, 1000}, 7: {5}}))
+        for csp, neighbors in problems:
+            self.assertEqual(csp.variables, set(neighbors))
+            for vertex, adjacent in neighbors.items():
+                self.assertEqual(set(csp.neighbors[vertex]), adjacent)
+                self.assertEqual(csp.degree(vertex), len(adjacent))
+                self.assertEqual({constraint.vertex2 for constraint in csp.constraints[vertex]}, adjacent)
+            self.assertEqual(len(csp.edges), sum(len(adjacent) for adjacent in neighbors.values()) // 2)
+            self.assertRaises(KeyError, csp.neighbors.__getitem__, max(neighbors) + 1)
+        csp = problems[-1][0]
+        self.assertTrue(csp.is_consistent(5, {5: 0, 10: 1, 7: 1}))
+        self.assertFalse(csp.is_consistent(5, {5: 0, 10: 1, 7: 0}))
+        self.assertEqual(csp.count_conflicts(1000, 1, {5: 0, 10: 1, 7: 1}), 1)
+
+    def test_color_counts(self):
+        """
+        Unit test for the neighbor color-count tables. Counting conflicts from the tables should give the same
+        result as counting them from the assignment, and unassigning should update the tables.
+        """
+        csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "australia.txt"))
+        assignment = {}
+        csp.assign(0, 0, assignment) # WA=red
+        csp.assign(1, 1, assignment) # NT=green
+        self.assertTrue(csp.tracks(assignment))
+        self.assertEqual(csp.color_counts[2], [1, 1, 0])
+        for value in range(csp.colors):
+            self.assertEqual(csp.count_conflicts(2, value, assignment), csp.count_conflicts(2, value, dict(assignment)))
+        csp.unassign(1, assignment)
+        self.assertEqual(csp.color_counts[2], [1, 0, 0])
+        self.assertEqual(csp.count_conflicts(2, 1, assignment), 0)
+
+
+class TestDomains(unittest.TestCase):
+    """
+    Test cases for the domain stores.
+    """
+    def test_bitset_domains(self):
+        """
+        Unit test for the bitset domain store: it should hold the same values as the list store,
+        and undoing back to a mark should restore the domains in their original order.
+        """
+        list_csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "australia.txt"))
+        bitset_csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "australia.txt"), domain_backend="bitset")
+        for csp in (list_csp, bitset_csp):
+            mark = csp.mark()
+            csp.add_assignment(0, 0)
+            csp.add_inferences({1: [0], 2: [0]})
+            self.assertEqual(csp.domains.size(1), 2)
+            self.assertFalse(csp.domains.contains(2, 0))
+            self.assertEqual(csp.domains, {0: [0], 1: [1, 2], 2: [1, 2], 3: [0, 1, 2], 4: [0, 1, 2], 5: [0, 1, 2], 6: [0, 1, 2]})
+            csp.undo(mark)
+            self.assertEqual(csp.domains, {vertex: [0, 1, 2] for vertex in range(7)})
+        self.assertEqual(list_csp.domains, bitset_csp.domains)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_numpy_domains(self):
+        """
+        Unit test for the numpy domain store: it should hold the same values as the list store, including
+        after changes made to many domains at once, and undoing back to a mark should restore them.
+        """
+        list_csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "australia.txt"))
+        numpy_csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "australia.txt"), domain_backend="numpy")
+        mark = numpy_csp.mark()
+        numpy_csp.add_assignment(0, 0)
+        numpy_csp.add_inferences({1: [0], 2: [0]})
+        self.assertEqual(numpy_csp.domains.size(1), 2)
+        self.assertFalse(numpy_csp.domains.contains(2, 0))
+        self.assertEqual(numpy_csp.domains, {0: [0], 1: [1, 2], 2: [1, 2], 3: [0, 1, 2], 4: [0, 1, 2], 5: [0, 1, 2], 6: [0, 1, 2]})
+        changed, masks = numpy_csp.domains.remove_values(numpy.array([1, 3, 4]), numpy.array([1, 4, 4], dtype=numpy.uint64))
+        self.assertEqual((changed.tolist(), masks.tolist()), ([3, 4], [3, 3]))
+        self.assertEqual(numpy_csp.domains, {0: [0], 1: [1, 2], 2: [1, 2], 3: [0, 1], 4: [0, 1], 5: [0, 1, 2], 6: [0, 1, 2]})
+        numpy_csp.undo(mark)
+        self.assertEqual(numpy_csp.domains, list_csp.domains)
+        with self.assertRaises(ValueError):
+            GraphColoringCSP.from_csr(random_graph(5, 0.5, 65), domain_backend="numpy")
+
+
+    def test_is_complete(self):
+        """
+        Unit test for the goal test used by the search: an assignment is complete once every variable is assigned.
+        """
+        csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "australia.txt"))
+        assignment = {}
+        solution = {0: 0, 1: 1, 2: 2, 3: 0, 4: 1, 5: 0, 6: 1}
+        for variable, value in solution.items():
+            self.assertFalse(csp.is_complete(assignment))
+            csp.assign(variable, value, assignment)
+        self.assertTrue(csp.is_complete(assignment))
+        self.assertTrue(csp.valid_solution(assignment))
+        csp.unassign(6, assignment)
+        self.assertFalse(csp.is_complete(assignment))
+
 
 class TestHeuristics(unittest.TestCase):
     def test_lcv(self):
@@ -78,6 +259,62 @@ class TestHeuristics(unittest.TestCase):
         variable = mrv(csp, assignment)
         self.assertEqual(variable, 2, f"MRV heuristic failed: expected 2, got {variable}")
 
+    def test_incremental_mrv(self):
+        """
+        Unit test for the incremental mrv heuristic. It should pick the same variable as mrv
+        as assignments and inferences are added and undone.
+        """
+        csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "australia.txt"), domain_backend="bitset")
+        select = IncrementalMRV()
+        assignment = {}
+        self.assertEqual(select(csp, assignment), mrv(csp, assignment))
+        mark = csp.mark()
+        for variable, value in ((2, 0), (1, 1)):
+            csp.assign(variable, value, assignment)
+            csp.add_assignment(variable, value)
+            csp.add_inferences(forward_checking(csp, variable, assignment))
+            self.assertEqual(select(csp, assignment), mrv(csp, assignment))
+        csp.undo(mark)
+        csp.unassign(1, assignment)
+        csp.unassign(2, assignment)
+        self.assertEqual(select(csp, assignment), mrv(csp, assignment))
+
+
+    def test_randomized_heuristics(self):
+        """
+        Unit test for the randomized mrv and lcv heuristics. The variable picked should be one of those tied under mrv,
+        the values should be sorted by conflicts, and the same seed should give the same choices.
+        """
+        csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "australia.txt"))
+        assignment = {}
+        csp.assign(2, 0, assignment)
+        csp.add_assignment(2, 0)
+        csp.add_inferences(forward_checking(csp, 2, assignment))
+        picks = {RandomizedMRV(seed)(csp, assignment) for seed in range(20)}
+        self.assertTrue(picks <= {1, 3, 4, 5}) # Neighbors of SA are left with 2 values
+        self.assertEqual(RandomizedMRV(7)(csp, assignment), RandomizedMRV(7)(csp, assignment))
+        for seed in range(5):
+            values = RandomizedLCV(seed)(csp, 6, assignment)
+            self.assertEqual(sorted(values), [0, 1, 2])
+            self.assertEqual(values, RandomizedLCV(seed)(csp, 6, assignment))
+        weighted = RandomizedMRV(0, weighted=True)
+        weighted.record_failure(csp, 6, assignment)
+        self.assertEqual(weighted.failures, {6: 1})
+
+    def test_break_color_symmetry(self):
+        """
+        Unit test for color symmetry breaking. With WA=red and NT=green assigned, SA may be red, green or blue (the first unused color),
+        but with only WA=red assigned, Q may only be red or green.
+        """
+        csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "australia.txt"))
+        order_domain_values = break_color_symmetry(unordered_domain_values)
+        assignment = {}
+        self.assertEqual(order_domain_values(csp, 0, assignment), [0])
+        csp.assign(0, 0, assignment)
+        self.assertEqual(order_domain_values(csp, 3, assignment), [0, 1])
+        csp.assign(1, 1, assignment)
+        self.assertEqual(order_domain_values(csp, 2, assignment), [0, 1, 2])
+
 
 class TestInference(unittest.TestCase):
     """Test cases for inference methods: forward checking, maintaining arc consistency with ac3"""
@@ -125,6 +362,37 @@ class TestInference(unittest.TestCase):
         # The forward checking function should return 'failure'
         self.assertEqual(inferences, "failure")
 
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_vectorized_inference(self):
+        """
+        Unit test for the inference functions of the numpy backend: after every assignment of random searches, they
+        should fail when forward checking and mac fail, and otherwise leave the same domains.
+        """
+        for seed in range(20):
+            random = Random(seed)
+            graph = random_graph(random.randint(5, 30), random.uniform(0.1, 0.5), random.randint(2, 5), seed)
+            for inference, vectorized_inference in ((forward_checking, forward_checking_numpy), (maintain_arc_consistency, maintain_arc_consistency_numpy)):
+                csps = [GraphColoringCSP.from_csr(graph), GraphColoringCSP.from_csr(graph, domain_backend="numpy")]
+                assignments = [{}, {}]
+                for variable in random.sample(sorted(csps[0].variables), len(csps[0].variables)):
+                    value = random.choice(csps[0].domains[variable])
+                    if csps[0].count_conflicts(variable, value, assignments[0]) != 0:
+                        continue
+                    results = []
+                    for csp, assignment, method in zip(csps, assignments, (inference, vectorized_inference)):
+                        mark = csp.mark()
+                        csp.assign(variable, value, assignment)
+                        csp.add_assignment(variable, value)
+                        inferences = method(csp, variable, assignment)
+                        results.append(inferences == 'failure')
+                        if inferences == 'failure':
+                            csp.undo(mark)
+                            csp.unassign(variable, assignment)
+                        else:
+                            csp.add_inferences(inferences)
+                    self.assertEqual(results[0], results[1], f"Different result for {inference.__name__} on graph {seed}")
+                    self.assertEqual(csps[0].domains, csps[1].domains, f"Different domains for {inference.__name__} on graph {seed}")
+
     def test_revise(self):
         """
         Unit test for the revise function. We want to ensure that this function doesn't revise if no conflicts
@@ -178,6 +446,83 @@ class TestInference(unittest.TestCase):
         expected_domains = {0: [0], 1: [1, 2], 2: [1, 2], 3: [0, 1, 2], 4: [0, 1, 2], 5: [0, 1, 2], 6: [0, 1, 2]}
         self.assertEqual(csp.domains, expected_domains)
 
+    def test_maintain_arc_consistency_ne(self):
+        """
+        Unit test for the not-equal arc consistency propagator. It should prune the same values as maintain arc consistency.
+        With WA=red and NT=green, SA can only be blue, which leaves Q only red, then NSW only green, then V only red,
+        and T (a neighbor of V in the input file) green or blue.
+        """
+        for domain_backend in ("list", "bitset"):
+            results = []
+            for inference in (maintain_arc_consistency, maintain_arc_consistency_ne):
+                csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "australia.txt"), domain_backend=domain_backend)
+                assignment = {}
+                for variable, value in ((0, 0), (1, 1)):
+                    csp.assign(variable, value, assignment)
+                    csp.add_assignment(variable, value)
+                    inferences = inference(csp, variable, assignment)
+                    self.assertNotEqual(inferences, "failure")
+                    csp.add_inferences(inferences)
+                results.append(dict(csp.domains))
+            expected_domains = {0: [0], 1: [1], 2: [2], 3: [0], 4: [1], 5: [0], 6: [1, 2]}
+            self.assertEqual(results[0], expected_domains)
+            self.assertEqual(results[1], expected_domains)
+
+
+
+class TestPreprocessing(unittest.TestCase):
+    """
+    Test cases for the preprocessing stage: kernelization, connected components and the clique check.
+    """
+    def test_kernelize(self):
+        """
+        Unit test for kernelization. In the Australia problem with 3 colors, T and WA have fewer than 3 neighbors,
+        and removing them leaves NT, V and then every other territory with fewer than 3, so the kernel is empty.
+        With 2 colors only T is removed at first, and then no other territory has fewer than 2 neighbors.
+        """
+        csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "australia.txt"))
+        kernel, removed = kernelize(csp.neighbors, 3)
+        self.assertEqual(kernel, set())
+        self.assertEqual(set(removed), csp.variables)
+        kernel, removed = kernelize(csp.neighbors, 2)
+        self.assertEqual(removed, [6])
+        self.assertEqual(kernel, {0, 1, 2, 3, 4, 5})
+
+    def test_connected_components(self):
+        """
+        Unit test for splitting a graph into its connected components.
+        """
+        edges = [(0, 1), (1, 2), (3, 4)]
+        csp = GraphColoringCSP(edges, 2)
+        components = connected_components(csp.variables, csp.neighbors)
+        self.assertEqual(sorted(map(sorted, components)), [[0, 1, 2], [3, 4]])
+
+    def test_greedy_clique(self):
+        """
+        Unit test for the clique heuristic. gc_78317097930401.txt has a clique of 5 vertices, so it cannot be colored with 4 colors.
+        """
+        csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "gc_78317097930401.txt"))
+        clique = greedy_clique(csp.variables, csp.neighbors)
+        self.assertEqual(len(clique), 5)
+        for vertex in clique:
+            self.assertTrue(all(other in csp.neighbors[vertex] for other in clique if other != vertex))
+
+    def test_preprocessed_search(self):
+        """
+        Unit test for backtracking search after preprocessing.
+        """
+        folder = os.path.join("assets", "input_files")
+        files = [file for file in os.listdir(folder) if not 'gc_1377121623225900' in file]
+        no_solution = "gc_78317097930401.txt"
+        for file in files:
+            filepath = os.path.join(folder, file)
+            csp = GraphColoringCSP.from_file(filepath)
+            solution = preprocessed_search(csp, verbose=False, inference=forward_checking)
+            if file == no_solution:
+                self.assertIsNone(solution, f"Search returned solution for file {file}, although no solution exists")
+            else:
+                self.assertIsNotNone(solution, f"Search returned no solution for file {file}, although a solution exists")
+                self.assertTrue(csp.valid_solution(solution))
 
     
 class TestBacktracking(unittest.TestCase):
@@ -228,12 +573,574 @@ class TestBacktracking(unittest.TestCase):
         for file in files:
             filepath = os.path.join(folder, file)
             csp = GraphColoringCSP.from_file(filepath)
-            solution = backtracking_search(csp, verbose=False, inference=maintain_arc_consistency)
+            solution = backtracking_search(csp, verbose=False, inference=maintain_arc_consistency, verify=True)
             if file == no_solution:
                 self.assertIsNone(solution, f"Search returned solution for file {file}, although no solution exists")
             else:
                 self.assertIsNotNone(solution, f"Search returned no solution for file {file}, although a solution exists")
                 self.assertTrue(csp.valid_solution(solution))
 
+    def test_backtracking_search_mac_ne(self):
+        """
+        Unit test for backtracking search with the not-equal arc consistency propagator. It prunes the same values
+        as maintaining arc consistency with ac3, so the search should find the same solutions with the same number of assignments.
+        """
+        folder = os.path.join("assets", "input_files")
+        files = [file for file in os.listdir(folder) if not 'gc_1377121623225900' in file]
+        for file in files:
+            filepath = os.path.join(folder, file)
+            for domain_backend in ("list", "bitset"):
+                mac_csp = GraphColoringCSP.from_file(filepath, domain_backend=domain_backend)
+                ne_csp = GraphColoringCSP.from_file(filepath, domain_backend=domain_backend)
+                expected = backtracking_search(mac_csp, verbose=False, inference=maintain_arc_consistency)
+                solution = backtracking_search(ne_csp, verbose=False, inference=maintain_arc_consistency_ne)
+                self.assertEqual(solution, expected, f"Not-equal propagator gave a different result for file {file}")
+                self.assertEqual(ne_csp.assignment_counts, mac_csp.assignment_counts)
+
+    def test_backjumping_search(self):
+        """
+        Unit test for conflict-directed backjumping with each inference method it supports.
+        """
+        folder = os.path.join("assets", "input_files")
+        files = [file for file in os.listdir(folder) if not 'gc_1377121623225900' in file]
+        no_solution = "gc_78317097930401.txt"
+        for file in files:
+            filepath = os.path.join(folder, file)
+            for inference in (None, forward_checking, maintain_arc_consistency):
+                csp = GraphColoringCSP.from_file(filepath)
+                solution = backtracking_search(csp, verbose=False, inference=inference, engine='backjumping', verify=True)
+                if file == no_solution:
+                    self.assertIsNone(solution, f"Backjumping returned solution for file {file}, although no solution exists")
+                else:
+                    self.assertIsNotNone(solution, f"Backjumping returned no solution for file {file}, although a solution exists")
+
+    def test_backjumping_skips_unrelated_variables(self):
+        """
+        Unit test for conflict-directed backjumping on a path of 8 vertices followed by a K4 that cannot be colored
+        with 3 colors. With static ordering the path is colored first, but none of its vertices are in the K4's conflict
+        sets, so the search should jump over them and prove there is no solution without trying other colorings of the path.
+        """
+        edges = [(vertex, vertex + 1) for vertex in range(7)]
+        edges += [(vertex1, vertex2) for vertex1 in range(8, 12) for vertex2 in range(vertex1 + 1, 12)]
+        for inference in (None, forward_checking, maintain_arc_consistency):
+            chronological_csp = GraphColoringCSP(edges, 3)
+            self.assertIsNone(backtracking_search(chronological_csp, verbose=False, select_unassigned_variable=static_ordering,
+                order_domain_values=unordered_domain_values, inference=inference))
+            csp = GraphColoringCSP(edges, 3)
+            search = ConflictDirectedBackjumping(csp, static_ordering, unordered_domain_values, inference)
+            self.assertIsNone(search.search())
+            self.assertGreater(search.backjumps, 0)
+            self.assertLess(csp.assignment_counts * 10, chronological_csp.assignment_counts)
+
+    def test_backjumping_nogood_store_is_bounded(self):
+        """
+        Unit test for the nogood store: it should never hold more than max_nogoods nogoods.
+        """
+        csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "gc_78317097930401.txt"))
+        search = ConflictDirectedBackjumping(csp, mrv, lcv, None, max_nogoods=5)
+        self.assertIsNone(search.search())
+        self.assertLessEqual(len(search.nogoods), 5)
+        self.assertEqual(search.nogoods_learned - search.nogoods_evicted, len(search.nogoods))
+
+    def test_backtracking_search_symmetry_breaking(self):
+        """
+        Unit test for backtracking search with color symmetry breaking, for each inference method and engine.
+        The search should find the same answer as without symmetry breaking, and never make more assignments.
+        """
+        folder = os.path.join("assets", "input_files")
+        files = [file for file in os.listdir(folder) if not 'gc_1377121623225900' in file]
+        no_solution = "gc_78317097930401.txt"
+        for file in files:
+            filepath = os.path.join(folder, file)
+            for inference in (None, forward_checking, maintain_arc_consistency):
+                for engine in ('recursive', 'backjumping'):
+                    csp = GraphColoringCSP.from_file(filepath)
+                    symmetry_csp = GraphColoringCSP.from_file(filepath)
+                    backtracking_search(csp, verbose=False, inference=inference, engine=engine)
+                    solution = backtracking_search(symmetry_csp, verbose=False, inference=inference, engine=engine, symmetry_breaking=True, verify=True)
+                    if file == no_solution:
+                        self.assertIsNone(solution, f"Search returned solution for file {file}, although no solution exists")
+                    else:
+                        self.assertIsNotNone(solution, f"Search returned no solution for file {file}, although a solution exists")
+                    self.assertLessEqual(symmetry_csp.assignment_counts, csp.assignment_counts)
+
+    def test_parallel_component_search(self):
+        """
+        Unit test for solving connected components concurrently. A graph made of several paths and cycles should
+        get one merged solution, and adding a K4 (which cannot be colored with 3 colors) should give no solution.
+        """
+        edges = [(vertex, vertex + 1) for vertex in range(0, 9)]
+        edges += [(vertex, vertex + 1) for vertex in range(10, 19)] + [(10, 19)]
+        edges += [(vertex, vertex + 1) for vertex in range(20, 24)] + [(20, 24)]
+        for preprocess_graph in (False, True):
+            csp = GraphColoringCSP(edges, 3)
+            solution = parallel_component_search(csp, processes=2, preprocess_graph=preprocess_graph, verbose=False, inference=forward_checking)
+            self.assertTrue(csp.valid_solution(solution))
+        edges += [(vertex1, vertex2) for vertex1 in range(30, 34) for vertex2 in range(vertex1 + 1, 34)]
+        csp = GraphColoringCSP(edges, 3)
+        self.assertIsNone(parallel_component_search(csp, processes=2, verbose=False, inference=forward_checking))
+
+    def test_parallel_tree_search(self):
+        """
+        Unit test for splitting the search tree over several processes. A small budget makes the workers split their
+        subtrees again, and the search should still find a solution exactly when the sequential search does.
+        """
+        folder = os.path.join("assets", "input_files")
+        files = [file for file in os.listdir(folder) if not 'gc_1377121623225900' in file]
+        for file in files:
+            filepath = os.path.join(folder, file)
+            for kwargs in ({'inference': maintain_arc_consistency}, {'inference': forward_checking, 'symmetry_breaking': True}):
+                expected = backtracking_search(GraphColoringCSP.from_file(filepath), verbose=False, **kwargs)
+                for processes in (1, 2):
+                    csp = GraphColoringCSP.from_file(filepath)
+                    solution = parallel_tree_search(csp, processes=processes, budget=5, verbose=False, verify=True, **kwargs)
+                    if expected is None:
+                        self.assertIsNone(solution, f"Parallel tree search found a solution for file {file}, which has none")
+                    else:
+                        self.assertTrue(csp.valid_solution(solution))
+        csp = GraphColoringCSP.from_file(os.path.join(folder, "gc_78317097930400.txt"))
+        self.assertTrue(csp.valid_solution(backtracking_search(csp, verbose=False, engine='parallel', processes=2)))
+
+    def test_portfolio_search(self):
+        """
+        Unit test for the portfolio search. The first configuration to finish should give the answer, and the report
+        should have an entry for every configuration.
+        """
+        configurations = [
+            {'select_unassigned_variable': mrv, 'inference': forward_checking},
+            {'select_unassigned_variable': IncrementalMRV(), 'inference': maintain_arc_consistency_ne, 'engine': 'backjumping'},
+        ]
+        for file in ("gc_78317097930400.txt", "gc_78317097930401.txt"):
+            csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", file))
+            solution, report = portfolio_search(csp, configurations, verbose=False, verify=True)
+            if file == "gc_78317097930401.txt":
+                self.assertIsNone(solution)
+            else:
+                self.assertTrue(csp.valid_solution(solution))
+            self.assertEqual(len(report), len(configurations))
+            finished = [entry for entry in report if entry['status'] in ('solved', 'no solution')]
+            self.assertGreaterEqual(len(finished), 1)
+            self.assertTrue(all(entry['elapsed'] >= 0 for entry in report))
+
+    def test_run_batch(self):
+        """
+        Unit test for the batch runner. Every input file should get one JSON line with its status, and a worker that goes
+        over its wall-clock or node budget should be killed. A clique of 10 vertices with 9 colors has no solution, but
+        without inference or value ordering the search tries every coloring of the first 9 vertices before finding out.
+        """
+        folder = os.path.join("assets", "input_files")
+        output = io.StringIO()
+        results = run_batch(os.path.join(folder, "gc_78317*.txt"), {'cache': None}, jobs=2, output=output)
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([(line['file'], line['status']) for line in lines], [(result['file'], result['status']) for result in results])
+        self.assertEqual(sorted(result['file'] for result in results), find_instances(os.path.join(folder, "gc_78317*.txt")))
+        statuses = {os.path.basename(result['file']): result['status'] for result in results}
+        self.assertEqual(statuses["gc_78317097930401.txt"], 'no solution')
+        self.assertEqual(statuses["gc_78317097930400.txt"], 'solved')
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "clique.txt")
+            with open(filepath, "w") as file:
+                file.write("colors = 9\n" + "".join(f"{i},{j}\n" for i in range(10) for j in range(i + 1, 10)))
+            options = {'select_unassigned_variable': static_ordering, 'order_domain_values': unordered_domain_values, 'inference': None}
+            result, = run_batch([filepath], options, timeout=0.5, output=None)
+            self.assertEqual(result['status'], 'timeout')
+            self.assertLess(result['elapsed'], 5)
+            result, = run_batch([filepath], options, max_nodes=1000, output=None)
+            self.assertEqual(result['status'], 'node limit')
+            self.assertGreaterEqual(result['assignment_counts'], 1000)
+
+    def test_dsatur(self):
+        """
+        Unit test for DSATUR. Without a color limit it should give a coloring with no conflicts, and with a limit
+        it should only use the allowed colors.
+        """
+        folder = os.path.join("assets", "input_files")
+        for file in os.listdir(folder):
+            csp = GraphColoringCSP.from_file(os.path.join(folder, file))
+            coloring = dsatur(csp.variables, csp.neighbors)
+            self.assertTrue(csp.valid_solution(coloring))
+            limited = dsatur(csp.variables, csp.neighbors, csp.colors)
+            self.assertEqual(set(limited), set(csp.variables))
+            self.assertTrue(set(limited.values()) <= set(range(csp.colors)))
+
+    def test_local_search(self):
+        """
+        Unit test for the local search engine. Both methods should color every file that has a solution, and
+        stop at the iteration limit on the file with no solution.
+        """
+        folder = os.path.join("assets", "input_files")
+        no_solution = "gc_78317097930401.txt"
+        files = [file for file in os.listdir(folder) if not 'gc_1377121623225900' in file]
+        for file in files:
+            for method in ('tabu', 'min-conflicts'):
+                csp = GraphColoringCSP.from_file(os.path.join(folder, file))
+                search = LocalSearch(csp, method, max_iterations=2000)
+                solution = search.search()
+                if file == no_solution:
+                    self.assertIsNone(solution)
+                    self.assertEqual(search.iterations, 2000)
+                else:
+                    self.assertTrue(csp.valid_solution(solution), f"Local search ({method}) gave an invalid solution for file {file}")
+        csp = GraphColoringCSP.from_file(os.path.join(folder, no_solution))
+        self.assertIsNone(local_search(csp, verbose=False, max_iterations=None, time_limit=0.1))
+
+    def test_luby(self):
+        """
+        Unit test for the Luby sequence used by the restart schedule.
+        """
+        self.assertEqual([luby(i) for i in range(1, 16)], [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8])
+
+    def test_restart_search(self):
+        """
+        Unit test for backtracking search with randomized restarts. A failure budget of one forces restarts, and
+        the search should still find a solution exactly when the backtracking search does. The same seed should
+        give the same solution after the same number of restarts.
+        """
+        folder = os.path.join("assets", "input_files")
+        files = [file for file in os.listdir(folder) if not 'gc_1377121623225900' in file]
+        for file in files:
+            filepath = os.path.join(folder, file)
+            expected = backtracking_search(GraphColoringCSP.from_file(filepath), verbose=False)
+            for schedule in ('luby', 'geometric'):
+                for weighting in (False, True):
+                    runs = []
+                    for _ in range(2):
+                        csp = GraphColoringCSP.from_file(filepath)
+                        search = RestartSearch(csp, inference=forward_checking, seed=3, schedule=schedule, base=1, weighting=weighting)
+                        solution = search.search()
+                        if expected is None:
+                            self.assertIsNone(solution, f"Restart search found a solution for file {file}, which has none")
+                        else:
+                            self.assertTrue(csp.valid_solution(solution))
+                        self.assertEqual(len(search.seeds), search.restarts + 1)
+                        runs.append((solution and dict(solution), search.restarts, csp.assignment_counts))
+                    self.assertEqual(runs[0], runs[1])
+        csp = GraphColoringCSP.from_file(os.path.join(folder, "gc_78317097930400.txt"))
+        search = RestartSearch(csp, inference=None, base=1)
+        self.assertTrue(csp.valid_solution(search.search()))
+        self.assertGreater(search.restarts, 0)
+
+    def test_instrumentation(self):
+        """
+        Unit test for search instrumentation. The statistics should agree with the callbacks and with csp.assignment_counts
+        for every engine, the search should find the same answer as without instrumentation, and the csp should be left
+        uninstrumented afterwards.
+        """
+        filepath = os.path.join("assets", "input_files", "gc_78317097930401.txt")
+        for engine in ('recursive', 'iterative', 'backjumping', 'restarts'):
+            for inference in (forward_checking, maintain_arc_consistency):
+                calls = {'assign': 0, 'backtrack': 0, 'pruned': 0}
+                def on_assign(csp, variable, value, assignment):
+                    calls['assign'] += 1
+                    self.assertEqual(assignment[variable], value)
+                def on_backtrack(csp, variable, assignment):
+                    calls['backtrack'] += 1
+                def on_prune(csp, inferences):
+                    calls['pruned'] += sum(map(len, inferences.values()))
+                instrumentation = Instrumentation(on_assign=on_assign, on_backtrack=on_backtrack, on_prune=on_prune)
+                csp = GraphColoringCSP.from_file(filepath)
+                self.assertIsNone(backtracking_search(csp, verbose=False, inference=inference, engine=engine, instrumentation=instrumentation))
+                statistics = instrumentation.statistics
+                self.assertEqual((statistics.nodes, statistics.backtracks, statistics.values_pruned), (calls['assign'], calls['backtrack'], calls['pruned']))
+                self.assertEqual(statistics.nodes, csp.assignment_counts)
+                self.assertEqual(statistics.failures[inference.__name__], 24)
+                self.assertGreater(statistics.max_depth, 0)
+                self.assertGreater(statistics.inference_time, 0)
+                self.assertLessEqual(statistics.heuristic_time + statistics.inference_time, statistics.elapsed)
+                self.assertEqual(statistics.arcs_revised > 0, inference is maintain_arc_consistency and engine != 'backjumping')
+                self.assertNotIn('assign', vars(csp))
+                self.assertIsNone(csp.statistics)
+        # Progress is reported every 1024 nodes once progress_interval seconds have passed
+        reports = []
+        instrumentation = Instrumentation(progress=lambda statistics: reports.append(statistics.nodes), progress_interval=0, profile=True)
+        csp = GraphColoringCSP.from_file(filepath)
+        backtracking_search(csp, verbose=False, inference=None, instrumentation=instrumentation)
+        self.assertEqual(reports, list(range(1024, csp.assignment_counts + 1, 1024)))
+        self.assertGreater(len(instrumentation.profiler.getstats()), 0)
+
+    def test_backtracking_search_bitset_domains(self):
+        """
+        Unit test for backtracking search using the bitset domain store. It should find the same
+        solutions as the list domain store for each inference method.
+        """
+        folder = os.path.join("assets", "input_files")
+        files = [file for file in os.listdir(folder) if not 'gc_1377121623225900' in file]
+        for file in files:
+            filepath = os.path.join(folder, file)
+            for inference in (forward_checking, maintain_arc_consistency):
+                list_csp = GraphColoringCSP.from_file(filepath)
+                bitset_csp = GraphColoringCSP.from_file(filepath, domain_backend="bitset")
+                expected = backtracking_search(list_csp, verbose=False, inference=inference)
+                solution = backtracking_search(bitset_csp, verbose=False, inference=inference)
+                self.assertEqual(solution, expected, f"Bitset domains gave a different result for file {file}")
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_backtracking_search_vectorized(self):
+        """
+        Unit test for backtracking search with the numpy backend: with the vectorized heuristics and inference methods,
+        it should find the same solutions as mrv, lcv, forward checking and mac, after the same number of assignments.
+        """
+        folder = os.path.join("assets", "input_files")
+        files = [file for file in os.listdir(folder) if not 'gc_1377121623225900' in file]
+        for file in files:
+            filepath = os.path.join(folder, file)
+            for inference, vectorized_inference in ((forward_checking, forward_checking_numpy), (maintain_arc_consistency, maintain_arc_consistency_numpy)):
+                expected_instrumentation, instrumentation = Instrumentation(), Instrumentation()
+                expected = backtracking_search(GraphColoringCSP.from_file(filepath), verbose=False, inference=inference, engine='iterative',
+                                               instrumentation=expected_instrumentation)
+                solution = backtracking_search(GraphColoringCSP.from_file(filepath, domain_backend="numpy"), verbose=False, select_unassigned_variable=mrv_numpy,
+                                               order_domain_values=lcv_numpy, inference=vectorized_inference, engine='iterative', instrumentation=instrumentation)
+                self.assertEqual(solution, expected, f"The numpy backend gave a different result for file {file}")
+                self.assertEqual(instrumentation.statistics.nodes, expected_instrumentation.statistics.nodes)
+
+    def test_backtracking_search_iterative(self):
+        """
+        Unit test for the iterative backtracking engine. It should find the same solutions as the
+        recursive functions, with the same number of assignments.
+        """
+        folder = os.path.join("assets", "input_files")
+        files = [file for file in os.listdir(folder) if not 'gc_1377121623225900' in file]
+        for file in files:
+            filepath = os.path.join(folder, file)
+            for inference in (None, forward_checking, maintain_arc_consistency):
+                recursive_csp = GraphColoringCSP.from_file(filepath)
+                iterative_csp = GraphColoringCSP.from_file(filepath)
+                expected = backtracking_search(recursive_csp, verbose=False, inference=inference)
+                solution = backtracking_search(iterative_csp, verbose=False, inference=inference, engine='iterative')
+                self.assertEqual(solution, expected, f"Iterative engine gave a different result for file {file}")
+                self.assertEqual(iterative_csp.assignment_counts, recursive_csp.assignment_counts)
+
+    def test_backtracking_search_iterative_deep(self):
+        """
+        Unit test for the iterative backtracking engine on a problem with more variables than the recursion limit.
+        """
+        size = sys.getrecursionlimit() + 500
+        edges = [(vertex, vertex + 1) for vertex in range(size - 1)]
+        csp = GraphColoringCSP(edges, 2)
+        solution = backtracking_search(csp, verbose=False, select_unassigned_variable=IncrementalMRV(),
+            order_domain_values=unordered_domain_values, inference=forward_checking, engine='iterative')
+        self.assertTrue(csp.valid_solution(solution))
+
+    def test_backtracking_search_incremental_mrv(self):
+        """
+        Unit test for backtracking search using the incremental mrv heuristic. It should search
+        the same tree as mrv, so it finds the same solutions with the same number of assignments.
+        """
+        folder = os.path.join("assets", "input_files")
+        files = [file for file in os.listdir(folder) if not 'gc_1377121623225900' in file]
+        for file in files:
+            filepath = os.path.join(folder, file)
+            for inference in (None, forward_checking, maintain_arc_consistency):
+                mrv_csp = GraphColoringCSP.from_file(filepath)
+                incremental_csp = GraphColoringCSP.from_file(filepath)
+                expected = backtracking_search(mrv_csp, verbose=False, select_unassigned_variable=mrv, inference=inference)
+                solution = backtracking_search(incremental_csp, verbose=False, select_unassigned_variable=IncrementalMRV(), inference=inference)
+                self.assertEqual(solution, expected, f"Incremental mrv gave a different result for file {file}")
+                self.assertEqual(incremental_csp.assignment_counts, mrv_csp.assignment_counts)
+
+    def test_bounded_search(self):
+        """
+        Unit test for the bounded search. A search split into many short runs, each resumed from the checkpoint of the
+        previous one in a new csp object, should give the same answer as a single search (with the backjumping engine,
+        keeping its nogoods in the checkpoint), and stop with the status 'timeout' when it runs out of time or is
+        cancelled. A checkpoint should not be resumed on another problem.
+        """
+        folder = os.path.join("assets", "input_files")
+        problems = [(os.path.join(folder, "gc_78317097930400.txt"), 'iterative', 'solved'), (os.path.join(folder, "gc_78317097930401.txt"), 'iterative', 'unsat'),
+                    (random_graph(25, 0.3, 4, 0), 'backjumping', 'unsat')]
+        with tempfile.TemporaryDirectory() as directory:
+            for index, (problem, engine, expected_status) in enumerate(problems):
+                new_csp = lambda: GraphColoringCSP.from_file(problem) if isinstance(problem, str) else GraphColoringCSP.from_csr(problem)
+                checkpoint = os.path.join(directory, f"{index}.json")
+                expected = backtracking_search(new_csp(), verbose=False, engine=engine, inference=forward_checking)
+                runs = 0
+                status = 'timeout'
+                while status == 'timeout':
+                    status, solution, statistics = bounded_search(new_csp(), verbose=False, engine=engine, inference=forward_checking, max_nodes=5, checkpoint=checkpoint)
+                    runs += 1
+                self.assertEqual(status, expected_status)
+                self.assertEqual(solution, expected)
+                self.assertGreater(runs, 2)
+                self.assertGreaterEqual(statistics.nodes, 5 * (runs - 1))
+                with open(checkpoint) as file:
+                    self.assertEqual(bool(json.load(file)['nogoods']), engine == 'backjumping')
+                # A finished checkpoint gives its result without searching
+                csp = new_csp()
+                self.assertEqual(bounded_search(csp, verbose=False, checkpoint=checkpoint).status, expected_status)
+                self.assertEqual(csp.assignment_counts, 0)
+            csp = GraphColoringCSP.from_file(os.path.join(folder, "gc_78317097930401.txt"))
+            with self.assertRaises(ValueError):
+                bounded_search(csp, verbose=False, checkpoint=os.path.join(directory, "0.json"))
+            cancel = threading.Event()
+            cancel.set()
+            checkpoint = os.path.join(directory, "cancelled.json")
+            search = BoundedSearch(csp, cancel=cancel, checkpoint=checkpoint)
+            self.assertEqual(search.search().status, 'timeout')
+            self.assertEqual(search.reason, 'cancelled')
+            with open(checkpoint) as file:
+                self.assertEqual(json.load(file)['status'], 'running')
+            search = BoundedSearch(GraphColoringCSP.from_file(os.path.join(folder, "gc_78317097930401.txt")), time_limit=0)
+            self.assertEqual((search.search().status, search.reason), ('timeout', 'time'))
+
+    def test_chromatic_number(self):
+        """
+        Unit test for the optimization mode. It should find the chromatic number of each input file, reporting each
+        better coloring as it is found, including when tabu search is switched off (max_iterations=0) so every
+        coloring comes from the backjumping search. A search stopped at once should still give a valid coloring.
+        """
+        folder = os.path.join("assets", "input_files")
+        expected = {"australia.txt": 3, "gc_1378296846561000.txt": 4, "gc_78317094521100.txt": 3, "gc_78317097930400.txt": 4,
+                    "gc_78317097930401.txt": 5, "gc_78317100510400.txt": 4, "gc_78317103208800.txt": 4}
+        for file, colors in expected.items():
+            for max_iterations in (10000, 0):
+                improvements = []
+                csp = GraphColoringCSP.from_file(os.path.join(folder, file))
+                result = chromatic_number(csp, verbose=False, max_iterations=max_iterations, verify=True, on_improve=lambda colors, _: improvements.append(colors))
+                self.assertEqual((result.colors, result.optimal), (colors, True), f"Wrong chromatic number for file {file}")
+                self.assertLessEqual(result.lower_bound, colors)
+                self.assertEqual(improvements, sorted(improvements, reverse=True))
+                self.assertEqual(improvements[-1], colors)
+        csp = GraphColoringCSP.from_csr(random_graph(40, 0.5, 4, 0))
+        result = chromatic_number(csp, verbose=False, time_limit=0, verify=True)
+        self.assertFalse(result.optimal)
+        self.assertEqual(len(result.coloring), len(csp.variables))
+
+    def test_incremental_coloring(self):
+        """
+        Unit test for the incremental re-solve API. After every update, the coloring should be valid if the graph can be
+        colored (checked by solving it from scratch) and the update reported as 'unsat' otherwise. Removing an edge or
+        adding a color should not change any color, and an edge between two vertices with the same color should only
+        recolor a few vertices.
+        """
+        coloring = IncrementalColoring(GraphColoringCSP([(0, 1), (1, 2), (0, 2)], 3))
+        self.assertEqual(coloring.add_vertex(3, [0, 1, 2]).status, 'unsat')
+        self.assertEqual(coloring.uncolored, {3})
+        self.assertEqual(coloring.set_colors(4)[:2], ('solved', 0))
+        self.assertTrue(coloring.is_valid())
+        self.assertEqual(coloring.set_colors(3).status, 'unsat')
+        # Vertex 3 had the fourth color, and can now only share the color of vertex 0
+        self.assertEqual(coloring.remove_edge(3, 0)[:2], ('solved', 1))
+        self.assertEqual(coloring.coloring[3], coloring.coloring[0])
+        self.assertTrue(coloring.is_valid())
+        self.assertEqual(coloring.remove_vertex(1).status, 'solved')
+        self.assertEqual(sorted(coloring.vertices), [0, 2, 3])
+        csp = GraphColoringCSP.from_file(os.path.join("assets", "input_files", "gc_78317097930400.txt"))
+        coloring = IncrementalColoring(csp)
+        same = [(vertex, neighbor) for vertex in csp.variables for neighbor in csp.variables
+                if vertex < neighbor and coloring.coloring[vertex] == coloring.coloring[neighbor] and not coloring.has_edge(vertex, neighbor)]
+        result = coloring.add_edge(*same[0])
+        self.assertEqual(result.status, 'solved')
+        self.assertTrue(1 <= result.changed < len(csp.variables) // 2)
+        self.assertTrue(coloring.is_valid())
+        random = Random(0)
+        for _ in range(40):
+            vertex1, vertex2 = random.sample(sorted(coloring.vertices), 2)
+            result = coloring.remove_edge(vertex1, vertex2) if coloring.has_edge(vertex1, vertex2) else coloring.add_edge(vertex1, vertex2)
+            solvable = backtracking_search(GraphColoringCSP.from_csr(coloring.to_csr()), verbose=False) is not None
+            self.assertEqual(result.status, 'solved' if solvable else 'unsat')
+            self.assertEqual(coloring.is_valid(), solvable)
+
+class TestBenchmark(unittest.TestCase):
+    """
+    Test cases for the benchmark.
+    """
+    def test_run_benchmark(self):
+        """
+        Unit test for the benchmark. The counts should match the search (the same assignments as csp.assignment_counts, and
+        the same counts for the recursive and iterative engines), the results should survive being written and read back as
+        CSV and JSON, and the comparison should only report combinations that got worse.
+        """
+        instances = load_instances(os.path.join("assets", "input_files", "gc_7831709793040*.txt"), [('gnp', 30, 0.2, 3, 0)])
+        self.assertEqual([name for name, _ in instances], ["gc_78317097930400.txt", "gc_78317097930401.txt", "gnp"])
+        results = run_benchmark(instances, ['mrv'], ['lcv'], ['fc', 'none'], repetitions=2)
+        self.assertEqual(len(results), 6)
+        for result in results:
+            self.assertGreater(result['peak_memory'], 0)
+            self.assertLessEqual(result['time_min'], result['time'])
+        for name, graph in instances:
+            csp = GraphColoringCSP.from_csr(graph)
+            backtracking_search(csp, verbose=False, inference=forward_checking)
+            counts = [result for result in results if result['instance'] == name and result['inference'] == 'fc'][0]
+            self.assertEqual(counts['nodes'], csp.assignment_counts)
+            recursive = run_benchmark([(name, graph)], ['mrv'], ['lcv'], ['fc'], repetitions=1, engine='recursive', measure_memory=False)[0]
+            self.assertEqual([recursive[field] for field in ('nodes', 'backtracks', 'propagations')], [counts[field] for field in ('nodes', 'backtracks', 'propagations')])
+        limited = run_benchmark(instances[1:2], ['static'], ['unordered'], ['none'], repetitions=1, max_nodes=50, measure_memory=False)[0]
+        self.assertEqual((limited['status'], limited['nodes']), ('node limit', 50))
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ("results.csv", "results.json"):
+                path = os.path.join(directory, name)
+                write_results(results, path)
+                self.assertEqual(read_results(path), results)
+        slower = [dict(result, nodes=result['nodes'] * 2, time_min=result['time_min'] + 1) for result in results]
+        self.assertEqual(compare(results, results), [])
+        self.assertEqual(compare(results, slower), [])
+        regressions = compare(slower, results)
+        self.assertEqual(sorted({regression['metric'] for regression in regressions}), ['nodes', 'time_min'])
+        self.assertEqual(len(regressions), 2 * len(results))
+
+    def test_generator(self):
+        """
+        Unit test for the instance generator. Each model should give the same graph for the same seed, and its files
+        should be read back by both parsers. The graphs should have the properties of their models: G(n, p) about p of
+        the pairs as edges, geometric graphs exactly the pairs of points within the radius, Apollonian networks 3n - 6
+        edges, near-threshold graphs a coloring, and planted cliques no coloring with fewer colors than their size.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            for model in models:
+                graph = generate(model, 60, 3, seed=1)
+                self.assertEqual(list(graph.edges()), list(generate(model, 60, 3, seed=1).edges()))
+                self.assertNotEqual(list(graph.edges()), list(generate(model, 60, 3, seed=2).edges()))
+                path = os.path.join(directory, f"{model}.txt")
+                write_instance(path, graph, model)
+                parsed = parse_csr(path)
+                self.assertEqual((parsed.colors, list(parsed.edges())), (3, list(graph.edges())))
+                self.assertEqual(len(FileParser(path).parsed_payload["edges"]), graph.edge_count())
+        self.assertEqual(gnp_graph(6, 1.0, 3).edge_count(), 15)
+        self.assertEqual(gnp_graph(6, 0.0, 3).edge_count(), 0)
+        self.assertAlmostEqual(gnp_graph(300, 0.1, 3, 4).edge_count() / (0.1 * 300 * 299 / 2), 1, delta=0.05)
+        random = Random(5)
+        points = [(random.random(), random.random()) for _ in range(150)]
+        expected = [(vertex, neighbor) for vertex in range(150) for neighbor in range(vertex + 1, 150)
+                    if (points[vertex][0] - points[neighbor][0]) ** 2 + (points[vertex][1] - points[neighbor][1]) ** 2 <= 0.1 ** 2]
+        self.assertEqual(sorted(geometric_graph(150, 0.1, 3, 5).edges()), expected)
+        self.assertEqual(planar_graph(100, 4, 3).edge_count(), 3 * 100 - 6)
+        self.assertLess(planar_graph(100, 4, 3, density=0.5).edge_count(), 3 * 100 - 6)
+        graph = threshold_graph(150, 3, 6)
+        self.assertEqual(graph.edge_count(), round(threshold_degree(3) * 150 / 2))
+        csp = GraphColoringCSP.from_csr(graph)
+        self.assertTrue(csp.valid_solution(backtracking_search(csp, verbose=False, engine='iterative')))
+        self.assertEqual(planted_clique_graph(30, 0.0, 5, 4).edge_count(), 10)
+        self.assertIsNone(backtracking_search(GraphColoringCSP.from_csr(planted_clique_graph(40, 0.05, 5, 4, 7)), verbose=False))
+        with self.assertRaises(ValueError):
+            threshold_graph(10, 3, degree=9)
+
+    def test_scaling(self):
+        """
+        Unit test for the scaling harness: it should measure every part for each graph and configuration, reuse the files
+        in its directory, and report where a part grows faster than the number of edges or the search runs out of time.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            results = run_scaling(['gnp', 'planar'], [40, 80], ['mrv/lcv/mac-ne', 'tabu'], colors=4, directory=directory, time_limit=5)
+            self.assertEqual(len(results), 8)
+            self.assertEqual(len(os.listdir(directory)), 4)
+            for result in results:
+                self.assertGreater(result['edges'], 0)
+                self.assertGreater(result['peak_memory'], 0)
+                self.assertGreater(result['generate_time'], 0)
+                self.assertIn(result['status'], ('solved', 'unsat', 'not found'))
+                if result['status'] == 'solved' and result['configuration'] != 'tabu':
+                    self.assertGreater(result['nodes'], 0)
+            again = run_scaling(['gnp'], [40], ['tabu'], colors=4, directory=directory, memory=False)
+            self.assertEqual((again[0]['generate_time'], again[0]['peak_memory'], again[0]['edges']), (None, None, results[0]['edges']))
+        rows = [{'model': 'gnp', 'configuration': 'mrv', 'vertices': edges // 4, 'edges': edges, 'parse_time': edges / 1000, 'build_time': (edges / 1000) ** 2,
+                 'peak_memory': edges * 100, 'solve_time': 0.5, 'status': 'timeout' if edges == 4000 else 'solved'} for edges in (1000, 2000, 4000)]
+        points = {point['metric']: point for point in breakpoints(rows)}
+        self.assertEqual((points['parse_time']['edges'], points['peak_memory']['edges']), (None, None))
+        self.assertEqual((points['build_time']['edges'], points['build_time']['growth']), (2000, 2.0))
+        self.assertEqual((points['solve_time']['edges'], points['solve_time']['growth']), (4000, 'timeout'))
+        output = io.StringIO()
+        report(rows, output=output)
+        self.assertIn("gnp mrv build_time: stops scaling at 2000 edges (grows as edges^2.0)", output.getvalue())
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,273 @@
+from collections.abc import Mapping
+
+try:
+    import numpy
+except ImportError: # NumPy is optional: only this backend needs it
+    numpy = None
+
+from domains import iter_bits, popcount
+from heuristics import lcv
+
+"""
+This module contains a propagation backend for large sparse graphs, built on NumPy (which is optional: the rest of
+the solver does not need it). The Python inference functions and heuristics visit one neighbor and one value at a
+time, which dominates the search on graphs with tens of thousands of vertices. This backend keeps every domain as a
+bit in a NumPy array of 64-bit masks indexed by the CSR ids of the vertices (`NumpyDomains`, the 'numpy' domain
+backend), so work over the neighbors of a vertex is done with vectorized operations over its CSR row:
+    forward_checking_numpy          - Forward checking: the value is cleared from the masks of the whole row at once
+    maintain_arc_consistency_numpy  - The singleton propagation of `inference.maintain_arc_consistency_ne`, in waves:
+                                      every variable left with a single value in one wave removes it from its
+                                      neighbors in the next one, with the removals for each neighbor combined first
+    mrv_numpy                       - `heuristics.mrv`: the domain sizes of every variable are counted at once
+    lcv_numpy                       - `heuristics.lcv`, sorting the neighbor color counts kept by `GraphColoringCSP`
+They make the same choices and prune the same values as the functions they replace, so a search with them visits the
+same nodes. They need the 'numpy' domain backend (e.g., `GraphColoringCSP.from_file(path, domain_backend='numpy')`).
+The inference functions do not return the values they remove: they remove them from the domain store themselves, on
+its undo trail, and return an empty dictionary (or 'failure'), so the mark the search takes before an assignment
+still undoes them (and `instrumentation.SearchStatistics.values_pruned` does not count them).
+At most 64 colors are supported.
+"""
+
+if numpy is not None:
+    if hasattr(numpy, 'bitwise_count'): # NumPy 2.0+
+        popcount_array = numpy.bitwise_count
+    else:
+        BYTE_COUNTS = numpy.array([bin(byte).count('1') for byte in range(256)], dtype=numpy.uint8)
+
+        def popcount_array(masks):
+            """
+            Function that returns the number of set bits of each mask in an array of 64-bit masks.
+            """
+            return BYTE_COUNTS[masks.view(numpy.uint8)].reshape(-1, 8).sum(axis=1, dtype=numpy.int64)
+
+class NumpyDomains(Mapping):
+    """
+    Domain store that keeps the domains as an array of 64-bit masks, one per vertex in ascending order of the labels
+    (which is the order of the ids of a `fileparser.CSRGraph`), where bit c is set if color c is still available. It
+    supports the same operations as the stores in the `domains` module, and `remove_values`, which changes many
+    domains at once. The trail holds either one (id, mask) pair or two arrays (ids, masks) per change.
+
+    arguments:
+        :variables: - An iterable of the vertices in the problem
+        :colors: - An integer representing the number of colors for the problem (at most 64)
+    """
+    def __init__(self, variables, colors: int) -> None:
+        if numpy is None:
+            raise ImportError("The numpy domain backend needs NumPy (pip install numpy)")
+        if colors > 64:
+            raise ValueError("The numpy domain backend supports at most 64 colors")
+        self.colors = colors
+        self.label_list = sorted(variables)
+        self.labels = numpy.array(self.label_list, dtype=numpy.int64)
+        self.low = self.label_list[0] if self.label_list else 0
+        contiguous = not self.label_list or self.label_list[-1] - self.low == len(self.label_list) - 1
+        self.ids = None if contiguous else {label: index for index, label in enumerate(self.label_list)}
+        self.full_mask = (1 << colors) - 1
+        self.masks = numpy.full(len(self.label_list), self.full_mask, dtype=numpy.uint64)
+        self.bits = numpy.left_shift(numpy.uint64(1), numpy.arange(colors, dtype=numpy.uint64))
+        self.trail = []
+        self.watchers = []
+        self.graph = None # The CSR arrays and mrv keys of the csp, built by `arrays` the first time they are needed
+
+    def index(self, variable) -> int:
+        """
+        Method that returns the id of variable (its position in ascending order of the labels).
+        """
+        if self.ids is not None:
+            return self.ids[variable]
+        index = variable - self.low
+        if not 0 <= index < len(self.label_list):
+            raise KeyError(variable)
+        return index
+
+    def indices(self, variables):
+        """
+        Method that returns the ids of a collection of variables (e.g., an assignment) as an array.
+        """
+        labels = numpy.fromiter(variables, dtype=numpy.int64, count=len(variables))
+        if self.ids is None:
+            return labels - self.low
+        return numpy.searchsorted(self.labels, labels)
+
+    def __getitem__(self, variable) -> list:
+        return list(iter_bits(int(self.masks[self.index(variable)])))
+
+    def __iter__(self):
+        return iter(self.label_list)
+
+    def __len__(self) -> int:
+        return len(self.label_list)
+
+    def __repr__(self) -> str:
+        return repr({variable: self[variable] for variable in self.label_list})
+
+    def size(self, variable) -> int:
+        return popcount(int(self.masks[self.index(variable)]))
+
+    def contains(self, variable, value) -> bool:
+        return (int(self.masks[self.index(variable)]) >> value) & 1 == 1
+
+    def domain(self, variable) -> list:
+        return list(iter_bits(int(self.masks[self.index(variable)])))
+
+    def remove(self, variable, value) -> None:
+        index = self.index(variable)
+        mask = int(self.masks[index])
+        self.trail.append((index, mask))
+        self.masks[index] = mask & ~(1 << value)
+        if self.watchers:
+            self.notify(variable)
+
+    def reduce_to(self, variable, value) -> None:
+        index = self.index(variable)
+        self.trail.append((index, int(self.masks[index])))
+        self.masks[index] = 1 << value
+        if self.watchers:
+            self.notify(variable)
+
+    def restore(self, variable, value) -> None:
+        """
+        Method to add a value back into a domain without using the trail.
+        """
+        index = self.index(variable)
+        self.masks[index] = int(self.masks[index]) | (1 << value)
+        if self.watchers:
+            self.notify(variable)
+
+    def remove_values(self, ids, removals):
+        """
+        Method that removes the values in the masks removals (one mask, or one per id) from the domains of the
+        vertices with the given distinct ids, recording the changes on the trail as one entry.
+        Returns the ids whose domains changed and their new masks.
+        """
+        masks = self.masks[ids]
+        new_masks = masks & ~removals
+        changed = new_masks != masks
+        ids, masks, new_masks = ids[changed], masks[changed], new_masks[changed]
+        if len(ids):
+            self.trail.append((ids, masks))
+            self.masks[ids] = new_masks
+            if self.watchers:
+                for index in ids.tolist():
+                    self.notify(self.label_list[index])
+        return ids, new_masks
+
+    def mark(self) -> int:
+        return len(self.trail)
+
+    def undo(self, mark: int) -> None:
+        trail = self.trail
+        masks = self.masks
+        while len(trail) > mark:
+            index, mask = trail.pop()
+            masks[index] = mask
+            if self.watchers:
+                for variable in ([self.label_list[index]] if isinstance(index, int) else [self.label_list[i] for i in index.tolist()]):
+                    self.notify(variable)
+
+    def notify(self, variable) -> None:
+        for watcher in self.watchers:
+            watcher.on_domain_change(variable)
+
+    def arrays(self, csp):
+        """
+        Method that returns the CSR offsets and indices of csp as NumPy arrays (sharing memory with the
+        `fileparser.CSRGraph`), and the part of the `mrv` key that does not change during the search.
+        """
+        if self.graph is None or self.graph[0] is not csp:
+            graph = csp.graph
+            if len(graph.labels) != len(self.label_list):
+                raise ValueError("The numpy domain store does not match the graph of the csp")
+            offsets = numpy.frombuffer(graph.offsets, dtype=numpy.int64) if len(graph.offsets) else numpy.zeros(1, dtype=numpy.int64)
+            indices = numpy.frombuffer(graph.indices, dtype=numpy.int64) if len(graph.indices) else numpy.zeros(0, dtype=numpy.int64)
+            # mrv sorts by (domain size, -degree) and leaves ties in the order of csp.variables
+            degrees = numpy.diff(offsets)
+            count = len(self.label_list)
+            positions = numpy.empty(count, dtype=numpy.int64)
+            positions[self.indices(csp.variables)] = numpy.arange(count, dtype=numpy.int64)
+            most = int(degrees.max()) if count else 0
+            static_keys = (most - degrees) * count + positions
+            self.graph = (csp, offsets, indices, static_keys, (most + 1) * count)
+        return self.graph[1:]
+
+def gather_neighbors(offsets, indices, ids):
+    """
+    Function that returns the neighbor ids of every vertex in ids, row after row, and for each neighbor the position in
+    ids of the vertex it is a neighbor of.
+    """
+    starts = offsets[ids]
+    lengths = offsets[ids + 1] - starts
+    total = int(lengths.sum())
+    shifts = numpy.repeat(starts - (numpy.cumsum(lengths) - lengths), lengths)
+    return indices[numpy.arange(total, dtype=numpy.int64) + shifts], numpy.repeat(numpy.arange(len(ids)), lengths)
+
+def forward_checking_numpy(csp, variable, assignment):
+    """
+    Forward checking (see `inference.forward_checking`) over the CSR row of variable: value is removed from the
+    domains of the unassigned neighbors that still have it. Returns 'failure' if one of them is left with no values.
+    """
+    domains = csp.domains
+    offsets, indices, _, _ = domains.arrays(csp)
+    index = domains.index(variable)
+    bit = domains.bits[assignment[variable]]
+    row = indices[offsets[index]:offsets[index + 1]]
+    row = row[(domains.masks[row] & bit) != 0]
+    if len(row):
+        labels = domains.label_list
+        row = row[numpy.fromiter((labels[neighbor] not in assignment for neighbor in row.tolist()), dtype=bool, count=len(row))]
+    _, new_masks = domains.remove_values(row, bit)
+    if not new_masks.all():
+        return 'failure'
+    return {}
+
+def maintain_arc_consistency_numpy(csp, variable, assignment):
+    """
+    Arc consistency for the not-equal constraint (see `inference.maintain_arc_consistency_ne`) in waves: the values of
+    the variables left with a single value in the last wave (at first, the assigned variable) are removed from all of
+    their neighbors at once, and the neighbors this leaves with a single value make up the next wave.
+    Returns 'failure' if a domain is left with no values.
+    """
+    domains = csp.domains
+    offsets, indices, _, _ = domains.arrays(csp)
+    bits = domains.bits
+    ids = numpy.array([domains.index(variable)], dtype=numpy.int64)
+    removals = bits[[assignment[variable]]]
+    while len(ids):
+        neighbors, sources = gather_neighbors(offsets, indices, ids)
+        if not len(neighbors):
+            break
+        # Combine the values removed from each neighbor, which may be next to several variables of the wave
+        order = numpy.argsort(neighbors, kind='stable')
+        neighbors = neighbors[order]
+        starts = numpy.flatnonzero(numpy.concatenate(([True], neighbors[1:] != neighbors[:-1])))
+        combined = numpy.bitwise_or.reduceat(removals[sources[order]], starts)
+        changed, new_masks = domains.remove_values(neighbors[starts], combined)
+        if not new_masks.all():
+            return 'failure'
+        singletons = popcount_array(new_masks) == 1
+        ids = changed[singletons]
+        removals = new_masks[singletons]
+    return {}
+
+def mrv_numpy(csp, assignment):
+    """
+    The `heuristics.mrv` heuristic with the domain sizes of every variable counted at once: returns the unassigned
+    variable with the fewest values left, breaking ties by the most constraints and then by the order of csp.variables.
+    """
+    domains = csp.domains
+    _, _, static_keys, scale = domains.arrays(csp)
+    keys = popcount_array(domains.masks).astype(numpy.int64) * scale + static_keys
+    if assignment:
+        keys[domains.indices(assignment)] = numpy.iinfo(numpy.int64).max
+    return domains.label_list[int(numpy.argmin(keys))]
+
+def lcv_numpy(csp, variable, assignment):
+    """
+    The `heuristics.lcv` heuristic: the values of variable sorted by how many assigned neighbors have them. When the
+    assignment is the one `GraphColoringCSP` keeps neighbor color counts for, they are sorted with one stable argsort.
+    """
+    if not csp.tracks(assignment):
+        return lcv(csp, variable, assignment)
+    values = csp.domains.domain(variable)
+    counts = numpy.array(csp.color_counts[variable])[values]
+    return [values[position] for position in numpy.argsort(counts, kind='stable').tolist()]